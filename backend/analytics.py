@@ -0,0 +1,256 @@
+# analytics.py
+"""
+Engagement dashboards served from daily rollups.
+
+`engagement_user_daily` holds one row per user and UTC day with the posts
+and replies they wrote, the likes they gave and received and their poll
+votes; `engagement_department_daily` holds the same sums per department
+("" for users without one). Triggers in counters.py keep both current on
+every write, ORM or not, including cascades. A user who changes department
+takes their history along, so the rollups always match a recount:
+
+    flask analytics-rebuild      # recompute both tables from the source tables
+
+Rows count while they exist: soft-deleted and under-review items count
+until they are purged.
+
+    GET /analytics?from=2026-09-01&to=2026-09-30            departments (admins)
+    GET /analytics/department?name=Engineering&from=...     one department (admins)
+    GET /analytics/employees/<user_id>?from=...             one employee (admins, or themselves)
+
+Ranges are inclusive UTC days and default to the last ANALYTICS_DEFAULT_DAYS.
+"""
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from flask import current_app, jsonify, request
+from flask_jwt_extended import jwt_required
+from sqlalchemy import func, select
+
+from auth import current_user_id, is_admin
+from counters import ROLLUP_METRICS
+from extensions import db
+from models import EngagementDepartmentDaily, EngagementUserDaily, User
+
+MAX_RANGE_DAYS = 366
+# likes received are not something the user did
+ACTIVITY_METRICS = ("posts", "replies", "likes_given", "votes")
+JSON_KEYS = {"posts": "posts", "replies": "replies", "likes_given": "likesGiven",
+             "likes_received": "likesReceived", "votes": "votes"}
+
+
+class InvalidRange(ValueError):
+    pass
+
+
+# ---------------------------------------
+# REBUILD
+# ---------------------------------------
+def _day(table: str) -> str:
+    return f"COALESCE(date({table}.created_at), date('now'))"
+
+
+def _activity_rows() -> str:
+    """One row per counted event: (user_id, day, one column per metric)."""
+    def row(user: str, day: str, source: str, metric: str) -> str:
+        columns = ", ".join(f"{int(m == metric)} AS {m}" for m in ROLLUP_METRICS)
+        return f"SELECT {user} AS user_id, {day} AS day, {columns} FROM {source}"
+
+    return " UNION ALL ".join((
+        row("author_id", _day("posts"), "posts", "posts"),
+        row("author_id", _day("replies"), "replies", "replies"),
+        row("user_id", _day("likes"), "likes", "likes_given"),
+        row("COALESCE(p.author_id, r.author_id)", _day("likes"),
+            "likes LEFT JOIN posts p ON p.id = likes.post_id LEFT JOIN replies r ON r.id = likes.reply_id",
+            "likes_received"),
+        row("user_id", _day("votes"), "votes", "votes"),
+    ))
+
+
+def rebuild_rollups(connection):
+    """Replace both rollup tables with a recount of posts, replies, likes and votes."""
+    metrics = ", ".join(ROLLUP_METRICS)
+    sums = ", ".join(f"sum(e.{m})" for m in ROLLUP_METRICS)
+    connection.exec_driver_sql("DELETE FROM engagement_department_daily")
+    connection.exec_driver_sql("DELETE FROM engagement_user_daily")
+    connection.exec_driver_sql(
+        f"INSERT INTO engagement_user_daily (user_id, day, department, {metrics}) "
+        f"SELECT e.user_id, e.day, COALESCE(u.department, ''), {sums} "
+        f"FROM ({_activity_rows()}) AS e JOIN users u ON u.id = e.user_id "
+        "GROUP BY e.user_id, e.day"
+    )
+    connection.exec_driver_sql(
+        f"INSERT INTO engagement_department_daily (department, day, {metrics}) "
+        f"SELECT department, day, {', '.join(f'sum({m})' for m in ROLLUP_METRICS)} "
+        "FROM engagement_user_daily GROUP BY department, day"
+    )
+
+
+# ---------------------------------------
+# QUERIES
+# ---------------------------------------
+def parse_range(args) -> Tuple[date, date]:
+    try:
+        end = date.fromisoformat(args["to"]) if args.get("to") else datetime.utcnow().date()
+        start = date.fromisoformat(args["from"]) if args.get("from") else \
+            end - timedelta(days=current_app.config["ANALYTICS_DEFAULT_DAYS"] - 1)
+    except ValueError:
+        raise InvalidRange("from and to must be dates (YYYY-MM-DD)")
+    if start > end:
+        raise InvalidRange("from must not be after to")
+    if (end - start).days >= MAX_RANGE_DAYS:
+        raise InvalidRange(f"Range too long (max {MAX_RANGE_DAYS} days)")
+    return start, end
+
+
+def _metrics(row) -> Dict[str, int]:
+    return {JSON_KEYS[m]: int(getattr(row, m) or 0) for m in ROLLUP_METRICS}
+
+
+def _sums(model):
+    return [func.sum(getattr(model, m)).label(m) for m in ROLLUP_METRICS]
+
+
+def _daily(model, start: date, end: date, *where) -> List[Dict]:
+    """A contiguous day-by-day series; days without rows are zeros."""
+    rows = db.session.execute(
+        select(model.day, *_sums(model))
+        .where(model.day >= start, model.day <= end, *where)
+        .group_by(model.day)
+    ).all()
+    by_day = {row.day: row for row in rows}
+    series = []
+    for offset in range((end - start).days + 1):
+        day = start + timedelta(days=offset)
+        row = by_day.get(day)
+        series.append({"day": day.isoformat(),
+                       **(_metrics(row) if row else {JSON_KEYS[m]: 0 for m in ROLLUP_METRICS})})
+    return series
+
+
+def _totals(series: List[Dict]) -> Dict[str, int]:
+    return {key: sum(day[key] for day in series) for key in JSON_KEYS.values()}
+
+
+def _department_name(department: str) -> Optional[str]:
+    return department or None
+
+
+def departments_overview(start: date, end: date) -> Dict:
+    D, U = EngagementDepartmentDaily, EngagementUserDaily
+    totals = db.session.execute(
+        select(D.department, *_sums(D)).where(D.day >= start, D.day <= end).group_by(D.department)
+    ).all()
+    active = dict(db.session.execute(
+        select(U.department, func.count(func.distinct(U.user_id)))
+        .where(U.day >= start, U.day <= end, sum(getattr(U, m) for m in ACTIVITY_METRICS) > 0)
+        .group_by(U.department)
+    ).all())
+    headcount = dict(db.session.execute(
+        select(func.coalesce(User.department, ""), func.count(User.id))
+        .where(User.is_active.is_(True))
+        .group_by(func.coalesce(User.department, ""))
+    ).all())
+
+    departments = []
+    for row in totals:
+        departments.append({
+            "department": _department_name(row.department),
+            "headcount": headcount.get(row.department, 0),
+            "activeEmployees": active.get(row.department, 0),
+            **_metrics(row),
+        })
+    # departments with staff but no rollup rows in the range still show up
+    seen = {row.department for row in totals}
+    for department, count in headcount.items():
+        if department not in seen:
+            departments.append({"department": _department_name(department), "headcount": count,
+                                "activeEmployees": 0, **{JSON_KEYS[m]: 0 for m in ROLLUP_METRICS}})
+    departments.sort(key=lambda d: (d["department"] is None, (d["department"] or "").lower()))
+
+    daily = _daily(D, start, end)
+    return {"from": start.isoformat(), "to": end.isoformat(), "totals": _totals(daily),
+            "departments": departments, "daily": daily}
+
+
+def department_dashboard(department: str, start: date, end: date) -> Dict:
+    D, U = EngagementDepartmentDaily, EngagementUserDaily
+    daily = _daily(D, start, end, D.department == department)
+    rows = db.session.execute(
+        select(U.user_id, *_sums(U))
+        .where(U.department == department, U.day >= start, U.day <= end)
+        .group_by(U.user_id)
+    ).all()
+    by_user = {row.user_id: row for row in rows}
+    # current members, plus anyone whose rows are still filed here
+    users = db.session.execute(
+        select(User.id, User.name, User.login_id, User.position)
+        .where((func.coalesce(User.department, "") == department) | User.id.in_(list(by_user)))
+    ).all()
+    employees = [{
+        "userId": u.id, "name": u.name, "loginId": u.login_id, "position": u.position,
+        **(_metrics(by_user[u.id]) if u.id in by_user else {JSON_KEYS[m]: 0 for m in ROLLUP_METRICS}),
+    } for u in users]
+    employees.sort(key=lambda e: (-sum(e[JSON_KEYS[m]] for m in ACTIVITY_METRICS), e["name"].lower()))
+    return {"department": _department_name(department), "from": start.isoformat(), "to": end.isoformat(),
+            "totals": _totals(daily), "daily": daily, "employees": employees}
+
+
+def employee_dashboard(user: User, start: date, end: date) -> Dict:
+    daily = _daily(EngagementUserDaily, start, end, EngagementUserDaily.user_id == user.id)
+    return {"userId": user.id, "name": user.name, "department": user.department,
+            "from": start.isoformat(), "to": end.isoformat(), "totals": _totals(daily), "daily": daily}
+
+
+# ---------------------------------------
+# ROUTES + CLI
+# ---------------------------------------
+def init_analytics(app):
+    app.config.setdefault("ANALYTICS_DEFAULT_DAYS", 30)
+
+    @app.route("/analytics", methods=["GET"])
+    @jwt_required()
+    def analytics_overview():
+        if not is_admin():
+            return jsonify({"error": "Only admins can see department analytics"}), 403
+        try:
+            start, end = parse_range(request.args)
+        except InvalidRange as e:
+            return jsonify({"error": str(e)}), 400
+        return jsonify(departments_overview(start, end)), 200
+
+    @app.route("/analytics/department", methods=["GET"])
+    @jwt_required()
+    def analytics_department():
+        if not is_admin():
+            return jsonify({"error": "Only admins can see department analytics"}), 403
+        name = request.args.get("name")
+        if name is None:
+            return jsonify({"error": "name is required (empty for users without a department)"}), 400
+        try:
+            start, end = parse_range(request.args)
+        except InvalidRange as e:
+            return jsonify({"error": str(e)}), 400
+        return jsonify(department_dashboard(name.strip(), start, end)), 200
+
+    @app.route("/analytics/employees/<int:user_id>", methods=["GET"])
+    @jwt_required()
+    def analytics_employee(user_id):
+        if not is_admin() and current_user_id() != user_id:
+            return jsonify({"error": "You can only see your own analytics"}), 403
+        user = db.session.get(User, user_id)
+        if user is None:
+            return jsonify({"error": "User not found"}), 404
+        try:
+            start, end = parse_range(request.args)
+        except InvalidRange as e:
+            return jsonify({"error": str(e)}), 400
+        return jsonify(employee_dashboard(user, start, end)), 200
+
+    @app.cli.command("analytics-rebuild")
+    def analytics_rebuild():
+        """Recompute the engagement rollups from posts, replies, likes and votes."""
+        with db.engine.begin() as connection:
+            rebuild_rollups(connection)
+        rows = db.session.execute(select(func.count()).select_from(EngagementUserDaily)).scalar()
+        print(f"Engagement rollups rebuilt: {rows:,} user-days.")
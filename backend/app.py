@@ -5,6 +5,23 @@ import os
 from dotenv import load_dotenv
 from flask_jwt_extended import JWTManager
 from flask_migrate import Migrate
+from metrics import init_metrics
+from search import init_search
+from counters import init_counters
+from auth import init_auth
+from compression import init_compression
+from batch import init_batch
+from deletion import init_deletion
+from moderation import init_moderation
+from storage import init_storage
+from uploads import init_uploads
+from media import init_media
+from review import init_review
+from variants import init_variants
+from outbound import init_outbound
+from analytics import init_analytics
+from leaderboard import init_leaderboard
+from trending import init_trending
 import cloudinary
 import cloudinary.uploader
 import cloudinary.api
@@ -19,10 +36,48 @@ app = Flask(
 
 # --- Config ---
 CORS(app)
-app.config['SQLALCHEMY_DATABASE_URI'] = "sqlite:///employees.db"
+app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv("DATABASE_URL", "sqlite:///employees.db")
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['SECRET_KEY'] = os.getenv("FLASK_SECRET_KEY")
 app.config["JWT_SECRET_KEY"] = os.getenv("JWT_TOKEN_KEY")
+app.config["METRICS_TOKEN"] = os.getenv("METRICS_TOKEN")
+app.config["N_PLUS_ONE_THRESHOLD"] = int(os.getenv("N_PLUS_ONE_THRESHOLD", "5"))
+app.config["USER_SEARCH_MEMORY_INDEX"] = os.getenv("USER_SEARCH_MEMORY_INDEX", "1") == "1"
+app.config["BCRYPT_LOG_ROUNDS"] = int(os.getenv("BCRYPT_LOG_ROUNDS", "12"))
+app.config["BCRYPT_HANDLE_LONG_PASSWORDS"] = True  # bcrypt rejects passwords over 72 bytes
+app.config["PASSWORD_HASH_WORKERS"] = int(os.getenv("PASSWORD_HASH_WORKERS", "4"))
+app.config["LOGIN_ACCOUNT_RATE"] = os.getenv("LOGIN_ACCOUNT_RATE", "5/60")
+app.config["LOGIN_IP_RATE"] = os.getenv("LOGIN_IP_RATE", "30/60")
+app.config["TOKEN_VERSION_TTL"] = float(os.getenv("TOKEN_VERSION_TTL", "30"))
+app.config["COMPRESS_MIN_SIZE"] = int(os.getenv("COMPRESS_MIN_SIZE", "1024"))
+app.config["COMPRESS_LEVEL"] = int(os.getenv("COMPRESS_LEVEL", "6"))
+app.config["COMPRESS_BR_LEVEL"] = int(os.getenv("COMPRESS_BR_LEVEL", "5"))
+app.config["SOFT_DELETE"] = os.getenv("SOFT_DELETE", "0") == "1"
+app.config["PURGE_INTERVAL"] = float(os.getenv("PURGE_INTERVAL", "30"))
+app.config["PURGE_BATCH_SIZE"] = int(os.getenv("PURGE_BATCH_SIZE", "500"))
+app.config["MODERATION_MODE"] = os.getenv("MODERATION_MODE", "sync")  # "async": publish, then moderate
+app.config["REVIEW_INTERVAL"] = float(os.getenv("REVIEW_INTERVAL", "30"))
+app.config["ANALYTICS_DEFAULT_DAYS"] = int(os.getenv("ANALYTICS_DEFAULT_DAYS", "30"))
+app.config["LEADERBOARD_SIZE"] = int(os.getenv("LEADERBOARD_SIZE", "10"))
+app.config["LEADERBOARD_TTL"] = float(os.getenv("LEADERBOARD_TTL", "30"))
+app.config["TRENDING_HALF_LIFE"] = float(os.getenv("TRENDING_HALF_LIFE", "24"))  # hours
+app.config["TRENDING_INTERVAL"] = float(os.getenv("TRENDING_INTERVAL", "300"))
+app.config["OUTBOUND_TIMEOUT"] = float(os.getenv("OUTBOUND_TIMEOUT", "5"))
+app.config["OUTBOUND_MAX_CONCURRENCY"] = int(os.getenv("OUTBOUND_MAX_CONCURRENCY", "10"))
+app.config["OUTBOUND_BREAKER_RESET"] = float(os.getenv("OUTBOUND_BREAKER_RESET", "30"))
+app.config["PERSPECTIVE_URL"] = os.getenv(
+    "PERSPECTIVE_URL", "https://commentanalyzer.googleapis.com/v1alpha1/comments:analyze")
+app.config["STORAGE_BACKEND"] = os.getenv("STORAGE_BACKEND", "cloudinary")
+app.config["LOCAL_STORAGE_ROOT"] = os.getenv("LOCAL_STORAGE_ROOT", os.path.join(os.path.dirname(__file__), "media"))
+app.config["USE_X_SENDFILE"] = os.getenv("USE_X_SENDFILE", "0") == "1"  # front server streams /media files
+app.config["UPLOAD_SIGNING_KEY"] = os.getenv("UPLOAD_SIGNING_KEY")
+app.config["UPLOAD_MAX_BYTES"] = int(os.getenv("UPLOAD_MAX_BYTES", str(10 * 1024 * 1024)))
+app.config["LOCAL_UPLOAD_URL"] = os.getenv("LOCAL_UPLOAD_URL", "http://127.0.0.1:9001")
+app.config["LEGACY_UPLOADS"] = os.getenv("LEGACY_UPLOADS", "1") == "1"
+app.config["VARIANTS_ROOT"] = os.getenv("VARIANTS_ROOT", os.path.join(os.path.dirname(__file__), "media-variants"))
+app.config["VARIANT_WORKERS"] = int(os.getenv("VARIANT_WORKERS", "2"))
+# legacy multipart uploads still pass through the app; cap their request size
+app.config["MAX_CONTENT_LENGTH"] = app.config["UPLOAD_MAX_BYTES"] + 1024 * 1024
 
 cloudinary.config(
     cloud_name=os.getenv("CLOUDINARY_CLOUD_NAME"),
@@ -31,10 +86,25 @@ cloudinary.config(
 )
 
 # --- Init extensions ---
+# registered first so its after_request hook runs last, over the final body
+init_compression(app)
 db.init_app(app)
 bcrypt.init_app(app)
 jwt = JWTManager(app)
+init_auth(app, jwt)
 migrate = Migrate(app, db)
+init_metrics(app, db)
+init_search(app, db)
+init_counters(app, db)
+init_deletion(app, db)
+init_storage(app)
+init_uploads(app)
+init_media(app)
+init_variants(app)
+init_outbound(app)
+init_analytics(app)
+init_leaderboard(app)
+init_trending(app)
 
 
 
@@ -42,6 +112,9 @@ migrate = Migrate(app, db)
 from routes import register_routes
 PERSPECTIVE_API_KEY = os.getenv("PERSPECTIVE_API_KEY")
 register_routes(app, db=db, PERSPECTIVE_API_KEY=PERSPECTIVE_API_KEY)
+init_batch(app)
+init_moderation(app)
+init_review(app, PERSPECTIVE_API_KEY)
 
 # --- Serve React login page ---
 @app.route("/login", methods=["GET"])
@@ -57,7 +130,8 @@ def serve_react(path):
         return jsonify({"error": "Method not allowed"}), 405
 
     # Do not serve React for API paths
-    api_prefixes = ["users", "posts", "replies", "polls", "notifications", "login"]
+    api_prefixes = ["users", "posts", "replies", "polls", "notifications", "login", "metrics", "search",
+                    "likes", "bootstrap", "batch", "admin", "uploads", "media", "variants"]
     if any(path.startswith(p) for p in api_prefixes):
         return jsonify({"error": "Not found"}), 404
 
@@ -72,6 +146,7 @@ def serve_react(path):
 STATICS_FOLDER = os.path.join(os.path.dirname(__file__), "statics")
 @app.route("/statics/<path:filename>")
 def serve_statics(filename):
-    return send_from_directory(STATICS_FOLDER, filename)
+    # avatar files keep their names when replaced, so revalidate after a day
+    return send_from_directory(STATICS_FOLDER, filename, max_age=86400)
 if __name__ == "__main__":
     app.run(debug=True, port=5000)
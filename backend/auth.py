@@ -0,0 +1,301 @@
+# auth.py
+"""
+Password hashing, login throttling and token claims.
+
+- passwords are stored as bcrypt hashes; rows still holding the legacy
+  plaintext are accepted once and rehashed on that login, as are hashes made
+  with a round count other than BCRYPT_LOG_ROUNDS
+- the CSV import stores new users under a salted SHA-256 `interim_hash`
+  instead: bcrypt at full cost would keep the import's write transaction open
+  for hours. The first login checks it and replaces it with bcrypt
+- hashing and verification run on a small bounded thread pool (bcrypt
+  releases the GIL), so a burst of logins queues there instead of tying up
+  every request thread; when the queue is full, or a login waits on it
+  longer than PASSWORD_HASH_TIMEOUT, the login gets a 503
+- token buckets per login_id and per client IP reject bursts before any
+  hashing happens
+
+- access tokens carry the user's role and token_version as claims, so admin
+  checks need no query; bumping token_version (role change, deactivation)
+  revokes every token issued before, checked against a short-TTL cache.
+  Tokens issued before these claims existed stay valid until they expire,
+  as long as the user is still active; admin checks on them read the row
+- `current_user()` loads the User row lazily, at most once per request
+
+Throttle and version caches live in this process only; with several gunicorn workers
+each worker keeps its own buckets.
+"""
+import hashlib
+import hmac
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Dict, Optional, Tuple
+
+from flask import current_app, g, has_app_context
+from flask_jwt_extended import create_access_token, get_jwt, get_jwt_identity
+
+from extensions import bcrypt, db
+from metrics import REGISTRY
+
+LOGIN_ATTEMPTS = REGISTRY.counter("login_attempts_total", "Login attempts by outcome")
+
+
+class HasherBusy(Exception):
+    """Raised when the hashing pool's queue is full or a job waits past its timeout."""
+
+
+def is_hashed(stored: str) -> bool:
+    return stored.startswith(("$2a$", "$2b$", "$2y$"))
+
+
+def _hash_rounds(stored: str) -> int:
+    return int(stored[4:6])
+
+
+INTERIM_PREFIX = "$interim$"
+
+
+def interim_hash(password: str) -> str:
+    """A fast salted digest for bulk imports; upgraded to bcrypt on the first login."""
+    salt = os.urandom(16).hex()
+    return f"{INTERIM_PREFIX}{salt}${hashlib.sha256((salt + password).encode()).hexdigest()}"
+
+
+def is_interim(stored: str) -> bool:
+    return stored.startswith(INTERIM_PREFIX)
+
+
+def _check_interim(stored: str, candidate: str) -> bool:
+    salt, _, digest = stored[len(INTERIM_PREFIX):].partition("$")
+    return hmac.compare_digest(digest, hashlib.sha256((salt + candidate).encode()).hexdigest())
+
+
+# ---------------------------------------
+# HASHING
+# ---------------------------------------
+class PasswordHasher:
+    def __init__(self, rounds: int = 12, workers: int = 4, queue_size: int = 32, timeout: float = 10.0):
+        self.rounds = rounds
+        self.timeout = timeout
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._dummy_hash = None
+
+    def hash(self, password: str) -> str:
+        return bcrypt.generate_password_hash(password, self.rounds).decode()
+
+    def verify(self, stored: Optional[str], candidate: str) -> Tuple[bool, bool]:
+        """Returns (matches, needs_rehash)."""
+        if not stored:
+            # unknown login_id: spend the same time as a real check
+            if self._dummy_hash is None:
+                self._dummy_hash = self.hash("not-a-real-password")
+            bcrypt.check_password_hash(self._dummy_hash, candidate)
+            return False, False
+        if is_interim(stored):
+            return _check_interim(stored, candidate), True
+        if not is_hashed(stored):
+            # legacy plaintext row
+            return hmac.compare_digest(stored.encode(), candidate.encode()), True
+        try:
+            ok = bcrypt.check_password_hash(stored, candidate)
+        except ValueError:
+            return False, False
+        return ok, ok and _hash_rounds(stored) != self.rounds
+
+    def _submit(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise HasherBusy()
+        try:
+            future = self._pool.submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            # the job still holds its slot until it finishes
+            raise HasherBusy() from None
+
+    def verify_off_thread(self, stored: Optional[str], candidate: str) -> Tuple[bool, bool]:
+        return self._submit(self.verify, stored, candidate)
+
+    def hash_off_thread(self, password: str) -> str:
+        return self._submit(self.hash, password)
+
+    def hash_many(self, passwords):
+        """Hash a batch on the pool without the queue bound; for scripts, not requests."""
+        return list(self._pool.map(self.hash, passwords))
+
+
+# ---------------------------------------
+# THROTTLING
+# ---------------------------------------
+class TokenBucketThrottle:
+    """
+    `capacity` attempts per key, refilled continuously over `period` seconds.
+    Idle buckets are pruned once more than `max_keys` are tracked.
+    """
+
+    def __init__(self, capacity: int, period: float, max_keys: int = 100_000):
+        self.capacity = float(capacity)
+        self.rate = capacity / period
+        self.max_keys = max_keys
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    def take(self, key: str) -> float:
+        """Consume one token. Returns 0 when allowed, else seconds until a token is available."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, stamp = self._buckets.get(key, (self.capacity, now))
+            tokens = min(self.capacity, tokens + (now - stamp) * self.rate)
+            if tokens < 1:
+                self._buckets[key] = (tokens, now)
+                return (1 - tokens) / self.rate
+            self._buckets[key] = (tokens - 1, now)
+            if len(self._buckets) > self.max_keys:
+                self._prune(now)
+            return 0.0
+
+    def _prune(self, now: float):
+        full_after = self.capacity / self.rate
+        for key, (_, stamp) in list(self._buckets.items()):
+            if now - stamp >= full_after:
+                del self._buckets[key]
+
+
+def _parse_rate(value: str) -> Tuple[int, float]:
+    """'5/60' -> 5 attempts per 60 seconds."""
+    count, _, period = value.partition("/")
+    return int(count), float(period or 60)
+
+
+def throttle_login(login_id: str, ip: Optional[str]) -> float:
+    """Seconds the caller must wait, or 0 when the attempt may proceed."""
+    state = current_app.extensions["auth"]
+    wait = state["ip_throttle"].take(ip or "unknown")
+    if not wait:
+        wait = state["account_throttle"].take(login_id.lower())
+    return wait
+
+
+def password_hasher() -> PasswordHasher:
+    return current_app.extensions["auth"]["hasher"]
+
+
+# ---------------------------------------
+# TOKENS AND CLAIMS
+# ---------------------------------------
+class TokenVersionCache:
+    """user_id -> current token_version (None when inactive or missing), cached for `ttl` seconds."""
+
+    def __init__(self, ttl: float = 30.0):
+        self.ttl = ttl
+        self._versions: Dict[int, Tuple[Optional[int], float]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int) -> Optional[int]:
+        now = time.monotonic()
+        cached = self._versions.get(user_id)
+        if cached and cached[1] > now:
+            return cached[0]
+        from models import User
+
+        row = db.session.execute(
+            db.select(User.token_version, User.is_active).where(User.id == user_id)
+        ).first()
+        version = row[0] if row and row[1] else None
+        with self._lock:
+            self._versions[user_id] = (version, now + self.ttl)
+        return version
+
+    def invalidate(self, user_id: Optional[int] = None):
+        with self._lock:
+            if user_id is None:
+                self._versions.clear()
+            else:
+                self._versions.pop(user_id, None)
+
+
+def issue_token(user) -> str:
+    return create_access_token(
+        identity=str(user.id),
+        additional_claims={"role": user.role_lower(), "ver": user.token_version},
+    )
+
+
+def current_user_id() -> int:
+    return int(get_jwt_identity())
+
+
+def is_admin() -> bool:
+    role = get_jwt().get("role")
+    if role is None:
+        # issued before tokens carried claims: read the role from the row until it expires
+        user = current_user()
+        role = user.role_lower() if user else None
+    return role == "admin"
+
+
+def current_user():
+    """The caller's User row, loaded on first use and reused for the rest of the request."""
+    if "auth_user" not in g:
+        from models import User
+        g.auth_user = db.session.get(User, current_user_id())
+    return g.auth_user
+
+
+def revoke_tokens(user_id: Optional[int] = None):
+    """Forget cached versions after token_version changed, for one user or everyone."""
+    if has_app_context() and "auth" in current_app.extensions:
+        current_app.extensions["auth"]["token_versions"].invalidate(user_id)
+
+
+def init_auth(app, jwt):
+    versions = TokenVersionCache(ttl=app.config.get("TOKEN_VERSION_TTL", 30.0))
+    app.extensions["auth"] = {
+        "token_versions": versions,
+        "hasher": PasswordHasher(
+            rounds=app.config.get("BCRYPT_LOG_ROUNDS", 12),
+            workers=app.config.get("PASSWORD_HASH_WORKERS", 4),
+            queue_size=app.config.get("PASSWORD_HASH_QUEUE", 32),
+            timeout=app.config.get("PASSWORD_HASH_TIMEOUT", 10.0),
+        ),
+        "account_throttle": TokenBucketThrottle(*_parse_rate(app.config.get("LOGIN_ACCOUNT_RATE", "5/60"))),
+        "ip_throttle": TokenBucketThrottle(*_parse_rate(app.config.get("LOGIN_IP_RATE", "30/60"))),
+    }
+
+    @jwt.token_in_blocklist_loader
+    def _token_revoked(jwt_header, jwt_payload):
+        current = versions.get(int(jwt_payload["sub"]))
+        if "ver" not in jwt_payload:
+            # issued before token_version existed: good while the user is, until it expires
+            return current is None
+        return jwt_payload["ver"] != current
+
+    @app.cli.command("passwords-hash")
+    def passwords_hash():
+        """Hash every password still stored in plaintext."""
+        from sqlalchemy import select, update
+        from extensions import db
+        from models import User
+
+        hasher = app.extensions["auth"]["hasher"]
+        # interim hashes hold no plaintext to rehash; their owners' logins upgrade them
+        rows = [(uid, pw) for uid, pw in db.session.execute(select(User.id, User.password))
+                if not is_hashed(pw) and not is_interim(pw)]
+        started = time.perf_counter()
+        for start in range(0, len(rows), 500):
+            chunk = rows[start:start + 500]
+            hashes = hasher.hash_many([pw for _, pw in chunk])
+            db.session.execute(
+                update(User).execution_options(synchronize_session=False),
+                [{"id": uid, "password": h} for (uid, _), h in zip(chunk, hashes)],
+            )
+            db.session.commit()
+            print(f"Hashed {start + len(chunk):,}/{len(rows):,} passwords ({time.perf_counter() - started:.1f}s)")
+        print("All passwords are hashed.")
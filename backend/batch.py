@@ -0,0 +1,129 @@
+# batch.py
+"""
+POST /batch: several API calls in one HTTP round trip.
+
+    {"requests": [
+        {"id": "thread", "method": "GET", "path": "/posts/12/replies", "query": {"per_page": 20}},
+        {"id": "notifs", "path": "/notifications"}
+    ]}
+
+Each item is dispatched through the normal view, with its hooks and error
+handlers, in a nested request context. All items share the outer app
+context, so they use one DB session and the caller's Authorization header,
+and the request-scoped user cache. Results come back in order:
+
+    {"responses": [{"id": "thread", "status": 200, "body": {...}}, ...]}
+
+Items run one after another, so a later item sees an earlier item's writes.
+A failing item is rolled back and reported on its own; it does not abort
+the batch.
+"""
+from flask import current_app, g, jsonify, request
+from flask_jwt_extended import jwt_required
+from werkzeug.exceptions import HTTPException
+from werkzeug.test import EnvironBuilder
+
+from extensions import db
+from serializers import json_response
+
+MAX_BATCH_ITEMS = 20
+BATCH_METHODS = {"GET", "POST", "PUT", "DELETE"}
+# per-request state other hooks keep in `g`, which nested contexts share
+REQUEST_SCOPED_G = ("_metrics", "_etag_encoding")
+
+
+def _validate(item):
+    if not isinstance(item, dict):
+        return "each request must be an object"
+    path = item.get("path")
+    if not isinstance(path, str) or not path.startswith("/"):
+        return "path must start with /"
+    if (item.get("method") or "GET").upper() not in BATCH_METHODS:
+        return f"method must be one of {', '.join(sorted(BATCH_METHODS))}"
+    return None
+
+
+def _environ(item, headers):
+    builder = EnvironBuilder(
+        path=item["path"],
+        method=(item.get("method") or "GET").upper(),
+        base_url=request.host_url,
+        query_string=item.get("query"),
+        json=item.get("body"),
+        headers=headers,
+    )
+    try:
+        return builder.get_environ()
+    finally:
+        builder.close()
+
+
+def _endpoint(app, environ):
+    """
+    The view `environ` resolves to, after URL decoding; None when it matches
+    nothing or only redirects (dispatch then answers 404/405/308 itself).
+    """
+    try:
+        endpoint, _ = app.url_map.bind_to_environ(environ).match()
+    except HTTPException:
+        return None
+    return endpoint
+
+
+def _dispatch(app, environ, item):
+    saved = {key: g.pop(key) for key in REQUEST_SCOPED_G if key in g}
+    try:
+        with app.request_context(environ):
+            try:
+                response = app.full_dispatch_request()
+            except Exception:
+                db.session.rollback()
+                current_app.logger.exception("Batch item %s failed", item.get("path"))
+                return 500, {"error": "Internal server error"}
+            if response.status_code >= 500:
+                db.session.rollback()
+            body = response.get_json(silent=True)
+            if body is None and response.mimetype != "application/json":
+                body = response.get_data(as_text=True)
+            return response.status_code, body
+    finally:
+        for key in REQUEST_SCOPED_G:
+            g.pop(key, None)
+        for key, value in saved.items():
+            setattr(g, key, value)
+
+
+def init_batch(app):
+    @app.route("/batch", methods=["POST"])
+    @jwt_required()
+    def batch():
+        # nested items share this app context, so a /batch the path check missed still stops here
+        if g.get("_in_batch"):
+            return jsonify({"error": "batches cannot be nested"}), 400
+        data = request.get_json(silent=True) or {}
+        items = data.get("requests")
+        if not isinstance(items, list) or not items:
+            return jsonify({"error": "requests must be a non-empty list"}), 400
+        if len(items) > MAX_BATCH_ITEMS:
+            return jsonify({"error": f"At most {MAX_BATCH_ITEMS} requests per batch"}), 400
+
+        headers = {"Authorization": request.headers.get("Authorization", "")}
+        real_app = current_app._get_current_object()
+        responses = []
+        g._in_batch = True
+        try:
+            for index, item in enumerate(items):
+                item_id = item.get("id", index) if isinstance(item, dict) else index
+                error = _validate(item)
+                environ = None if error else _environ(item, headers)
+                # judged by the view the path resolves to: "/%62atch" is /batch too
+                if environ is not None and _endpoint(real_app, environ) == "batch":
+                    error = "batches cannot be nested"
+                if error:
+                    responses.append({"id": item_id, "status": 400, "body": {"error": error}})
+                    continue
+                status, body = _dispatch(real_app, environ, item)
+                responses.append({"id": item_id, "status": status, "body": body})
+        finally:
+            g.pop("_in_batch", None)
+        return json_response({"responses": responses})
@@ -0,0 +1,204 @@
+# benchmarks/bench_outbound.py
+"""
+Compare per-call `requests.post` with the pooled OutboundClient against a
+local stand-in for the Perspective API.
+
+The stand-in answers like Perspective after --latency ms and can be switched
+to failing (503) or hanging (no answer within the timeout). It counts the TCP
+connections it accepts, so connection reuse shows up directly.
+
+    cd backend
+    python -m benchmarks.bench_outbound --calls 200 --timeout 1
+"""
+import argparse
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from outbound import CircuitOpen, OutboundClient, OutboundError
+
+RESULT = json.dumps({
+    "attributeScores": {
+        attr: {"summaryScore": {"value": 0.05, "type": "PROBABILITY"}}
+        for attr in ("TOXICITY", "INSULT", "PROFANITY", "THREAT")
+    },
+    "languages": ["en"],
+}).encode()
+
+
+# ---------------------------------------
+# STAND-IN SERVER
+# ---------------------------------------
+class StandIn(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, latency: float):
+        super().__init__(("127.0.0.1", 0), Handler)
+        self.latency = latency
+        self.mode = "ok"      # ok | error | hang
+        self.hang_for = 0.0
+        self.connections = 0
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/v1alpha1/comments:analyze"
+
+    def process_request(self, request, client_address):
+        with self._lock:
+            self.connections += 1
+        super().process_request(request, client_address)
+
+    def handle_error(self, request, client_address):
+        pass  # clients that gave up on a hanging answer
+
+    def reset(self, mode: str = "ok"):
+        with self._lock:
+            self.mode, self.connections, self.requests = mode, 0, 0
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"   # keep-alive, like the real API
+    disable_nagle_algorithm = True  # headers and body go out in separate writes
+
+    def do_POST(self):
+        server = self.server
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        with server._lock:
+            server.requests += 1
+        if server.mode == "hang":
+            time.sleep(server.hang_for)
+        time.sleep(server.latency)
+        status, body = (503, b'{"error": "unavailable"}') if server.mode == "error" else (200, RESULT)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+# ---------------------------------------
+# CALLERS
+# ---------------------------------------
+PAYLOAD = {"comment": {"text": "hello team"}, "languages": ["en"], "requestedAttributes": {"TOXICITY": {}}}
+
+
+def legacy_call(url: str, timeout: float) -> bool:
+    """What helpers.analyze_content did before: a fresh connection per call."""
+    try:
+        response = requests.post(url, json=PAYLOAD, params={"key": "x"}, timeout=timeout)
+        response.raise_for_status()
+        return True
+    except requests.RequestException:
+        return False
+
+
+def pooled_call(client: OutboundClient, url: str) -> bool:
+    try:
+        response = client.post(url, json=PAYLOAD, params={"key": "x"})
+        response.raise_for_status()
+        return True
+    except (requests.RequestException, OutboundError):
+        return False
+
+
+def run(server: StandIn, fn, calls: int, threads: int = 1) -> dict:
+    started = time.perf_counter()
+    if threads == 1:
+        ok = sum(fn() for _ in range(calls))
+    else:
+        with ThreadPoolExecutor(threads) as pool:
+            ok = sum(pool.map(lambda _: fn(), range(calls)))
+    elapsed = time.perf_counter() - started
+    return {
+        "calls": calls,
+        "ok": ok,
+        "total_s": round(elapsed, 3),
+        "ms_per_call": round(elapsed * 1000 / calls, 2),
+        "connections": server.connections,
+        "upstream_requests": server.requests,
+    }
+
+
+def report(name: str, legacy: dict, pooled: dict):
+    print(f"{name}")
+    for label, r in (("legacy", legacy), ("pooled", pooled)):
+        print(f"  {label:7s} {r['total_s']:8.3f} s  {r['ms_per_call']:8.2f} ms/call  "
+              f"ok {r['ok']:4d}/{r['calls']}  connections {r['connections']:4d}  "
+              f"upstream requests {r['upstream_requests']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=5.0, help="stand-in answer time, ms")
+    parser.add_argument("--timeout", type=float, default=1.0, help="per-call budget, s")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    server = StandIn(args.latency / 1000)
+    server.hang_for = args.timeout * 2
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = server.url
+
+    def client(**overrides):
+        options = dict(timeout=args.timeout, connect_timeout=args.timeout, breaker_reset=60.0)
+        options.update(overrides)
+        return OutboundClient("perspective", **options)
+
+    results = {}
+    cases = (
+        # name, mode, calls, threads
+        ("healthy, sequential", "ok", args.calls, 1),
+        (f"healthy, {args.threads} threads", "ok", args.calls, args.threads),
+        ("outage: 503s", "error", 20, 1),
+        ("outage: hanging upstream", "hang", 10, 1),
+    )
+    for name, mode, calls, threads in cases:
+        server.reset(mode)
+        legacy = run(server, lambda: legacy_call(url, args.timeout), calls, threads)
+        pooled_client = client()
+        server.reset(mode)
+        pooled = run(server, lambda: pooled_call(pooled_client, url), calls, threads)
+        pooled["breaker"] = pooled_client.breaker.state
+        pooled_client.close()
+        results[name] = {"legacy": legacy, "pooled": pooled}
+        report(name, legacy, pooled)
+
+    # recovery: an open breaker lets one trial through after the reset and closes on success
+    recovering = client(breaker_reset=0.2)
+    server.reset("error")
+    run(server, lambda: pooled_call(recovering, url), 10, 1)
+    opened = recovering.breaker.state
+    try:
+        recovering.post(url, json=PAYLOAD)
+        short_circuited = False
+    except CircuitOpen:
+        short_circuited = True
+    time.sleep(0.25)
+    server.reset("ok")
+    recovered = pooled_call(recovering, url)
+    results["recovery"] = {"after_outage": opened, "short_circuited": short_circuited,
+                           "trial_ok": recovered, "after_trial": recovering.breaker.state}
+    print(f"recovery: {opened} -> short-circuited {short_circuited} -> trial ok {recovered} "
+          f"-> {recovering.breaker.state}")
+    recovering.close()
+
+    server.shutdown()
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+# benchmarks/bench_serializers.py
+"""
+Compare the legacy `to_json` list serialization with the column-projection
+serializers in `serializers.py`.
+
+Runs against a throwaway SQLite file, checks that both paths produce the
+same JSON and prints CPU time per response for each endpoint, with PASS when
+the new path needs at most 1/TARGET_SPEEDUP of the legacy CPU. Exits 1 when
+an endpoint misses the target or its bodies differ.
+
+    cd backend
+    python -m benchmarks.bench_serializers --scale small --repeat 5
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+_tmp = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmp.name}"
+
+from flask import jsonify  # noqa: E402
+from sqlalchemy import func  # noqa: E402
+from app import app, db  # noqa: E402
+from models import User, Post, Reply, Like, Poll, Notification  # noqa: E402
+import serializers  # noqa: E402
+from benchmarks.synthetic_org import SCALES, generate  # noqa: E402
+
+TARGET_SPEEDUP = 3.0
+
+
+# ---------------------------------------
+# LEGACY PATHS (the route bodies before the serializers)
+# ---------------------------------------
+def legacy_posts(user_id):
+    results = []
+    for p in Post.query.order_by(Post.pinned.desc(), Post.created_at.desc()).all():
+        reply_count = db.session.query(func.count(Reply.id)).filter(Reply.post_id == p.id).scalar()
+        results.append({
+            **p.to_json(),
+            "user": p.author.to_json() if p.author else None,
+            "likeCount": Like.query.filter_by(post_id=p.id).count(),
+            "userLiked": Like.query.filter_by(post_id=p.id, user_id=user_id).first() is not None,
+            "replyCount": reply_count,
+            "image_url": p.image_url,
+            "gif_url": p.gif_url,
+        })
+    return results
+
+
+def legacy_users(user_id):
+    return [u.to_json() for u in User.query.order_by(User.name.asc()).all()]
+
+
+def legacy_replies(user_id, post_id):
+    page = Reply.query.filter_by(post_id=post_id).order_by(Reply.created_at.asc()).paginate(
+        page=1, per_page=20, error_out=False
+    )
+    return {
+        "postId": post_id,
+        "totalReplies": page.total,
+        "page": 1,
+        "perPage": 20,
+        "replies": [r.to_json(user_id) for r in page.items],
+    }
+
+
+def _without_cursor(payload):
+    payload.pop("nextCursor", None)
+    return payload
+
+
+def legacy_polls(user_id):
+    return [p.to_json(include_votes=True, user_id=user_id)
+            for p in Poll.query.order_by(Poll.created_at.desc()).all()]
+
+
+def _avatar_sources(avatar):
+    if avatar == serializers.DEFAULT_AVATAR:
+        return None
+    host_url = serializers._host_url()
+    return serializers.image_sources(serializers.avatar_full_url(avatar, host_url), serializers.AVATAR_WIDTHS, host_url)
+
+
+def legacy_notifications(user_id):
+    results = []
+    for n in Notification.query.filter_by(user_id=user_id).order_by(Notification.created_at.desc()).limit(50):
+        actor_name, actor_avatar = None, None
+        if n.actor:
+            actor_name, actor_avatar = n.actor.name, n.actor.avatar_url or "/default-avatar.png"
+        elif n.post_id:
+            post = db.session.get(Post, n.post_id)
+            if post and post.author:
+                actor_name, actor_avatar = post.author.name, post.author.avatar_url or "/default-avatar.png"
+        if not actor_name:
+            actor_name, actor_avatar = "System", "/default-avatar.png"
+        results.append({
+            "id": n.id, "actor": {"name": actor_name, "avatarUrl": actor_avatar,
+                                  "avatarSources": _avatar_sources(actor_avatar)},
+            "message": n.message, "action_type": n.action_type, "post_id": n.post_id,
+            "poll_id": n.poll_id, "is_read": n.is_read, "created_at": n.created_at.isoformat(),
+        })
+    return results
+
+
+def cpu_per_call(fn, repeat: int, sample_s: float = 0.05) -> float:
+    """
+    Best mean CPU per call over `repeat` samples. Fast endpoints take well
+    under a millisecond, so each sample sums enough calls to fill `sample_s`.
+    """
+    def timed():
+        db.session.expunge_all()
+        start = time.process_time()
+        body = fn()
+        return time.process_time() - start, body
+
+    first, body = timed()
+    calls = max(1, int(sample_s / max(first, 1e-6)))
+    best = float("inf")
+    for _ in range(repeat):
+        best = min(best, sum(timed()[0] for _ in range(calls)) / calls)
+    return best, body
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.create_all()
+        generate(db, log=lambda *a: None, **SCALES[args.scale])
+        user_id = db.session.query(Notification.user_id).group_by(Notification.user_id) \
+            .order_by(func.count(Notification.id).desc()).limit(1).scalar()
+        busiest_post = db.session.query(Reply.post_id).group_by(Reply.post_id) \
+            .order_by(func.count(Reply.id).desc()).limit(1).scalar()
+        reply_total = db.session.get(Post, busiest_post).reply_count
+
+    cases = {
+        "/posts": (lambda: legacy_posts(user_id), lambda: serializers.posts_payload(user_id)),
+        "/users": (lambda: legacy_users(user_id), serializers.users_payload),
+        "/posts/<id>/replies": (lambda: legacy_replies(user_id, busiest_post),
+                                lambda: _without_cursor(serializers.replies_payload(
+                                    busiest_post, user_id, 20, reply_total, page=1))),
+        "/polls": (lambda: legacy_polls(user_id), lambda: serializers.polls_payload(user_id)),
+        "/notifications": (lambda: legacy_notifications(user_id),
+                           lambda: serializers.notifications_payload(user_id)),
+    }
+
+    results = {}
+    with app.test_request_context("/", base_url="http://localhost:5000"):
+        for name, (legacy, fast) in cases.items():
+            legacy_s, legacy_body = cpu_per_call(lambda: jsonify(legacy()).get_data(), args.repeat)
+            fast_s, fast_body = cpu_per_call(lambda: serializers.json_response(fast()).get_data(), args.repeat)
+            same = json.loads(legacy_body) == json.loads(fast_body)
+            speedup = legacy_s / fast_s if fast_s else float("inf")
+            results[name] = {
+                "legacy_ms": round(legacy_s * 1000, 3),
+                "fast_ms": round(fast_s * 1000, 3),
+                "speedup": round(speedup, 2) if fast_s else None,
+                "identical": same,
+                "meets_target": same and speedup >= TARGET_SPEEDUP,
+            }
+            print(f"{name:24s} legacy {legacy_s * 1000:9.2f} ms  fast {fast_s * 1000:8.2f} ms  "
+                  f"x{speedup:<7.2f} {'PASS' if results[name]['meets_target'] else 'FAIL'}"
+                  f"{'' if same else '  MISMATCH'}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    os.unlink(_tmp.name)
+    failed = [name for name, r in results.items() if not r["meets_target"]]
+    if failed:
+        print(f"Below x{TARGET_SPEEDUP:g}: {', '.join(failed)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
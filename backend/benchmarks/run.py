@@ -0,0 +1,291 @@
+# benchmarks/run.py
+"""
+Drive the Flask app in-process against a synthetic org and record latency
+percentiles and SQL statements per request for each endpoint.
+
+    cd backend
+    python -m benchmarks.synthetic_org --db /tmp/org.db --scale medium
+    python -m benchmarks.run --db /tmp/org.db --out bench.json
+    python -m benchmarks.run --db /tmp/org.db --out after.json --compare bench.json
+
+Write scenarios mutate the database, so they run after the read scenarios;
+regenerate the org before comparing two commits.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+
+def percentile(samples, pct: float) -> float:
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    rank = (len(ordered) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except Exception:
+        return "unknown"
+
+
+class Harness:
+    def __init__(self, app, db, users: int, seed: int = 1):
+        from sqlalchemy import event, func
+        from auth import issue_token
+        from models import User, Post, Poll, Notification
+
+        self.app = app
+        self.client = app.test_client()
+        self.rnd = random.Random(seed)
+        self.statements = 0
+
+        with app.app_context():
+            event.listen(db.engine, "after_cursor_execute", self._count)
+            user_ids = [u for (u,) in db.session.query(User.id).order_by(func.random()).limit(users)]
+            self.admin_id = db.session.query(User.id).filter(User.role == "admin").limit(1).scalar()
+            self.tokens = {
+                uid: {"Authorization": "Bearer " + issue_token(db.session.get(User, uid))}
+                for uid in user_ids + [self.admin_id]
+            }
+            self.user_ids = user_ids
+            self.post_ids = [p for (p,) in db.session.query(Post.id).order_by(Post.id.desc()).limit(2000)]
+            self.poll_ids = [p for (p,) in db.session.query(Poll.id).order_by(Poll.id.desc()).limit(200)]
+            self.notif_ids = {
+                uid: [n for (n,) in db.session.query(Notification.id).filter_by(user_id=uid).limit(20)]
+                for uid in user_ids
+            }
+            self.names = [n for (n,) in db.session.query(User.name).limit(500)]
+            self.departments = [d or "" for (d,) in db.session.query(User.department).distinct()]
+
+        response = self.client.post("/upload", headers=self.headers(),
+                                    data={"image": (io.BytesIO(self._image()), "bench.png")})
+        self.media_url = response.get_json().get("url", "/media/missing")
+        self.variant_url = self._variant_url()
+
+    def _image(self) -> bytes:
+        # a distinct PNG-looking body per call, so content-addressed storage writes every time
+        return b"\x89PNG\r\n\x1a\n" + self.rnd.randbytes(32 * 1024)
+
+    def _variant_url(self) -> str:
+        """A 320px WebP of a real 1600px photo, rendered once before it is measured."""
+        try:
+            from PIL import Image
+        except ImportError:
+            return "/variants/missing"
+        buf = io.BytesIO()
+        Image.new("RGB", (1600, 1200), (120, 80, 40)).save(buf, "JPEG")
+        buf.seek(0)
+        response = self.client.post("/upload", headers=self.headers(), data={"image": (buf, "photo.jpg")})
+        url = "/variants/320/webp/" + response.get_json().get("url", "/media/missing").lstrip("/")
+        self.client.get(url).close()
+        return url
+
+    def _count(self, *args):
+        self.statements += 1
+
+    def headers(self, admin: bool = False):
+        return self.tokens[self.admin_id if admin else self.rnd.choice(self.user_ids)]
+
+    def call(self, method: str, path: str, **kwargs):
+        before = self.statements
+        start = time.perf_counter()
+        response = self.client.open(path, method=method, **kwargs)
+        elapsed = time.perf_counter() - start
+        response.close()
+        return elapsed, self.statements - before, response.status_code
+
+    # ---------------------------------------
+    # SCENARIOS: each returns (method, path, kwargs)
+    # ---------------------------------------
+    def scenarios(self):
+        rnd = self.rnd
+        return {
+            "GET /posts": lambda: ("GET", "/posts", {"headers": self.headers()}),
+            "GET /posts?sort=trending": lambda: (
+                "GET", "/posts", {"headers": self.headers(), "query_string": {"sort": "trending"}},
+            ),
+            "GET /polls": lambda: ("GET", "/polls", {"headers": self.headers()}),
+            "GET /notifications": lambda: ("GET", "/notifications", {"headers": self.headers()}),
+            "GET /users/search": lambda: (
+                "GET", "/users/search",
+                {"headers": self.headers(), "query_string": {"q": rnd.choice(self.names)[: rnd.randint(1, 5)]}},
+            ),
+            "GET /posts/<id>/replies": lambda: (
+                "GET", f"/posts/{rnd.choice(self.post_ids)}/replies", {"headers": self.headers()},
+            ),
+            "POST /posts": lambda: (
+                "POST", "/posts", {"headers": self.headers(), "data": {"content": "Benchmark post"}},
+            ),
+            "POST /replies": lambda: (
+                "POST", "/replies",
+                {"headers": self.headers(), "data": {"post_id": str(rnd.choice(self.post_ids)),
+                                                     "content": "Benchmark reply"}},
+            ),
+            "POST /posts/<id>/like": lambda: (
+                "POST", f"/posts/{rnd.choice(self.post_ids)}/like", {"headers": self.headers()},
+            ),
+            "PUT /posts/<id>/like": lambda: (
+                "PUT", f"/posts/{rnd.choice(self.post_ids)}/like", {"headers": self.headers()},
+            ),
+            "POST /likes/state": lambda: (
+                "POST", "/likes/state",
+                {"headers": self.headers(), "json": {"postIds": rnd.sample(self.post_ids, min(200, len(self.post_ids)))}},
+            ),
+            "POST /upload": lambda: (
+                "POST", "/upload",
+                {"headers": self.headers(), "data": {"image": (io.BytesIO(self._image()), "bench.png")}},
+            ),
+            "GET /media/<key>": lambda: ("GET", self.media_url, {}),
+            "GET /variants/<w>/<fmt>/<key>": lambda: ("GET", self.variant_url, {}),
+            "POST /polls/<id>/vote": lambda: self._vote(),
+            "GET /analytics": lambda: ("GET", "/analytics", {"headers": self.headers(admin=True)}),
+            "GET /analytics/department": lambda: (
+                "GET", "/analytics/department",
+                {"headers": self.headers(admin=True), "query_string": {"name": rnd.choice(self.departments)}},
+            ),
+            "GET /analytics/employees/<id>": lambda: (
+                "GET", f"/analytics/employees/{rnd.choice(self.user_ids)}", {"headers": self.headers(admin=True)},
+            ),
+            "GET /leaderboard": lambda: (
+                "GET", "/leaderboard",
+                {"headers": self.headers(), "query_string": {"window": rnd.choice(("day", "week", "quarter", "all"))}},
+            ),
+            "POST /notifications/<id>/read": lambda: self._read_notification(),
+        }
+
+    def _vote(self):
+        poll_id = self.rnd.choice(self.poll_ids)
+        with self.app.app_context():
+            from models import PollOption, Poll
+            from extensions import db
+            option_id = db.session.query(PollOption.id).filter_by(poll_id=poll_id).limit(1).scalar()
+            # keep the poll open so the vote path is exercised rather than the 404
+            db.session.query(Poll).filter_by(id=poll_id).update(
+                {"end_at": datetime.utcnow() + timedelta(days=7)}
+            )
+            db.session.commit()
+        return "POST", f"/polls/{poll_id}/vote", {"headers": self.headers(), "json": {"option_id": option_id}}
+
+    def _read_notification(self):
+        uid = self.rnd.choice([u for u in self.user_ids if self.notif_ids[u]] or self.user_ids)
+        ids = self.notif_ids[uid] or [0]
+        return "POST", f"/notifications/{self.rnd.choice(ids)}/read", {"headers": self.tokens[uid]}
+
+    def measure(self, name: str, make_request, iterations: int, warmup: int):
+        for _ in range(warmup):
+            method, path, kwargs = make_request()
+            self.call(method, path, **kwargs)
+        latencies, queries, statuses = [], [], {}
+        for _ in range(iterations):
+            method, path, kwargs = make_request()
+            elapsed, n, status = self.call(method, path, **kwargs)
+            latencies.append(elapsed * 1000)
+            queries.append(n)
+            statuses[status] = statuses.get(status, 0) + 1
+        return {
+            "iterations": iterations,
+            "p50_ms": round(percentile(latencies, 50), 3),
+            "p95_ms": round(percentile(latencies, 95), 3),
+            "p99_ms": round(percentile(latencies, 99), 3),
+            "mean_ms": round(statistics.fmean(latencies), 3),
+            "queries_per_request": round(statistics.fmean(queries), 2),
+            "max_queries": max(queries),
+            "statuses": {str(k): v for k, v in sorted(statuses.items())},
+        }
+
+
+def print_table(results, baseline=None):
+    header = f"{'endpoint':32s} {'p50':>9s} {'p95':>9s} {'p99':>9s} {'queries':>8s}"
+    if baseline:
+        header += f" {'p50 vs base':>12s} {'queries vs base':>16s}"
+    print(header)
+    for name, r in results["endpoints"].items():
+        line = f"{name:32s} {r['p50_ms']:9.2f} {r['p95_ms']:9.2f} {r['p99_ms']:9.2f} {r['queries_per_request']:8.1f}"
+        base = (baseline or {}).get("endpoints", {}).get(name)
+        if base:
+            delta = (r["p50_ms"] - base["p50_ms"]) / base["p50_ms"] * 100 if base["p50_ms"] else 0.0
+            line += f" {delta:+11.1f}% {r['queries_per_request'] - base['queries_per_request']:+16.1f}"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the endpoint benchmark suite.")
+    parser.add_argument("--db", required=True, help="SQLite file produced by benchmarks.synthetic_org")
+    parser.add_argument("--out", default="bench_results.json", help="machine-readable results file")
+    parser.add_argument("--compare", help="previous results file to diff against")
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--users", type=int, default=50, help="distinct callers to rotate through")
+    parser.add_argument("--only", action="append", help="run only endpoints containing this text")
+    parser.add_argument("--in-place", action="store_true",
+                        help="run writes against --db itself instead of a scratch copy")
+    args = parser.parse_args()
+
+    db_path = os.path.abspath(args.db)
+    scratch = None
+    if not args.in_place:
+        scratch = tempfile.NamedTemporaryFile(suffix=".db", delete=False).name
+        shutil.copyfile(db_path, scratch)
+        db_path = scratch
+
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    os.environ.setdefault("JWT_TOKEN_KEY", "benchmark-secret-key-with-enough-bytes")
+    os.environ["PERSPECTIVE_API_KEY"] = ""  # never call out during a benchmark
+    media_root = tempfile.mkdtemp(prefix="bench-media-")
+    os.environ["STORAGE_BACKEND"] = "local"  # uploads land on disk, not Cloudinary
+    os.environ["LOCAL_STORAGE_ROOT"] = media_root
+    os.environ["VARIANTS_ROOT"] = os.path.join(media_root, "variants")
+
+    from app import app, db
+
+    harness = Harness(app, db, users=args.users)
+    results = {
+        "commit": git_commit(),
+        "timestamp": datetime.utcnow().isoformat() + "Z",
+        "python": platform.python_version(),
+        "database": os.path.basename(args.db),
+        "iterations": args.iterations,
+        "endpoints": {},
+    }
+    try:
+        for name, make_request in harness.scenarios().items():
+            if args.only and not any(o in name for o in args.only):
+                continue
+            results["endpoints"][name] = harness.measure(name, make_request, args.iterations, args.warmup)
+            r = results["endpoints"][name]
+            print(f"  {name:32s} p50 {r['p50_ms']:8.2f} ms  {r['queries_per_request']:6.1f} queries")
+    finally:
+        if scratch:
+            os.unlink(scratch)
+        shutil.rmtree(media_root, ignore_errors=True)
+
+    with open(args.out, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults for {results['commit']} written to {args.out}\n")
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(f"Compared with {baseline.get('commit')}:")
+    print_table(results, baseline)
+
+
+if __name__ == "__main__":
+    main()
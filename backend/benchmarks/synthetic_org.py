@@ -0,0 +1,247 @@
+# benchmarks/synthetic_org.py
+"""
+Generate a synthetic organization into a fresh SQLite database.
+
+Distributions are skewed the way a real feed is: a few people post most of
+the content, a few posts collect most of the likes, poll turnout varies per
+poll and votes favour one or two options.
+
+    cd backend
+    python -m benchmarks.synthetic_org --db /tmp/org.db --scale large
+"""
+import argparse
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+SCALES = {
+    "tiny":   dict(users=60,     posts=300,     replies=600,       likes=1_500,     polls=5,     notifications=5),
+    "small":  dict(users=500,    posts=5_000,   replies=10_000,    likes=20_000,    polls=20,    notifications=10),
+    "medium": dict(users=5_000,  posts=50_000,  replies=100_000,   likes=200_000,   polls=200,   notifications=20),
+    "large":  dict(users=20_000, posts=500_000, replies=1_000_000, likes=2_000_000, polls=1_000, notifications=20),
+}
+
+DEPARTMENTS = ["IT", "Human Resources", "Design", "Quality Assurance", "Management",
+               "Marketing", "Finance", "Data", "Support", "Sales", "Legal", "Operations"]
+FIRST_NAMES = ["Emma", "Jason", "Aung", "Mary", "John", "Michelle", "Nathan", "Sophie", "Daniel",
+               "Grace", "Benjamin", "Karen", "Lucas", "Elena", "Ryan", "Mei", "Kyaw", "Siti", "Arjun", "Hana"]
+LAST_NAMES = ["Tan", "Lim", "Ko", "Soo", "Lee", "Yeo", "Goh", "Chan", "Wong", "Ho", "Lu", "Chua",
+              "Park", "Phyo", "Ng", "Kumar", "Thwe", "Rahman", "Sato", "Nguyen"]
+WORDS = ("great work team release sprint review thanks welcome congrats launch customer demo "
+         "quarter goal deadline lunch office update meeting design feedback milestone support").split()
+
+CHUNK = 20_000
+
+
+def _sentence(rnd: random.Random, low: int = 6, high: int = 30) -> str:
+    return " ".join(rnd.choice(WORDS) for _ in range(rnd.randint(low, high))).capitalize() + "."
+
+
+def _skewed_pick(rnd: random.Random, n: int, power: float = 3.0) -> int:
+    """Index in [0, n) skewed towards 0; with power=3 the first 1% gets ~21% of picks."""
+    return min(int(n * rnd.random() ** power), n - 1)
+
+
+def _insert(db, table, rows):
+    for start in range(0, len(rows), CHUNK):
+        db.session.execute(table.insert(), rows[start:start + CHUNK])
+
+
+def generate(db, users, posts, replies, likes, polls, notifications, seed=42, now=None, log=print):
+    """
+    Bulk-insert a synthetic org with Core statements. Expects empty tables;
+    ids are assigned explicitly starting at 1.
+    """
+    from models import User, Post, Reply, Like, Poll, PollOption, Vote, Notification
+
+    rnd = random.Random(seed)
+    now = now or datetime.utcnow()
+    span = timedelta(days=730)
+    timer = time.perf_counter()
+
+    def done(what, count):
+        nonlocal timer
+        log(f"  {what:14s} {count:>10,d}  ({time.perf_counter() - timer:.1f}s)")
+        timer = time.perf_counter()
+
+    # users: a handful of admins, the rest employees
+    admin_count = max(2, users // 500)
+    user_rows = []
+    for i in range(1, users + 1):
+        first, last = rnd.choice(FIRST_NAMES), rnd.choice(LAST_NAMES)
+        created = now - span * rnd.random()
+        user_rows.append({
+            "id": i,
+            "login_id": f"{'A' if i <= admin_count else 'E'}{i:06d}",
+            "name": f"{first} {last}",
+            "password": f"Emp@{i}",
+            "role": "admin" if i <= admin_count else "employee",
+            "avatar_url": "statics/profile/" + rnd.choice(["male.jpg", "female.png"]),
+            "email": f"{first.lower()}.{last.lower()}{i}@example.com",
+            "position": rnd.choice(["Engineer", "Manager", "Analyst", "Designer", "Executive"]),
+            "department": rnd.choice(DEPARTMENTS),
+            "created_at": created,
+            "updated_at": created,
+        })
+    _insert(db, User.__table__, user_rows)
+    done("users", users)
+
+    # posts: heavy-tailed authorship, newest ids are newest posts
+    post_times = sorted((now - span * rnd.random() for _ in range(posts)))
+    post_rows = [{
+        "id": i + 1,
+        "author_id": _skewed_pick(rnd, users, 2.0) + 1,
+        "content": _sentence(rnd),
+        "image_url": None,
+        "gif_url": None,
+        "pinned": rnd.random() < 0.0005,
+        "created_at": post_times[i],
+        "edited_at": None,
+    } for i in range(posts)]
+    _insert(db, Post.__table__, post_rows)
+    done("posts", posts)
+
+    # replies cluster on popular posts
+    reply_rows = []
+    for i in range(replies):
+        post = post_rows[posts - 1 - _skewed_pick(rnd, posts)]
+        reply_rows.append({
+            "id": i + 1,
+            "post_id": post["id"],
+            "author_id": rnd.randint(1, users),
+            "content": _sentence(rnd, 2, 15),
+            "image_url": None,
+            "gif_url": None,
+            "created_at": post["created_at"] + timedelta(minutes=rnd.randint(1, 60 * 24 * 7)),
+            "edited_at": None,
+        })
+    _insert(db, Reply.__table__, reply_rows)
+    done("replies", replies)
+
+    # likes: 80% on posts, 20% on replies; unique per (user, target)
+    like_rows = []
+    seen = set()
+    made = 0
+    while made < likes:
+        on_post = rnd.random() < 0.8 or not replies
+        count = posts if on_post else replies
+        target = count - _skewed_pick(rnd, count)
+        user_id = rnd.randint(1, users)
+        key = (on_post, target, user_id)
+        if key in seen:
+            continue
+        seen.add(key)
+        made += 1
+        like_rows.append({
+            "id": made,
+            "user_id": user_id,
+            "post_id": target if on_post else None,
+            "reply_id": None if on_post else target,
+            "created_at": now - span * rnd.random(),
+        })
+        if len(like_rows) >= CHUNK:
+            _insert(db, Like.__table__, like_rows)
+            like_rows = []
+    _insert(db, Like.__table__, like_rows)
+    done("likes", made)
+    del seen
+
+    # polls: 2-6 options, turnout ~ Beta(2, 18) of headcount, options weighted by Gamma draws
+    poll_rows, option_rows, vote_rows = [], [], []
+    option_id = vote_id = 0
+    for i in range(1, polls + 1):
+        created = now - span * rnd.random()
+        poll_rows.append({
+            "id": i,
+            "title": f"Poll {i}: {_sentence(rnd, 3, 8)}",
+            "description": _sentence(rnd),
+            "created_by_id": rnd.randint(1, admin_count),
+            "created_at": created,
+            "end_at": created + timedelta(days=rnd.randint(1, 30)),
+            "is_active": True,
+        })
+        ids = []
+        for _ in range(rnd.randint(2, 6)):
+            option_id += 1
+            ids.append(option_id)
+            option_rows.append({"id": option_id, "poll_id": i, "text": _sentence(rnd, 1, 4)})
+        weights = [rnd.gammavariate(0.8, 1.0) for _ in ids]
+        turnout = int(users * rnd.betavariate(2, 18))
+        for user_id in rnd.sample(range(1, users + 1), turnout):
+            vote_id += 1
+            vote_rows.append({
+                "id": vote_id,
+                "user_id": user_id,
+                "poll_option_id": rnd.choices(ids, weights)[0],
+                "created_at": created + timedelta(minutes=rnd.randint(1, 60 * 24)),
+            })
+    _insert(db, Poll.__table__, poll_rows)
+    _insert(db, PollOption.__table__, option_rows)
+    _insert(db, Vote.__table__, vote_rows)
+    done("polls", polls)
+    done("votes", vote_id)
+
+    # notifications: a recent tail per user, mostly tags and admin announcements
+    notif_rows = []
+    notif_id = 0
+    for user_id in range(1, users + 1):
+        for _ in range(rnd.randint(0, notifications * 2)):
+            notif_id += 1
+            post = post_rows[posts - 1 - _skewed_pick(rnd, posts, 4.0)] if posts else None
+            tagged = rnd.random() < 0.5
+            notif_rows.append({
+                "id": notif_id,
+                "user_id": user_id,
+                "actor_id": post["author_id"] if post else None,
+                "action_type": "tagged" if tagged else "new_post",
+                "message": "You were tagged in a post" if tagged else "An admin created a new post",
+                "created_at": now - timedelta(days=30) * rnd.random(),
+                "is_read": rnd.random() < 0.6,
+                "post_id": post["id"] if post else None,
+                "reply_id": None,
+                "poll_id": None,
+            })
+        if len(notif_rows) >= CHUNK:
+            _insert(db, Notification.__table__, notif_rows)
+            notif_rows = []
+    _insert(db, Notification.__table__, notif_rows)
+    done("notifications", notif_id)
+
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic organization into a SQLite file.")
+    parser.add_argument("--db", required=True, help="path of the SQLite file to create")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--force", action="store_true", help="overwrite an existing file")
+    for name in SCALES["small"]:
+        parser.add_argument(f"--{name}", type=int, help=f"override the scale's {name} count")
+    args = parser.parse_args()
+
+    if os.path.exists(args.db):
+        if not args.force:
+            parser.error(f"{args.db} exists; pass --force to overwrite")
+        os.unlink(args.db)
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.abspath(args.db)}"
+
+    from app import app, db
+    from trending import refresh_trending
+
+    sizes = dict(SCALES[args.scale])
+    sizes.update({k: getattr(args, k) for k in sizes if getattr(args, k) is not None})
+    started = time.perf_counter()
+    with app.app_context():
+        db.create_all()
+        db.session.execute(db.text("PRAGMA synchronous=OFF"))
+        print(f"Generating {args.scale} org into {args.db}: {sizes}")
+        generate(db, seed=args.seed, **sizes)
+        # the triggers counted every like in full; decay them as the running app would
+        refresh_trending(app.config["TRENDING_HALF_LIFE"])
+    print(f"Done in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+# compression.py
+"""
+Negotiated gzip/brotli compression of API responses.
+
+- the encoding is picked from Accept-Encoding (q-values honoured, brotli
+  preferred on a tie) and only used for text-like mimetypes
+- buffered bodies under COMPRESS_MIN_SIZE bytes are sent as-is
+- streamed bodies are compressed chunk by chunk and flushed after each
+  chunk, so the client still sees data as it is produced
+- a strong or weak ETag gets an encoding suffix ("abc" -> "abc-gzip") so
+  caches never mix representations; the suffix is stripped from incoming
+  If-None-Match / If-Match before the view runs, so conditional requests
+  keep matching the view's own ETag, and a 304 answers with the suffixed tag
+- file responses (send_file / send_from_directory) pass through untouched
+
+Brotli needs the optional `brotli` package; without it only gzip is offered.
+"""
+import gzip
+import zlib
+
+from flask import current_app, g, request
+
+try:
+    import brotli
+except ImportError:  # optional
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = {
+    "application/json",
+    "application/javascript",
+    "image/svg+xml",
+    "text/html",
+    "text/css",
+    "text/plain",
+    "text/csv",
+    "text/javascript",
+}
+ETAG_SUFFIXES = ("-br", "-gzip")
+
+
+def available_encodings():
+    return ["br", "gzip"] if brotli is not None else ["gzip"]
+
+
+def _compress(data: bytes, encoding: str, config) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=config["COMPRESS_BR_LEVEL"])
+    return gzip.compress(data, compresslevel=config["COMPRESS_LEVEL"], mtime=0)
+
+
+def _compress_stream(chunks, encoding: str, config):
+    if encoding == "br":
+        compressor = brotli.Compressor(quality=config["COMPRESS_BR_LEVEL"])
+        for chunk in chunks:
+            if chunk:
+                yield compressor.process(chunk) + compressor.flush()
+        yield compressor.finish()
+    else:
+        compressor = zlib.compressobj(config["COMPRESS_LEVEL"], zlib.DEFLATED, 31)  # 31 = gzip container
+        for chunk in chunks:
+            if chunk:
+                yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        yield compressor.flush()
+
+
+def _strip_etag_suffix(header: str):
+    """Returns the header without encoding suffixes and the last suffix seen."""
+    tags, seen = [], None
+    for tag in header.split(","):
+        tag = tag.strip()
+        for suffix in ETAG_SUFFIXES:
+            if tag.endswith(suffix + '"'):
+                tag = tag[: -len(suffix) - 1] + '"'
+                seen = suffix[1:]
+                break
+        tags.append(tag)
+    return ", ".join(tags), seen
+
+
+def _should_compress(response) -> bool:
+    return (
+        200 <= response.status_code < 300
+        and response.status_code != 204
+        and request.method != "HEAD"
+        and not response.direct_passthrough
+        and "Content-Encoding" not in response.headers
+        and response.mimetype in COMPRESSIBLE_MIMETYPES
+        and "no-transform" not in (response.headers.get("Cache-Control") or "")
+    )
+
+
+def init_compression(app):
+    app.config.setdefault("COMPRESS_ENABLED", True)
+    app.config.setdefault("COMPRESS_MIN_SIZE", 1024)
+    app.config.setdefault("COMPRESS_LEVEL", 6)
+    app.config.setdefault("COMPRESS_BR_LEVEL", 5)
+
+    @app.before_request
+    def _strip_conditional_etags():
+        for key in ("HTTP_IF_NONE_MATCH", "HTTP_IF_MATCH"):
+            value = request.environ.get(key)
+            if value and any(s + '"' in value for s in ETAG_SUFFIXES):
+                request.environ[key], g._etag_encoding = _strip_etag_suffix(value)
+                # werkzeug caches the parsed headers on first access
+                request.__dict__.pop(key[5:].lower(), None)
+
+    @app.after_request
+    def _compress_response(response):
+        config = current_app.config
+        if response.status_code == 304 and g.get("_etag_encoding"):
+            etag, weak = response.get_etag()
+            if etag:
+                response.set_etag(f"{etag}-{g._etag_encoding}", weak=weak)
+            return response
+        if not config["COMPRESS_ENABLED"] or not _should_compress(response):
+            return response
+
+        response.vary.add("Accept-Encoding")
+        encoding = request.accept_encodings.best_match(available_encodings())
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            original = response.response
+            response.response = _compress_stream(response.iter_encoded(), encoding, config)
+            response.call_on_close(getattr(original, "close", lambda: None))
+            response.headers.pop("Content-Length", None)
+        else:
+            data = response.get_data()
+            if len(data) < config["COMPRESS_MIN_SIZE"]:
+                return response
+            response.set_data(_compress(data, encoding, config))
+
+        response.headers["Content-Encoding"] = encoding
+        etag, weak = response.get_etag()
+        if etag:
+            response.set_etag(f"{etag}-{encoding}", weak=weak)
+        return response
@@ -0,0 +1,388 @@
+# counters.py
+"""
+Stored counters maintained by SQLite triggers.
+
+`posts.reply_count` is bumped by inserts and deletes on `replies` (a
+soft-deleted reply stops counting when `deleted_at` is set), and
+`posts.like_count` / `replies.like_count` by inserts and deletes on `likes`,
+including the ORM cascades, so totals never need a COUNT at read time.
+
+`media_assets.ref_count` counts the posts and replies whose image_url or
+gif_url points at an asset; media.py garbage-collects assets left at zero.
+
+`engagement_user_daily` / `engagement_department_daily` count each user's
+and department's posts, replies, likes given and received and poll votes
+per day; see analytics.py. `leaderboard_buckets` counts the likes each
+author received per day, week, quarter and all time; see leaderboard.py.
+`trending_posts` adds a fixed weight per like and live reply to a post's
+score; trending.py decays it.
+
+`sync_versions` holds one counter per client-visible section ("posts",
+"polls") that any write touching that section bumps; clients hand the
+versions back as `since` tokens to skip sections that have not changed.
+"""
+from typing import Dict, List
+
+from sqlalchemy import event
+
+COUNTER_TRIGGERS = {
+    "replies_count_ai": (
+        "CREATE TRIGGER IF NOT EXISTS replies_count_ai AFTER INSERT ON replies BEGIN "
+        "UPDATE posts SET reply_count = reply_count + 1 WHERE id = new.post_id; END"
+    ),
+    "replies_count_ad": (
+        "CREATE TRIGGER IF NOT EXISTS replies_count_ad AFTER DELETE ON replies "
+        "WHEN old.deleted_at IS NULL BEGIN "
+        "UPDATE posts SET reply_count = reply_count - 1 WHERE id = old.post_id; END"
+    ),
+    "replies_count_au": (
+        "CREATE TRIGGER IF NOT EXISTS replies_count_au AFTER UPDATE OF deleted_at ON replies "
+        "WHEN (old.deleted_at IS NULL) != (new.deleted_at IS NULL) BEGIN "
+        "UPDATE posts SET reply_count = reply_count + "
+        "CASE WHEN new.deleted_at IS NULL THEN 1 ELSE -1 END WHERE id = new.post_id; END"
+    ),
+    "likes_count_ai": (
+        "CREATE TRIGGER IF NOT EXISTS likes_count_ai AFTER INSERT ON likes BEGIN "
+        "UPDATE posts SET like_count = like_count + 1 WHERE id = new.post_id; "
+        "UPDATE replies SET like_count = like_count + 1 WHERE id = new.reply_id; END"
+    ),
+    "likes_count_ad": (
+        "CREATE TRIGGER IF NOT EXISTS likes_count_ad AFTER DELETE ON likes BEGIN "
+        "UPDATE posts SET like_count = like_count - 1 WHERE id = old.post_id; "
+        "UPDATE replies SET like_count = like_count - 1 WHERE id = old.reply_id; END"
+    ),
+}
+
+# media references: each write touching image_url/gif_url moves the asset's ref_count
+MEDIA_COLUMNS = ("image_url", "gif_url")
+
+
+def _media_refs(row: str, delta: str) -> str:
+    return "".join(
+        f"UPDATE media_assets SET ref_count = ref_count {delta} 1, last_used_at = CURRENT_TIMESTAMP "
+        f"WHERE url = {row}.{column}; "
+        for column in MEDIA_COLUMNS
+    )
+
+
+def media_ref_triggers() -> Dict[str, str]:
+    triggers = {}
+    for table in ("posts", "replies"):
+        triggers[f"media_refs_{table}_ai"] = (
+            f"CREATE TRIGGER IF NOT EXISTS media_refs_{table}_ai AFTER INSERT ON {table} BEGIN "
+            f"{_media_refs('new', '+')}END"
+        )
+        triggers[f"media_refs_{table}_ad"] = (
+            f"CREATE TRIGGER IF NOT EXISTS media_refs_{table}_ad AFTER DELETE ON {table} BEGIN "
+            f"{_media_refs('old', '-')}END"
+        )
+        triggers[f"media_refs_{table}_au"] = (
+            f"CREATE TRIGGER IF NOT EXISTS media_refs_{table}_au AFTER UPDATE OF {', '.join(MEDIA_COLUMNS)} "
+            f"ON {table} BEGIN {_media_refs('old', '-')}{_media_refs('new', '+')}END"
+        )
+    return triggers
+
+
+COUNTER_TRIGGERS.update(media_ref_triggers())
+
+# engagement rollups (analytics.py): per user and per department, per UTC day of the row's created_at
+ROLLUP_METRICS = ("posts", "replies", "likes_given", "likes_received", "votes")
+LIKED_AUTHOR = (
+    "COALESCE((SELECT author_id FROM posts WHERE id = {row}.post_id), "
+    "(SELECT author_id FROM replies WHERE id = {row}.reply_id))"
+)
+
+
+def _day(row: str) -> str:
+    return f"COALESCE(date({row}.created_at), date('now'))"
+
+
+def _rollup_add(metric: str, user: str, day: str) -> str:
+    # the department row takes the department from the user row, so the two tables always agree
+    return (
+        f"INSERT INTO engagement_user_daily (user_id, day, department, {metric}) "
+        f"SELECT {user}, {day}, COALESCE((SELECT department FROM users WHERE id = {user}), ''), 1 "
+        f"WHERE {user} IS NOT NULL "
+        f"ON CONFLICT (user_id, day) DO UPDATE SET {metric} = {metric} + 1; "
+        f"INSERT INTO engagement_department_daily (department, day, {metric}) "
+        f"SELECT department, day, 1 FROM engagement_user_daily WHERE user_id = {user} AND day = {day} "
+        f"ON CONFLICT (department, day) DO UPDATE SET {metric} = {metric} + 1; "
+    )
+
+
+def _rollup_sub(metric: str, user: str, day: str) -> str:
+    # the user row names the department, so it is updated last
+    return (
+        f"UPDATE engagement_department_daily SET {metric} = {metric} - 1 WHERE day = {day} AND department = "
+        f"(SELECT department FROM engagement_user_daily WHERE user_id = {user} AND day = {day}); "
+        f"UPDATE engagement_user_daily SET {metric} = {metric} - 1 WHERE user_id = {user} AND day = {day}; "
+    )
+
+
+def _likes_received_sub(column: str) -> str:
+    """Take back every like on a post/reply about to be deleted, grouped by the day it was given."""
+    liked_on = f"SELECT count(*) FROM likes WHERE {column} = old.id AND {_day('likes')} = {{table}}.day"
+    days = f"SELECT {_day('likes')} FROM likes WHERE {column} = old.id"
+    return (
+        f"UPDATE engagement_department_daily SET likes_received = likes_received - "
+        f"({liked_on.format(table='engagement_department_daily')}) "
+        f"WHERE department = (SELECT department FROM engagement_user_daily WHERE user_id = old.author_id LIMIT 1) "
+        f"AND day IN ({days}); "
+        f"UPDATE engagement_user_daily SET likes_received = likes_received - "
+        f"({liked_on.format(table='engagement_user_daily')}) "
+        f"WHERE user_id = old.author_id AND day IN ({days}); "
+    )
+
+
+def rollup_triggers() -> Dict[str, str]:
+    """
+    Database cascades delete a post's likes after the post row is gone, when
+    its author can no longer be looked up. So a post or reply takes back its
+    likes_received in a BEFORE DELETE trigger, and a like's own delete
+    trigger only does so while the liked row still exists (a plain unlike).
+    """
+    triggers = {}
+    for table, metric in (("posts", "posts"), ("replies", "replies")):
+        triggers[f"engagement_{table}_ai"] = (
+            f"CREATE TRIGGER IF NOT EXISTS engagement_{table}_ai AFTER INSERT ON {table} BEGIN "
+            f"{_rollup_add(metric, 'new.author_id', _day('new'))}END"
+        )
+        triggers[f"engagement_{table}_ad"] = (
+            f"CREATE TRIGGER IF NOT EXISTS engagement_{table}_ad AFTER DELETE ON {table} BEGIN "
+            f"{_rollup_sub(metric, 'old.author_id', _day('old'))}END"
+        )
+        column = "post_id" if table == "posts" else "reply_id"
+        triggers[f"engagement_{table}_bd"] = (
+            f"CREATE TRIGGER IF NOT EXISTS engagement_{table}_bd BEFORE DELETE ON {table} BEGIN "
+            f"{_likes_received_sub(column)}END"
+        )
+    triggers["engagement_likes_ai"] = (
+        "CREATE TRIGGER IF NOT EXISTS engagement_likes_ai AFTER INSERT ON likes BEGIN "
+        f"{_rollup_add('likes_given', 'new.user_id', _day('new'))}"
+        f"{_rollup_add('likes_received', LIKED_AUTHOR.format(row='new'), _day('new'))}END"
+    )
+    triggers["engagement_likes_ad"] = (
+        "CREATE TRIGGER IF NOT EXISTS engagement_likes_ad AFTER DELETE ON likes BEGIN "
+        f"{_rollup_sub('likes_given', 'old.user_id', _day('old'))}"
+        f"{_rollup_sub('likes_received', LIKED_AUTHOR.format(row='old'), _day('old'))}END"
+    )
+    triggers["engagement_votes_ai"] = (
+        "CREATE TRIGGER IF NOT EXISTS engagement_votes_ai AFTER INSERT ON votes BEGIN "
+        f"{_rollup_add('votes', 'new.user_id', _day('new'))}END"
+    )
+    triggers["engagement_votes_ad"] = (
+        "CREATE TRIGGER IF NOT EXISTS engagement_votes_ad AFTER DELETE ON votes BEGIN "
+        f"{_rollup_sub('votes', 'old.user_id', _day('old'))}END"
+    )
+    # a user moving department takes their history along
+    moved = ", ".join(f"{m} = engagement_department_daily.{m} - u.{m}" for m in ROLLUP_METRICS)
+    added = ", ".join(f"{m} = {m} + excluded.{m}" for m in ROLLUP_METRICS)
+    metrics = ", ".join(ROLLUP_METRICS)
+    triggers["engagement_users_department_au"] = (
+        "CREATE TRIGGER IF NOT EXISTS engagement_users_department_au AFTER UPDATE OF department ON users "
+        "WHEN COALESCE(old.department, '') != COALESCE(new.department, '') BEGIN "
+        f"UPDATE engagement_department_daily SET {moved} FROM engagement_user_daily AS u "
+        "WHERE u.user_id = new.id AND u.day = engagement_department_daily.day "
+        "AND u.department = engagement_department_daily.department; "
+        f"INSERT INTO engagement_department_daily (department, day, {metrics}) "
+        f"SELECT COALESCE(new.department, ''), day, {metrics} FROM engagement_user_daily WHERE user_id = new.id "
+        f"ON CONFLICT (department, day) DO UPDATE SET {added}; "
+        "UPDATE engagement_user_daily SET department = COALESCE(new.department, '') WHERE user_id = new.id; END"
+    )
+    # runs after the cascades above have taken back everything the user did
+    triggers["engagement_users_ad"] = (
+        "CREATE TRIGGER IF NOT EXISTS engagement_users_ad AFTER DELETE ON users BEGIN "
+        "DELETE FROM engagement_user_daily WHERE user_id = old.id; END"
+    )
+    return triggers
+
+
+COUNTER_TRIGGERS.update(rollup_triggers())
+
+
+# leaderboard buckets (leaderboard.py): likes received per author per day, week, quarter and all time
+def leaderboard_buckets(row: str) -> List[str]:
+    """SQL for the bucket keys a like given at {row}.created_at counts in."""
+    ts = f"COALESCE({row}.created_at, CURRENT_TIMESTAMP)"
+    return [
+        f"'day:' || date({ts})",
+        f"'week:' || date({ts}, '-6 days', 'weekday 1')",
+        f"'quarter:' || strftime('%Y', {ts}) || '-Q' || ((CAST(strftime('%m', {ts}) AS INTEGER) + 2) / 3)",
+        "'all'",
+    ]
+
+
+def _received_likes_taken_back(column: str) -> str:
+    # the same cascade problem as the rollups: take back a post's likes before it goes
+    return (
+        "UPDATE leaderboard_buckets SET likes = likes - "
+        f"(SELECT count(*) FROM likes WHERE {column} = old.id "
+        f"AND leaderboard_buckets.bucket IN ({', '.join(leaderboard_buckets('likes'))})) "
+        f"WHERE user_id = old.author_id AND bucket IN ("
+        + " UNION ".join(f"SELECT {key} FROM likes WHERE {column} = old.id" for key in leaderboard_buckets("likes"))
+        + "); "
+    )
+
+
+def leaderboard_triggers() -> Dict[str, str]:
+    new_author, old_author = LIKED_AUTHOR.format(row="new"), LIKED_AUTHOR.format(row="old")
+    keys = " UNION ALL ".join(f"SELECT {key} AS bucket" for key in leaderboard_buckets("new"))
+    return {
+        "leaderboard_likes_ai": (
+            "CREATE TRIGGER IF NOT EXISTS leaderboard_likes_ai AFTER INSERT ON likes BEGIN "
+            f"INSERT INTO leaderboard_buckets (bucket, user_id, likes) "
+            f"SELECT k.bucket, {new_author}, 1 FROM ({keys}) AS k WHERE {new_author} IS NOT NULL "
+            "ON CONFLICT (bucket, user_id) DO UPDATE SET likes = likes + 1; END"
+        ),
+        "leaderboard_likes_ad": (
+            "CREATE TRIGGER IF NOT EXISTS leaderboard_likes_ad AFTER DELETE ON likes BEGIN "
+            f"UPDATE leaderboard_buckets SET likes = likes - 1 WHERE user_id = {old_author} "
+            f"AND bucket IN ({', '.join(leaderboard_buckets('old'))}); END"
+        ),
+        "leaderboard_posts_bd": (
+            "CREATE TRIGGER IF NOT EXISTS leaderboard_posts_bd BEFORE DELETE ON posts BEGIN "
+            f"{_received_likes_taken_back('post_id')}END"
+        ),
+        "leaderboard_replies_bd": (
+            "CREATE TRIGGER IF NOT EXISTS leaderboard_replies_bd BEFORE DELETE ON replies BEGIN "
+            f"{_received_likes_taken_back('reply_id')}END"
+        ),
+        "leaderboard_users_ad": (
+            "CREATE TRIGGER IF NOT EXISTS leaderboard_users_ad AFTER DELETE ON users BEGIN "
+            "DELETE FROM leaderboard_buckets WHERE user_id = old.id; END"
+        ),
+    }
+
+
+COUNTER_TRIGGERS.update(leaderboard_triggers())
+
+# trending scores (trending.py): an event counts in full when it happens; the refresh job decays it
+TRENDING_WEIGHTS = {"like": 1.0, "reply": 2.0}
+
+
+def _trending_add(post_id: str, weight: float) -> str:
+    return (
+        f"INSERT INTO trending_posts (post_id, score) SELECT {post_id}, {weight} WHERE {post_id} IS NOT NULL "
+        f"ON CONFLICT (post_id) DO UPDATE SET score = score + {weight}; "
+    )
+
+
+def _trending_sub(post_id: str, weight: float) -> str:
+    # the event's decayed share is not known here; the next refresh corrects the clamp
+    return f"UPDATE trending_posts SET score = max(score - {weight}, 0) WHERE post_id = {post_id}; "
+
+
+def trending_triggers() -> Dict[str, str]:
+    like, reply = TRENDING_WEIGHTS["like"], TRENDING_WEIGHTS["reply"]
+    return {
+        "trending_likes_ai": (
+            "CREATE TRIGGER IF NOT EXISTS trending_likes_ai AFTER INSERT ON likes "
+            f"WHEN new.post_id IS NOT NULL BEGIN {_trending_add('new.post_id', like)}END"
+        ),
+        "trending_likes_ad": (
+            "CREATE TRIGGER IF NOT EXISTS trending_likes_ad AFTER DELETE ON likes "
+            f"WHEN old.post_id IS NOT NULL BEGIN {_trending_sub('old.post_id', like)}END"
+        ),
+        "trending_replies_ai": (
+            "CREATE TRIGGER IF NOT EXISTS trending_replies_ai AFTER INSERT ON replies "
+            f"WHEN new.deleted_at IS NULL BEGIN {_trending_add('new.post_id', reply)}END"
+        ),
+        "trending_replies_ad": (
+            "CREATE TRIGGER IF NOT EXISTS trending_replies_ad AFTER DELETE ON replies "
+            f"WHEN old.deleted_at IS NULL BEGIN {_trending_sub('old.post_id', reply)}END"
+        ),
+        # soft delete and restore, like replies_count_au
+        "trending_replies_restored_au": (
+            "CREATE TRIGGER IF NOT EXISTS trending_replies_restored_au AFTER UPDATE OF deleted_at ON replies "
+            "WHEN old.deleted_at IS NOT NULL AND new.deleted_at IS NULL BEGIN "
+            f"{_trending_add('new.post_id', reply)}END"
+        ),
+        "trending_replies_deleted_au": (
+            "CREATE TRIGGER IF NOT EXISTS trending_replies_deleted_au AFTER UPDATE OF deleted_at ON replies "
+            "WHEN old.deleted_at IS NULL AND new.deleted_at IS NOT NULL BEGIN "
+            f"{_trending_sub('new.post_id', reply)}END"
+        ),
+        "trending_posts_ad": (
+            "CREATE TRIGGER IF NOT EXISTS trending_posts_ad AFTER DELETE ON posts BEGIN "
+            "DELETE FROM trending_posts WHERE post_id = old.id; END"
+        ),
+    }
+
+
+COUNTER_TRIGGERS.update(trending_triggers())
+
+# section -> [(table, trigger events)]; author/voter names and avatars are embedded in both
+USER_PROFILE_UPDATE = "UPDATE OF name, avatar_url, email, position, department, role ON users"
+SECTION_SOURCES = {
+    "posts": [("posts", ("INSERT", "UPDATE", "DELETE")), ("users", (USER_PROFILE_UPDATE,))],
+    "polls": [
+        ("polls", ("INSERT", "UPDATE", "DELETE")),
+        ("poll_options", ("INSERT", "UPDATE", "DELETE")),
+        ("votes", ("INSERT", "UPDATE", "DELETE")),
+        ("users", (USER_PROFILE_UPDATE,)),
+    ],
+}
+
+SYNC_TABLE = [
+    "CREATE TABLE IF NOT EXISTS sync_versions ("
+    "section TEXT PRIMARY KEY, version INTEGER NOT NULL DEFAULT 0)",
+]
+
+
+def section_ddl() -> List[str]:
+    stmts = list(SYNC_TABLE)
+    for section in SECTION_SOURCES:
+        stmts.append(f"INSERT OR IGNORE INTO sync_versions (section, version) VALUES ('{section}', 0)")
+    for section, sources in SECTION_SOURCES.items():
+        for table, events in sources:
+            for ev in events:
+                verb = ev.split()[0]
+                target = "" if " ON " in ev else f" ON {table}"
+                name = f"sync_{section}_{table}_a{verb[0].lower()}"
+                stmts.append(
+                    f"CREATE TRIGGER IF NOT EXISTS {name} AFTER {ev}{target} BEGIN "
+                    f"UPDATE sync_versions SET version = version + 1 WHERE section = '{section}'; END"
+                )
+    return stmts
+
+
+RECOUNT = [
+    "UPDATE posts SET reply_count = (SELECT count(*) FROM replies "
+    "WHERE replies.post_id = posts.id AND replies.deleted_at IS NULL)",
+    "UPDATE posts SET like_count = (SELECT count(*) FROM likes WHERE likes.post_id = posts.id)",
+    "UPDATE replies SET like_count = (SELECT count(*) FROM likes WHERE likes.reply_id = replies.id)",
+    "UPDATE media_assets SET ref_count = "
+    "(SELECT count(*) FROM posts WHERE posts.image_url = media_assets.url) + "
+    "(SELECT count(*) FROM posts WHERE posts.gif_url = media_assets.url) + "
+    "(SELECT count(*) FROM replies WHERE replies.image_url = media_assets.url) + "
+    "(SELECT count(*) FROM replies WHERE replies.gif_url = media_assets.url)",
+]
+
+
+def counter_ddl() -> List[str]:
+    return list(COUNTER_TRIGGERS.values()) + section_ddl()
+
+
+def create_counters(connection, recount: bool = False):
+    # counter triggers are dropped first so changed definitions replace old ones
+    for name in COUNTER_TRIGGERS:
+        connection.exec_driver_sql(f"DROP TRIGGER IF EXISTS {name}")
+    for stmt in counter_ddl():
+        connection.exec_driver_sql(stmt)
+    if recount:
+        for stmt in RECOUNT:
+            connection.exec_driver_sql(stmt)
+
+
+def init_counters(app, db):
+    @event.listens_for(db.metadata, "after_create")
+    def _create_counters(target, connection, **kw):
+        if connection.dialect.name == "sqlite":
+            create_counters(connection, recount=True)
+
+    @app.cli.command("counters-rebuild")
+    def counters_rebuild():
+        """Recreate the counter triggers and recount every stored counter."""
+        with db.engine.begin() as connection:
+            create_counters(connection, recount=True)
+        print("Counters rebuilt.")
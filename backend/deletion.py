@@ -0,0 +1,179 @@
+# deletion.py
+"""
+Deleting posts and replies.
+
+Every foreign key carries an ON DELETE clause (see models.py) and SQLite
+enforces them once `PRAGMA foreign_keys=ON` is set on each connection, so
+removing a post is one DELETE: the database drops its replies, likes and
+notifications itself instead of the ORM loading and deleting each child.
+
+With SOFT_DELETE on, a delete only stamps `deleted_at`. The row disappears
+from every read at once, and a background worker purges soft-deleted rows
+in batches of PURGE_BATCH_SIZE, one short transaction per batch. A post's
+replies are removed before the post itself, so even a huge thread never
+turns into one long write lock. The purge runs whatever SOFT_DELETE says:
+moderation (`hide`, moderation.py) stamps `deleted_at` either way.
+"""
+import threading
+from datetime import datetime
+from typing import Optional
+
+from flask import current_app
+from sqlalchemy import delete, event, exists, select
+
+from extensions import db
+from models import Post, Reply
+
+# review status of items hidden by moderation (review.py): kept out of the purge for an admin
+FLAGGED = "flagged"
+
+
+# ---------------------------------------
+# LOOKUPS
+# ---------------------------------------
+def live_post(post_id) -> Optional[Post]:
+    """The post, or None when it does not exist or is soft-deleted."""
+    return db.session.execute(
+        select(Post).where(Post.id == post_id, Post.deleted_at.is_(None))
+    ).scalar_one_or_none()
+
+
+def live_reply(reply_id) -> Optional[Reply]:
+    """The reply, or None when it or its post is soft-deleted."""
+    return db.session.execute(
+        select(Reply)
+        .join(Post, Post.id == Reply.post_id)
+        .where(Reply.id == reply_id, Reply.deleted_at.is_(None), Post.deleted_at.is_(None))
+    ).scalar_one_or_none()
+
+
+# ---------------------------------------
+# DELETES
+# ---------------------------------------
+def _soft_delete_enabled() -> bool:
+    return current_app.config["SOFT_DELETE"]
+
+
+def remove_post(post_id: int):
+    if _soft_delete_enabled():
+        stmt = Post.__table__.update().where(Post.id == post_id).values(deleted_at=datetime.utcnow())
+    else:
+        stmt = delete(Post).where(Post.id == post_id)
+    db.session.execute(stmt.execution_options(synchronize_session=False))
+
+
+def remove_reply(reply_id: int):
+    if _soft_delete_enabled():
+        stmt = Reply.__table__.update().where(Reply.id == reply_id).values(deleted_at=datetime.utcnow())
+    else:
+        stmt = delete(Reply).where(Reply.id == reply_id)
+    db.session.execute(stmt.execution_options(synchronize_session=False))
+
+
+# ---------------------------------------
+# PURGE
+# ---------------------------------------
+def _purge_batch(batch_size: int) -> int:
+    """
+    Hard-delete up to `batch_size` soft-deleted rows; replies go before their
+    posts. Items hidden by moderation wait for an admin (review.py); items
+    deleted while still pending review go like any other.
+    """
+    dead_post = Post.deleted_at.isnot(None) & Post.review_status.is_distinct_from(FLAGGED)
+    dead_reply = select(Reply.id).join(Post, Post.id == Reply.post_id) \
+        .where((Reply.deleted_at.isnot(None) & Reply.review_status.is_distinct_from(FLAGGED)) | dead_post) \
+        .limit(batch_size)
+    removed = db.session.execute(delete(Reply).where(Reply.id.in_(dead_reply))).rowcount
+    if removed < batch_size:
+        empty_post = select(Post.id) \
+            .where(dead_post, ~exists().where(Reply.post_id == Post.id)) \
+            .limit(batch_size - removed)
+        removed += db.session.execute(delete(Post).where(Post.id.in_(empty_post))).rowcount
+    db.session.commit()
+    return removed
+
+
+def purge_deleted(batch_size: int = 500, max_batches: Optional[int] = None) -> int:
+    """Purge soft-deleted rows batch by batch until none are left. Returns the rows removed."""
+    total, batches = 0, 0
+    while max_batches is None or batches < max_batches:
+        try:
+            removed = _purge_batch(batch_size)
+        except Exception:
+            db.session.rollback()
+            raise
+        total += removed
+        batches += 1
+        if removed == 0:
+            break
+    return total
+
+
+class PurgeWorker:
+    """Daemon thread running its cleanup jobs (purge, media GC, ...) every `interval` seconds."""
+
+    def __init__(self, app, interval: float):
+        self.app = app
+        self.interval = interval
+        self.jobs = []
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def add_job(self, job):
+        self.jobs.append(job)
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="purge-deleted", daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            for job in self.jobs:
+                with self.app.app_context():
+                    try:
+                        job()
+                    except Exception:
+                        self.app.logger.exception("Background job %s failed", job.__name__)
+                    finally:
+                        db.session.remove()
+
+
+def init_deletion(app, db):
+    app.config.setdefault("SOFT_DELETE", False)
+    app.config.setdefault("PURGE_INTERVAL", 30.0)
+    app.config.setdefault("PURGE_BATCH_SIZE", 500)
+    app.config.setdefault("PURGE_MAX_BATCHES", 20)
+
+    with app.app_context():
+        if db.engine.dialect.name == "sqlite":
+            @event.listens_for(db.engine, "connect")
+            def _enable_foreign_keys(dbapi_connection, connection_record):
+                cursor = dbapi_connection.cursor()
+                cursor.execute("PRAGMA foreign_keys=ON")
+                cursor.close()
+
+    worker = PurgeWorker(app, app.config["PURGE_INTERVAL"])
+    app.extensions["purge_worker"] = worker
+
+    def _purge():
+        # not only SOFT_DELETE: bulk moderation hides rows by stamping deleted_at too
+        purge_deleted(app.config["PURGE_BATCH_SIZE"], app.config["PURGE_MAX_BATCHES"])
+
+    worker.add_job(_purge)
+
+    @app.before_request
+    def _start_purge_worker():
+        # started lazily so CLI commands and migrations never spawn it
+        worker.start()
+
+    @app.cli.command("purge-deleted")
+    def purge_deleted_command():
+        """Hard-delete every soft-deleted post and reply now."""
+        removed = purge_deleted(app.config["PURGE_BATCH_SIZE"])
+        print(f"Purged {removed:,} rows.")
@@ -1,11 +1,12 @@
-import re
 import requests
-from typing import List, Optional, Tuple, Dict
+from typing import List
 from flask import current_app
-from sqlalchemy import func
 from models import User, Notification, Post, Reply
+from mentions import Mention
+from outbound import OutboundError, outbound
 
 MAX_CONTENT_LENGTH = 2000
+PERSPECTIVE_URL = "https://commentanalyzer.googleapis.com/v1alpha1/comments:analyze"
 ALLOWED_EMOJI_LENGTH = 10
 
 # ---------------------------------------
@@ -14,13 +15,31 @@ ALLOWED_EMOJI_LENGTH = 10
 def check_banned_content(PERSPECTIVE_API_KEY: str, text: str) -> bool:
     """
     Returns True if the content is toxic.
-    Uses Google Perspective API.
+    Uses Google Perspective API; fails open when the call fails.
+    """
+    try:
+        return analyze_content(PERSPECTIVE_API_KEY, text)
+    except OutboundError as e:
+        current_app.logger.warning(f"Perspective API not called: {e}")
+        return False  # fail open
+    except requests.RequestException as e:
+        current_app.logger.error(f"Perspective API request failed: {e}")
+        return False  # fail open
+    except Exception:
+        current_app.logger.exception("Unexpected error in Perspective API moderation")
+        return False  # fail open
+
+
+def analyze_content(PERSPECTIVE_API_KEY: str, text: str) -> bool:
+    """
+    Like check_banned_content, but a failed call raises instead of allowing
+    the content, so a background review can retry it later.
     """
     if not PERSPECTIVE_API_KEY:
         current_app.logger.warning("⚠️ No Perspective API key configured.")
         return False  # allow content if no moderation
 
-    url = "https://commentanalyzer.googleapis.com/v1alpha1/comments:analyze"
+    url = current_app.config.get("PERSPECTIVE_URL", PERSPECTIVE_URL)
     payload = {
         "comment": {"text": text},
         "languages": ["en"],
@@ -32,75 +51,25 @@ def check_banned_content(PERSPECTIVE_API_KEY: str, text: str) -> bool:
         }
     }
 
-    try:
-        response = requests.post(url, json=payload, params={"key": PERSPECTIVE_API_KEY}, timeout=5)
-        response.raise_for_status()
-        result = response.json()
-
-        current_app.logger.debug(f"Perspective API result: {result}")
-
-        scores = {
-            attr: result["attributeScores"][attr]["summaryScore"]["value"]
-            for attr in result.get("attributeScores", {})
-        }
+    # pooled, retried and circuit-broken; see outbound.py
+    response = outbound("perspective").post(url, json=payload, params={"key": PERSPECTIVE_API_KEY})
+    response.raise_for_status()
+    result = response.json()
 
-        flagged = (
-            scores.get("INSULT", 0) >= 0.35 or
-            scores.get("TOXICITY", 0) >= 0.40 or
-            scores.get("PROFANITY", 0) >= 0.50 or
-            scores.get("THREAT", 0) >= 0.20
-        )
-        return flagged
+    current_app.logger.debug(f"Perspective API result: {result}")
 
+    scores = {
+        attr: result["attributeScores"][attr]["summaryScore"]["value"]
+        for attr in result.get("attributeScores", {})
+    }
 
-    except requests.RequestException as e:
-        current_app.logger.error(f"Perspective API request failed: {e}")
-        return False  # fail open
-    except Exception as e:
-        current_app.logger.exception("Unexpected error in Perspective API moderation")
-        return False  # fail open
-
-# ---------------------------------------
-# MENTION HANDLING
-# ---------------------------------------
-MENTION_REGEX = r'@([A-Za-z0-9][A-Za-z0-9\s\.\'\-@]+?)(?=\s|$|[.,!?;:])'
-
-def extract_mentions(text: Optional[str]) -> List[str]:
-    if not text:
-        return []
-    raw = re.findall(MENTION_REGEX, text)
-    return [m.strip().rstrip(".,!?;:") for m in raw if m and m.strip()]
-
-def resolve_mention(token: str) -> Tuple[Optional[User], Optional[Dict]]:
-    """
-    Resolve a mention token to a User.
-    Returns (User or None, error dict or None)
-    """
-    # Try email first
-    user = User.query.filter(func.lower(User.email) == token.lower()).first()
-    if user:
-        return user, None
-
-    # Try login_id
-    user = User.query.filter(func.lower(User.login_id) == token.lower()).first()
-    if user:
-        return user, None
-
-    # Exact name match
-    exact_matches = User.query.filter(func.lower(User.name) == token.lower()).all()
-    if len(exact_matches) == 1:
-        return exact_matches[0], None
-    if len(exact_matches) > 1:
-        return None, {"error": f"Multiple users named '{token}'", "options": [u.to_json() for u in exact_matches]}
-
-    # Partial name match
-    partial_matches = User.query.filter(User.name.ilike(f"%{token}%")).all()
-    if len(partial_matches) == 1:
-        return partial_matches[0], None
-    if len(partial_matches) > 1:
-        return None, {"error": f"Multiple matching users for '{token}'", "options": [u.to_json() for u in partial_matches]}
-
-    return None, {"error": f"No user found for '{token}'"}
+    flagged = (
+        scores.get("INSULT", 0) >= 0.35 or
+        scores.get("TOXICITY", 0) >= 0.40 or
+        scores.get("PROFANITY", 0) >= 0.50 or
+        scores.get("THREAT", 0) >= 0.20
+    )
+    return flagged
 
 # helpers.py (replace relevant functions)
 
@@ -132,9 +101,9 @@ def create_notification(db, user_id, actor_id, action_type, post_id=None, poll_i
     return notif
 
 
-def notify_tagged_users(db, item, mentions: List[str]):
+def notify_tagged_users(db, item, mentions: List[Mention]):
     """
-    Create 'tagged' notifications for each resolved user.
+    Create 'tagged' notifications for each mentioned user (see mentions.py).
     `item` should be a Post or Reply instance (or similar) with author_id and id/post_id.
     """
     actor_id = getattr(item, "author_id", None)
@@ -142,16 +111,18 @@ def notify_tagged_users(db, item, mentions: List[str]):
         current_app.logger.warning("Tagged notification skipped: no actor_id found")
         return
 
-    for raw_mention in set(mentions or []):
-        user, err = resolve_mention(raw_mention)
-        if err or not user:
-            current_app.logger.debug(f"Skipping mention '{raw_mention}': {err}")
+    tagged = set()
+    for mention in mentions or []:
+        if mention.user_id is None:
+            current_app.logger.debug(f"Skipping mention '{mention.text}': matches {len(mention.user_ids)} users")
             continue
+        tagged.add(mention.user_id)
 
+    for user_id in tagged:
         # create notification with actor_id and derived message
         create_notification(
             db=db,
-            user_id=user.id,
+            user_id=user_id,
             actor_id=actor_id,
             action_type="tagged",
             post_id=getattr(item, "id", None) if isinstance(item, Post) else getattr(item, "post_id", None),
@@ -169,7 +140,7 @@ def notify_all_non_admins(db, actor_id, action_type, post=None, poll=None):
     """
     Notify all non-admin users (except actor) about admin action.
     """
-    users = User.query.filter(User.role != "admin").all()
+    users = User.query.filter(User.role != "admin", User.is_active.is_(True)).all()
 
     for u in users:
         if u.id == actor_id:
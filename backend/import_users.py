@@ -1,52 +1,229 @@
+"""
+Import employees from an HR CSV export.
+
+Rows are streamed in chunks, validated and upserted on login_id with bulk
+INSERT ... ON CONFLICT statements, all inside one transaction. Users missing
+from the file are deactivated rather than deleted, so their posts, likes and
+votes survive. New users' passwords are stored as a fast salted SHA-256
+(auth.interim_hash) that their first login replaces with bcrypt: bcrypt at
+full cost here would hold the write lock for hours on a large first import.
+Existing users keep their stored password.
+
+    python import_users.py [employees.csv] [--chunk-size 5000] [--no-deactivate] [--dry-run]
+"""
+import argparse
 import csv
 import os
+import re
+import time
 from datetime import datetime
+from itertools import islice
 from app import app, db
+from auth import interim_hash, revoke_tokens
 from models import User
+from sqlalchemy import case, func, select, update, or_, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 
 CSV_FILE = "employees.csv"
 AVATAR_FOLDER = "statics/profile"
+CHUNK_SIZE = 5000
+ROLES = {"admin", "employee"}
+EMAIL_RE = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+REQUIRED_COLUMNS = {"employee_id", "name", "password", "role"}
+LOGIN_ID_LENGTH = User.__table__.c.login_id.type.length
 
-def import_users():
-    with app.app_context():
-        db.create_all()
 
-        # **Delete all existing users first**
-        deleted = User.query.delete()
-        db.session.commit()
-        print(f"Deleted {deleted} existing users.")
+def validate_row(row, line_no):
+    """
+    Returns (values, None) for a usable row or (None, reason) for a rejected one.
+    `values` uses the users table column names.
+    """
+    login_id = (row.get("employee_id") or "").strip()
+    name = (row.get("name") or "").strip()
+    password = row.get("password") or ""
+    role = (row.get("role") or "").strip().lower()
+    email = (row.get("email") or "").strip() or None
+    avatar = (row.get("avatar") or "").strip()
+
+    if not login_id:
+        return None, f"line {line_no}: missing employee_id"
+    if len(login_id) > LOGIN_ID_LENGTH:
+        # truncating could merge two employees into one row on the login_id upsert
+        return None, f"line {line_no}: employee_id '{login_id}' longer than {LOGIN_ID_LENGTH} characters"
+    if not name:
+        return None, f"line {line_no}: missing name for {login_id}"
+    if not password:
+        return None, f"line {line_no}: missing password for {login_id}"
+    if role not in ROLES:
+        return None, f"line {line_no}: unknown role '{row.get('role')}' for {login_id}"
+    if email and not EMAIL_RE.match(email):
+        return None, f"line {line_no}: invalid email '{email}' for {login_id}"
+
+    return {
+        "login_id": login_id,
+        "name": name[:100],
+        "password": password,
+        "role": role,
+        "position": (row.get("position") or "").strip() or None,
+        "department": (row.get("department") or "").strip() or None,
+        "avatar_url": os.path.join(AVATAR_FOLDER, avatar).replace("\\", "/") if avatar else None,
+        "email": email,
+    }, None
+
 
-        users_to_add = []
+def _drop_conflicts(chunk, rejected):
+    """
+    Drop rows whose email already belongs to a different login_id, either
+    in the database or earlier in this chunk. Returns (rows, existing login_ids).
+    """
+    login_ids = [r["login_id"] for r in chunk]
+    emails = [r["email"].lower() for r in chunk if r["email"]]
+    existing = db.session.execute(
+        select(User.login_id, User.email).where(
+            or_(User.login_id.in_(login_ids), func.lower(User.email).in_(emails))
+        )
+    ).all()
+    email_owner = {e.lower(): l for l, e in existing if e}
+    existing_ids = {l for l, _ in existing}
 
+    kept = []
+    for r in chunk:
+        if r["email"]:
+            owner = email_owner.get(r["email"].lower())
+            if owner is not None and owner != r["login_id"]:
+                rejected.append(f"{r['login_id']}: email {r['email']} already used by {owner}")
+                continue
+            email_owner[r["email"].lower()] = r["login_id"]
+        kept.append(r)
+    return kept, existing_ids
+
+
+def _upsert(rows, now):
+    stmt = sqlite_insert(User.__table__)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[User.__table__.c.login_id],
+        # keep the stored password: employees may have changed it since the last export
+        set_={
+            "name": stmt.excluded.name,
+            "role": stmt.excluded.role,
+            # a role change revokes tokens carrying the old role claim
+            "token_version": case(
+                (db.func.lower(User.__table__.c.role) != db.func.lower(stmt.excluded.role),
+                 User.__table__.c.token_version + 1),
+                else_=User.__table__.c.token_version,
+            ),
+            "position": stmt.excluded.position,
+            "department": stmt.excluded.department,
+            "avatar_url": stmt.excluded.avatar_url,
+            "email": stmt.excluded.email,
+            "is_active": True,
+            "updated_at": now,
+        },
+    )
+    db.session.execute(stmt, [{**r, "is_active": True, "created_at": now, "updated_at": now} for r in rows])
+
+
+def import_users(csv_file=CSV_FILE, chunk_size=CHUNK_SIZE, deactivate_missing=True, dry_run=False):
+    started = time.perf_counter()
+    now = datetime.utcnow()
+    stats = {"read": 0, "inserted": 0, "updated": 0, "rejected": 0, "deactivated": 0}
+    rejected = []
+
+    with app.app_context():
+        db.create_all()
         try:
-            with open(CSV_FILE, newline='', encoding='utf-8') as f:
+            with open(csv_file, newline="", encoding="utf-8") as f:
                 reader = csv.DictReader(f)
-                for row in reader:
-                    user = User(
-                        login_id=row['employee_id'],
-                        name=row['name'],
-                        password=row['password'],  # plain text
-                        role=row['role'],
-                        position=row.get('position'),
-                        department=row.get('department'),
-                        avatar_url=os.path.join(AVATAR_FOLDER, row['avatar']).replace("\\", "/"),
-                        email=row['email'],
-                        created_at=datetime.utcnow(),
-                        updated_at=datetime.utcnow(),
-                    )
-                    users_to_add.append(user)
-                    print(f"Added user {row['employee_id']} - {row['name']}")
-
-            if users_to_add:
-                db.session.add_all(users_to_add)
+                missing = REQUIRED_COLUMNS - set(reader.fieldnames or [])
+                if missing:
+                    print(f"CSV is missing columns: {', '.join(sorted(missing))}")
+                    return stats
+
+                # login_ids present in the file, valid or not, for deactivating everyone else
+                db.session.execute(text("CREATE TEMP TABLE IF NOT EXISTS import_seen (login_id TEXT PRIMARY KEY)"))
+                db.session.execute(text("DELETE FROM import_seen"))
+
+                line_no = 1
+                while True:
+                    raw = list(islice(reader, chunk_size))
+                    if not raw:
+                        break
+
+                    # a rejected row still names an employee: a bad cell must not deactivate them
+                    listed = {(row.get("employee_id") or "").strip() for row in raw} - {""}
+                    if listed:
+                        db.session.execute(
+                            text("INSERT OR IGNORE INTO import_seen (login_id) VALUES (:login_id)"),
+                            [{"login_id": login_id} for login_id in listed],
+                        )
+
+                    chunk = {}
+                    for row in raw:
+                        line_no += 1
+                        values, reason = validate_row(row, line_no)
+                        if reason:
+                            rejected.append(reason)
+                            continue
+                        chunk[values["login_id"]] = values  # last row wins within a chunk
+
+                    rows, existing_ids = _drop_conflicts(list(chunk.values()), rejected)
+                    new_rows = [r for r in rows if r["login_id"] not in existing_ids]
+                    for r in new_rows:
+                        r["password"] = interim_hash(r["password"])
+                    if rows:
+                        _upsert(rows, now)
+
+                    stats["read"] += len(raw)
+                    stats["updated"] += sum(1 for r in rows if r["login_id"] in existing_ids)
+                    stats["inserted"] += len(new_rows)
+                    elapsed = time.perf_counter() - started
+                    print(f"Processed {stats['read']:,} rows ({stats['read'] / elapsed:,.0f} rows/s)")
+
+            if deactivate_missing and stats["inserted"] + stats["updated"]:
+                result = db.session.execute(
+                    update(User)
+                    .where(User.is_active.is_(True))
+                    .where(text("users.login_id NOT IN (SELECT login_id FROM import_seen)"))
+                    .values(is_active=False, token_version=User.token_version + 1, updated_at=now)
+                    .execution_options(synchronize_session=False)
+                )
+                stats["deactivated"] = result.rowcount
+            elif deactivate_missing:
+                print("No valid rows imported; skipping deactivation.")
+
+            if dry_run:
+                db.session.rollback()
+            else:
                 db.session.commit()
-                print(f"Successfully imported {len(users_to_add)} users.")
+                revoke_tokens()
 
         except FileNotFoundError:
-            print(f"CSV file not found: {CSV_FILE}")
+            print(f"CSV file not found: {csv_file}")
+            return stats
         except Exception as e:
             db.session.rollback()
-            print("Error during import:", e)
+            print("Error during import, nothing was changed:", e)
+            return stats
+
+    stats["rejected"] = len(rejected)
+    for reason in rejected[:20]:
+        print(f"Rejected {reason}")
+    if len(rejected) > 20:
+        print(f"... and {len(rejected) - 20} more rejected rows")
+
+    print(
+        f"{'Dry run: would have imported' if dry_run else 'Imported'} {stats['read']:,} rows in "
+        f"{time.perf_counter() - started:.2f}s: {stats['inserted']:,} new, {stats['updated']:,} updated, "
+        f"{stats['deactivated']:,} deactivated, {stats['rejected']:,} rejected."
+    )
+    return stats
+
 
 if __name__ == "__main__":
-    import_users()
+    parser = argparse.ArgumentParser(description="Import employees from an HR CSV export.")
+    parser.add_argument("csv_file", nargs="?", default=CSV_FILE)
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--no-deactivate", action="store_true", help="leave users missing from the file active")
+    parser.add_argument("--dry-run", action="store_true", help="validate and report without committing")
+    args = parser.parse_args()
+    import_users(args.csv_file, args.chunk_size, not args.no_deactivate, args.dry_run)
@@ -0,0 +1,143 @@
+# leaderboard.py
+"""
+Most-appreciated employees: who received the most likes in a window.
+
+Windows are calendar windows in UTC: "day" (today), "week" (since Monday),
+"quarter" and "all" time.
+
+`leaderboard_buckets` keeps one counter per author per day, week, quarter
+and all time. Triggers in counters.py bump it on every like and unlike as it
+happens, and take likes back when the liked post or reply is deleted. A
+window's ranking is then one bucket read in index order (bucket, likes
+DESC): the top K costs K rows however long the like history is.
+
+Each process keeps the top LEADERBOARD_SIZE of every window in memory,
+reloaded from its bucket after LEADERBOARD_TTL seconds or as soon as the
+window rolls over to a new day, week or quarter, so a read is O(K).
+
+    GET /leaderboard?window=week&limit=10
+    flask leaderboard-rebuild        # recount every bucket from likes
+"""
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from flask import jsonify, request
+from flask_jwt_extended import jwt_required
+from sqlalchemy import func, select
+
+from counters import LIKED_AUTHOR, leaderboard_buckets
+from extensions import db
+from models import LeaderboardBucket, User
+from serializers import USER_COLUMNS, leaderboard_entries
+
+WINDOWS = ("day", "week", "quarter", "all")
+
+
+def window_start(window: str, today: date) -> Optional[date]:
+    if window == "day":
+        return today
+    if window == "week":
+        return today - timedelta(days=today.weekday())
+    if window == "quarter":
+        return date(today.year, 3 * ((today.month - 1) // 3) + 1, 1)
+    return None
+
+
+def bucket_key(window: str, today: date) -> str:
+    """The key the triggers file today's likes under for `window`."""
+    if window == "quarter":
+        return f"quarter:{today.year}-Q{(today.month + 2) // 3}"
+    if window == "all":
+        return "all"
+    return f"{window}:{window_start(window, today).isoformat()}"
+
+
+class Board(NamedTuple):
+    bucket: str
+    built_at: float
+    rows: List[Tuple]   # USER_COLUMNS values + likes, best first
+
+
+def load_board(bucket: str, size: int) -> List[Tuple]:
+    return [tuple(row) for row in db.session.execute(
+        select(*USER_COLUMNS, LeaderboardBucket.likes)
+        .join(User, User.id == LeaderboardBucket.user_id)
+        .where(LeaderboardBucket.bucket == bucket, LeaderboardBucket.likes > 0, User.is_active.is_(True))
+        .order_by(LeaderboardBucket.likes.desc(), LeaderboardBucket.user_id)
+        .limit(size)
+    )]
+
+
+class Leaderboard:
+    """The top `size` of each window, reloaded after `ttl` seconds or when the window rolls over."""
+
+    def __init__(self, size: int, ttl: float):
+        self.size = size
+        self.ttl = ttl
+        self._boards: Dict[str, Board] = {}
+        self._lock = threading.Lock()
+
+    def _fresh(self, board: Optional[Board], bucket: str) -> bool:
+        return board is not None and board.bucket == bucket and time.monotonic() - board.built_at < self.ttl
+
+    def top(self, window: str, today: Optional[date] = None) -> List[Tuple]:
+        bucket = bucket_key(window, today or datetime.utcnow().date())
+        board = self._boards.get(window)
+        if not self._fresh(board, bucket):
+            with self._lock:
+                board = self._boards.get(window)
+                if not self._fresh(board, bucket):
+                    board = Board(bucket, time.monotonic(), load_board(bucket, self.size))
+                    self._boards[window] = board
+        return board.rows
+
+    def invalidate(self):
+        self._boards = {}
+
+
+def rebuild_buckets(connection):
+    """Replace every bucket with a recount of the likes table."""
+    author = LIKED_AUTHOR.format(row="likes")
+    connection.exec_driver_sql("DELETE FROM leaderboard_buckets")
+    for key in leaderboard_buckets("likes"):
+        connection.exec_driver_sql(
+            f"INSERT INTO leaderboard_buckets (bucket, user_id, likes) "
+            f"SELECT {key}, {author} AS author_id, count(*) FROM likes "
+            f"WHERE author_id IS NOT NULL GROUP BY 1, 2"
+        )
+
+
+# ---------------------------------------
+# ROUTE + CLI
+# ---------------------------------------
+def init_leaderboard(app):
+    app.config.setdefault("LEADERBOARD_SIZE", 10)
+    app.config.setdefault("LEADERBOARD_TTL", 30.0)
+    board = Leaderboard(app.config["LEADERBOARD_SIZE"], app.config["LEADERBOARD_TTL"])
+    app.extensions["leaderboard"] = board
+
+    @app.route("/leaderboard", methods=["GET"])
+    @jwt_required()
+    def get_leaderboard():
+        window = request.args.get("window", "week")
+        if window not in WINDOWS:
+            return jsonify({"error": f"window must be one of {', '.join(WINDOWS)}"}), 400
+        limit = max(1, min(request.args.get("limit", board.size, type=int), board.size))
+        today = datetime.utcnow().date()
+        start = window_start(window, today)
+        return jsonify({
+            "window": window,
+            "since": start.isoformat() if start else None,
+            "entries": leaderboard_entries(board.top(window, today)[:limit]),
+        }), 200
+
+    @app.cli.command("leaderboard-rebuild")
+    def leaderboard_rebuild():
+        """Recount the leaderboard buckets from likes."""
+        with db.engine.begin() as connection:
+            rebuild_buckets(connection)
+        board.invalidate()
+        buckets = db.session.execute(select(func.count(func.distinct(LeaderboardBucket.bucket)))).scalar()
+        print(f"Leaderboard rebuilt: {buckets:,} buckets.")
@@ -0,0 +1,111 @@
+# likes.py
+"""
+Like writes as single statements, and like state for many items at once.
+
+Setting a like is an INSERT ... SELECT ... ON CONFLICT DO NOTHING against the
+(user, target) unique constraints and clearing it is one DELETE, so repeated
+or concurrent clicks converge instead of racing. Counts are the stored
+like_count columns kept by the triggers in counters.py.
+"""
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import delete, exists, literal, select, union_all
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from extensions import db
+from models import Like, Post, Reply
+
+# kind -> (parent model, likes column pointing at it)
+TARGETS = {
+    "post": (Post, Like.post_id),
+    "reply": (Reply, Like.reply_id),
+}
+
+MAX_STATE_IDS = 500
+
+
+def _like_count(model, target_id: int) -> Optional[int]:
+    return db.session.execute(
+        select(model.like_count).where(model.id == target_id, model.deleted_at.is_(None))
+    ).scalar()
+
+
+def _insert_like(user_id: int, column, model, target_id: int) -> bool:
+    # selecting from the parent makes the insert a no-op when it does not exist or is deleted
+    source = select(literal(user_id), model.id, literal(datetime.utcnow(), db.DateTime)) \
+        .where(model.id == target_id, model.deleted_at.is_(None))
+    stmt = sqlite_insert(Like.__table__) \
+        .from_select(["user_id", column.key, "created_at"], source) \
+        .on_conflict_do_nothing()
+    return db.session.execute(stmt).rowcount > 0
+
+
+def _delete_like(user_id: int, column, target_id: int) -> bool:
+    stmt = delete(Like).where(Like.user_id == user_id, column == target_id) \
+        .execution_options(synchronize_session=False)
+    return db.session.execute(stmt).rowcount > 0
+
+
+def set_like(user_id: int, kind: str, target_id: int, liked: bool) -> Optional[Tuple[bool, int]]:
+    """
+    Idempotently like or unlike a post/reply. Returns (changed, like_count),
+    or None when the target does not exist.
+    """
+    model, column = TARGETS[kind]
+    try:
+        if liked:
+            changed = _insert_like(user_id, column, model, target_id)
+        else:
+            changed = _delete_like(user_id, column, target_id)
+        count = _like_count(model, target_id)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    if count is None:
+        return None
+    return changed, count
+
+
+def toggle_like(user_id: int, kind: str, target_id: int) -> Optional[Tuple[bool, int]]:
+    """Flip the caller's like. Returns (liked, like_count) or None when the target does not exist."""
+    model, column = TARGETS[kind]
+    try:
+        liked = not _delete_like(user_id, column, target_id)
+        if liked:
+            _insert_like(user_id, column, model, target_id)
+        count = _like_count(model, target_id)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    if count is None:
+        return None
+    return liked, count
+
+
+def _state_select(kind: str, user_id: int, ids):
+    model, column = TARGETS[kind]
+    liked = exists().where(Like.user_id == user_id, column == model.id)
+    return select(literal(kind).label("kind"), model.id, model.like_count, liked.label("liked")) \
+        .where(model.id.in_(ids), model.deleted_at.is_(None))
+
+
+def like_state(user_id: int, post_ids: Iterable[int] = (), reply_ids: Iterable[int] = ()) -> Dict:
+    """
+    The caller's like flag and the like count for each existing post/reply id,
+    in one statement. Unknown ids are left out of the result.
+    """
+    parts = [
+        _state_select(kind, user_id, sorted(set(ids)))
+        for kind, ids in (("post", post_ids), ("reply", reply_ids)) if ids
+    ]
+    state = {"posts": {}, "replies": {}}
+    if not parts:
+        return state
+    stmt = parts[0] if len(parts) == 1 else union_all(*parts)
+    for kind, target_id, like_count, liked in db.session.execute(stmt):
+        bucket = state["posts"] if kind == "post" else state["replies"]
+        bucket[str(target_id)] = {"liked": bool(liked), "likeCount": like_count}
+    return state
@@ -0,0 +1,169 @@
+# media.py
+"""
+Content-hash deduplication of uploads.
+
+An upload is spooled and sha256-hashed while it streams in; size and type
+are checked on the way. If `media_assets` already has that hash, the stored
+asset is reused without touching storage at all. Otherwise the file goes
+to storage() and a new row is recorded.
+
+`media_assets.ref_count` is maintained by triggers (counters.py) whenever a
+post or reply starts or stops pointing at an asset's URL, including cascade
+and purge deletes. Assets left unreferenced for MEDIA_GC_GRACE seconds are
+removed from storage, along with their rendered variants (variants.py), by
+`collect_garbage`, which runs on the background worker (deletion.py) and
+as `flask media-gc`. The grace period keeps an upload alive between
+/upload and the post that uses it.
+"""
+import hashlib
+import tempfile
+from datetime import datetime, timedelta
+from typing import Iterable, Optional
+
+from flask import current_app
+from sqlalchemy import delete, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from extensions import db
+from models import MediaAsset
+from storage import CHUNK_SIZE, FileTooLarge, FileTypeNotAllowed, StoredFile, sniff_content_type, storage
+from variants import discard_variants
+
+SPOOL_MEMORY_BYTES = 1024 * 1024
+
+
+def _spool(file, max_bytes: Optional[int], accept: Optional[Iterable[str]]):
+    """Copy the upload into a spooled temp file, hashing and checking it. Returns (spool, sha256, size, type)."""
+    stream = getattr(file, "stream", file)
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MEMORY_BYTES)
+    digest = hashlib.sha256()
+    size, head = 0, b""
+    try:
+        while True:
+            chunk = stream.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            if len(head) < 16:
+                head += chunk[:16 - len(head)]
+            size += len(chunk)
+            if max_bytes is not None and size > max_bytes:
+                raise FileTooLarge(f"File too large (max {max_bytes} bytes)")
+            digest.update(chunk)
+            spool.write(chunk)
+        sniffed = sniff_content_type(head)
+        if accept is not None and sniffed not in set(accept):
+            raise FileTypeNotAllowed("File type not allowed")
+    except BaseException:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool, digest.hexdigest(), size, sniffed
+
+
+def _reuse(content_hash: str) -> Optional[StoredFile]:
+    asset = db.session.execute(
+        select(MediaAsset).where(MediaAsset.content_hash == content_hash)
+    ).scalar_one_or_none()
+    if asset is None:
+        return None
+    # touching last_used_at keeps the collector away; 0 rows means it just collected the asset
+    touched = db.session.execute(
+        update(MediaAsset).where(MediaAsset.id == asset.id)
+        .values(last_used_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.session.commit()
+    if not touched:
+        return None
+    return StoredFile(asset.storage_key, asset.url, asset.size, asset.content_type)
+
+
+def register_asset(stored: StoredFile, content_hash: Optional[str] = None):
+    """Record a stored file; a no-op when its hash or URL is already known."""
+    stmt = sqlite_insert(MediaAsset.__table__).values(
+        content_hash=content_hash,
+        storage_key=stored.key,
+        url=stored.url,
+        size=stored.size,
+        content_type=stored.content_type,
+        ref_count=0,
+        created_at=datetime.utcnow(),
+        last_used_at=datetime.utcnow(),
+    ).on_conflict_do_nothing()
+    try:
+        db.session.execute(stmt)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+def store_media(file, folder: Optional[str] = None, content_type: Optional[str] = None,
+                max_bytes: Optional[int] = None, accept: Optional[Iterable[str]] = None) -> StoredFile:
+    """Store an upload, or return the existing asset with the same content."""
+    spool, content_hash, size, sniffed = _spool(file, max_bytes, accept)
+    with spool:
+        existing = _reuse(content_hash)
+        if existing is not None:
+            return existing
+        stored = storage().save(spool, folder=folder, content_type=sniffed or content_type)
+    register_asset(stored, content_hash)
+    return stored
+
+
+# ---------------------------------------
+# GARBAGE COLLECTION
+# ---------------------------------------
+def collect_garbage(grace_seconds: float, batch_size: int = 200) -> int:
+    """Delete assets unreferenced for `grace_seconds` from storage and the table. Returns how many."""
+    cutoff = datetime.utcnow() - timedelta(seconds=grace_seconds)
+    collected = 0
+    while True:
+        candidates = db.session.execute(
+            select(MediaAsset.id, MediaAsset.storage_key)
+            .where(MediaAsset.ref_count == 0, MediaAsset.last_used_at < cutoff)
+            .limit(batch_size)
+        ).all()
+        if not candidates:
+            break
+        keys = []
+        try:
+            for asset_id, key in candidates:
+                # re-checked per row: a post or a duplicate upload may have claimed it meanwhile
+                removed = db.session.execute(
+                    delete(MediaAsset)
+                    .where(MediaAsset.id == asset_id, MediaAsset.ref_count == 0, MediaAsset.last_used_at < cutoff)
+                    .execution_options(synchronize_session=False)
+                ).rowcount
+                if removed:
+                    keys.append(key)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        for key in keys:
+            try:
+                storage().delete(key)
+                discard_variants(storage().url(key))
+            except Exception:
+                current_app.logger.exception("Deleting stored media %s failed", key)
+        collected += len(keys)
+        if len(candidates) < batch_size:
+            break
+    return collected
+
+
+def init_media(app):
+    app.config.setdefault("MEDIA_GC_GRACE", 24 * 3600)
+
+    def _collect():
+        collect_garbage(app.config["MEDIA_GC_GRACE"])
+
+    app.extensions["purge_worker"].add_job(_collect)
+
+    @app.cli.command("media-gc")
+    def media_gc():
+        """Delete stored media no post or reply references any more."""
+        collected = collect_garbage(app.config["MEDIA_GC_GRACE"])
+        print(f"Collected {collected:,} unreferenced assets.")
+
@@ -0,0 +1,193 @@
+# mentions.py
+"""
+@mention extraction against the names that actually exist.
+
+Every active user's name, login_id and email becomes a pattern ("@emma tan",
+"@a001", "@emma@corp.com") in one Aho-Corasick automaton, so a post is
+scanned once, left to right, in time linear in its length whatever the
+number of users. A mention starts at an "@" that does not follow a letter
+or digit (so "bob@corp.com" in running text is not one) and must not run
+into a following letter or digit; where several patterns start at one "@",
+the longest wins ("@Emma Tanaka" over "@Emma Tan"), and mentions never
+overlap.
+
+A pattern shared by several users (two people called "Aung Ko") yields
+all their ids; emails beat login_ids beat names when one string is both.
+
+The automaton is rebuilt after MENTION_INDEX_TTL seconds, and at once when
+this process changes a user.
+"""
+import threading
+import time
+from collections import deque
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from flask import current_app
+from sqlalchemy import event, inspect, select
+
+from extensions import db
+from models import User
+
+# lower wins when one string is several users' keys
+KEY_PRIORITY = {"email": 0, "login_id": 1, "name": 2}
+# goto is a single dict keyed by state * ALPHABET + code point
+ALPHABET = 0x110000
+INDEXED_ATTRS = ("name", "login_id", "email", "is_active")
+
+
+class Mention(NamedTuple):
+    start: int          # index of the "@"
+    end: int            # one past the last character
+    text: str           # as written, without the "@"
+    user_ids: Tuple[int, ...]
+
+    @property
+    def user_id(self) -> Optional[int]:
+        """The mentioned user, or None when the text names several."""
+        return self.user_ids[0] if len(self.user_ids) == 1 else None
+
+
+def _fold(ch: str) -> str:
+    # lower() that never changes the length, so spans stay valid
+    lowered = ch.lower()
+    return lowered if len(lowered) == 1 else ch
+
+
+def _is_word(ch: str) -> bool:
+    return ch.isalnum() or ch == "_"
+
+
+class MentionAutomaton:
+    """Aho-Corasick over "@" + each key, with failure and output links."""
+
+    def __init__(self, rows):
+        best: Dict[str, Tuple[int, set]] = {}
+        for user_id, login_id, name, email in rows:
+            for kind, value in (("email", email), ("login_id", login_id), ("name", name)):
+                key = " ".join((value or "").split())
+                if not key:
+                    continue
+                key = "".join(_fold(c) for c in key)
+                priority = KEY_PRIORITY[kind]
+                current = best.get(key)
+                if current is None or priority < current[0]:
+                    best[key] = (priority, {user_id})
+                elif priority == current[0]:
+                    current[1].add(user_id)
+
+        self.goto: Dict[int, int] = {}
+        self.fail: List[int] = [0]
+        self.length: List[int] = [0]      # pattern length if the state ends one, else 0
+        self.ids: List[Tuple[int, ...]] = [()]
+        children: List[List[int]] = [[]]
+        for key, (_, ids) in best.items():
+            state = 0
+            for ch in "@" + key:
+                code = state * ALPHABET + ord(ch)
+                nxt = self.goto.get(code)
+                if nxt is None:
+                    nxt = len(self.fail)
+                    self.goto[code] = nxt
+                    self.fail.append(0)
+                    self.length.append(0)
+                    self.ids.append(())
+                    children.append([])
+                    children[state].append(ord(ch))
+                state = nxt
+            self.length[state] = len(key) + 1
+            self.ids[state] = tuple(sorted(ids))
+
+        # output[s]: nearest state on the failure chain (s included) that ends a pattern
+        self.output: List[int] = [0] * len(self.fail)
+        queue = deque()
+        for code in children[0]:
+            queue.append(self.goto[code])
+        while queue:
+            state = queue.popleft()
+            self.output[state] = state if self.length[state] else self.output[self.fail[state]]
+            for code in children[state]:
+                child = self.goto[state * ALPHABET + code]
+                f = self.fail[state]
+                while f and f * ALPHABET + code not in self.goto:
+                    f = self.fail[f]
+                self.fail[child] = self.goto.get(f * ALPHABET + code, 0)
+                queue.append(child)
+        self.built_at = time.monotonic()
+
+    def find(self, text: str) -> List[Mention]:
+        """Leftmost, longest, non-overlapping mentions in `text`."""
+        if not text or "@" not in text:
+            return []
+        goto, fail, length, output = self.goto, self.fail, self.length, self.output
+        n = len(text)
+        longest: Dict[int, int] = {}   # start -> end of the longest valid match
+        found: Dict[int, int] = {}     # start -> its state
+        state = 0
+        for i, ch in enumerate(text):
+            code = ord(_fold(ch))
+            while state and state * ALPHABET + code not in goto:
+                state = fail[state]
+            state = goto.get(state * ALPHABET + code, 0)
+            end = i + 1
+            if end < n and _is_word(text[end]):
+                continue
+            hit = output[state]
+            # every pattern starts with "@", so each hit on the chain has its own start
+            while hit:
+                start = end - length[hit]
+                if (start == 0 or not _is_word(text[start - 1])) and end > longest.get(start, -1):
+                    longest[start] = end
+                    found[start] = hit
+                hit = output[fail[hit]]
+
+        mentions, covered = [], 0
+        for start in sorted(longest):
+            if start < covered:
+                continue
+            end = longest[start]
+            mentions.append(Mention(start, end, text[start + 1:end], self.ids[found[start]]))
+            covered = end
+        return mentions
+
+
+_automaton: Optional[MentionAutomaton] = None
+_automaton_lock = threading.Lock()
+
+
+def invalidate_mention_index():
+    """Drop the automaton; the next lookup rebuilds it."""
+    global _automaton
+    _automaton = None
+
+
+def mention_index(ttl: float) -> MentionAutomaton:
+    global _automaton
+    index = _automaton
+    if index is not None and time.monotonic() - index.built_at < ttl:
+        return index
+    with _automaton_lock:
+        if _automaton is None or time.monotonic() - _automaton.built_at >= ttl:
+            rows = db.session.execute(
+                select(User.id, User.login_id, User.name, User.email).where(User.is_active.is_(True))
+            ).all()
+            _automaton = MentionAutomaton(rows)
+        return _automaton
+
+
+def find_mentions(text: Optional[str]) -> List[Mention]:
+    if not text:
+        return []
+    return mention_index(current_app.config.get("MENTION_INDEX_TTL", 60.0)).find(text)
+
+
+@event.listens_for(User, "after_insert")
+@event.listens_for(User, "after_delete")
+def _user_added_or_removed(mapper, connection, target):
+    invalidate_mention_index()
+
+
+@event.listens_for(User, "after_update")
+def _user_updated(mapper, connection, target):
+    state = inspect(target)
+    if any(state.attrs[attr].history.has_changes() for attr in INDEXED_ATTRS):
+        invalidate_mention_index()
@@ -0,0 +1,255 @@
+# metrics.py
+"""
+In-process request and SQL instrumentation exposed as Prometheus text.
+
+- SQLAlchemy cursor events count statements and DB time per request
+- before/after request hooks feed per-endpoint latency histograms
+- `outbound_call` times calls to Cloudinary, Perspective, ...
+- repeated identical statements within one request are logged as N+1 suspects
+
+Values live in this process only; with several gunicorn workers each worker
+reports its own series.
+"""
+import bisect
+import threading
+import time
+from collections import Counter as _Tally
+from contextlib import contextmanager
+from typing import Dict, Iterable, Tuple
+
+from flask import Response, current_app, g, has_request_context, request
+from sqlalchemy import event
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: Iterable[Tuple[str, str]] = ()) -> str:
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    body = ",".join(
+        '{}="{}"'.format(k, v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in pairs
+    )
+    return "{" + body + "}"
+
+
+# ---------------------------------------
+# METRIC TYPES
+# ---------------------------------------
+class CounterMetric:
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(_label_key(labels), 0)
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_format_labels(key)} {value}"
+
+
+class HistogramMetric:
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(sorted(buckets))
+        # per label set: [bucket counts..., +Inf count], sum
+        self._values: Dict[LabelKey, Tuple[list, list]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[idx] += 1
+            total[0] += value
+
+    def count(self, **labels) -> int:
+        entry = self._values.get(_label_key(labels))
+        return sum(entry[0]) if entry else 0
+
+    def samples(self):
+        with self._lock:
+            items = [(k, list(c), s[0]) for k, (c, s) in self._values.items()]
+        for key, counts, total in items:
+            running = 0
+            for bound, n in zip(self.buckets, counts):
+                running += n
+                yield f"{self.name}_bucket{_format_labels(key, [('le', repr(float(bound)))])} {running}"
+            running += counts[-1]
+            yield f"{self.name}_bucket{_format_labels(key, [('le', '+Inf')])} {running}"
+            yield f"{self.name}_sum{_format_labels(key)} {total}"
+            yield f"{self.name}_count{_format_labels(key)} {running}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name: str, help_text: str) -> CounterMetric:
+        metric = CounterMetric(name, help_text)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help_text: str, buckets=LATENCY_BUCKETS) -> HistogramMetric:
+        metric = HistogramMetric(name, help_text, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+HTTP_REQUESTS = REGISTRY.counter(
+    "http_requests_total", "HTTP requests by endpoint, method and status.")
+HTTP_LATENCY = REGISTRY.histogram(
+    "http_request_duration_seconds", "Request latency by endpoint.")
+DB_QUERIES = REGISTRY.histogram(
+    "db_queries_per_request", "SQL statements issued per request by endpoint.", QUERY_COUNT_BUCKETS)
+DB_TIME = REGISTRY.histogram(
+    "db_time_per_request_seconds", "Time spent in SQL statements per request by endpoint.")
+DB_STATEMENTS = REGISTRY.counter(
+    "db_statements_total", "SQL statements executed, inside or outside requests.")
+N_PLUS_ONE = REGISTRY.counter(
+    "db_n_plus_one_suspects_total", "Requests that repeated one statement past the threshold.")
+OUTBOUND_CALLS = REGISTRY.counter(
+    "outbound_calls_total", "Calls to external services by service and outcome.")
+OUTBOUND_LATENCY = REGISTRY.histogram(
+    "outbound_call_duration_seconds", "Latency of calls to external services.")
+
+
+# ---------------------------------------
+# OUTBOUND CALLS
+# ---------------------------------------
+@contextmanager
+def outbound_call(service: str):
+    """
+    Time a call to an external service:
+
+        with outbound_call("cloudinary"):
+            cloudinary.uploader.upload(file)
+    """
+    start = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield
+    except Exception:
+        outcome = "error"
+        raise
+    finally:
+        OUTBOUND_LATENCY.observe(time.perf_counter() - start, service=service)
+        OUTBOUND_CALLS.inc(service=service, outcome=outcome)
+
+
+def record_outbound(service: str, outcome: str, seconds: float):
+    """For callers that handle their own errors and only know the outcome afterwards."""
+    OUTBOUND_LATENCY.observe(seconds, service=service)
+    OUTBOUND_CALLS.inc(service=service, outcome=outcome)
+
+
+# ---------------------------------------
+# PER-REQUEST STATE
+# ---------------------------------------
+def request_stats() -> Dict:
+    """Query count and DB time collected so far for the current request."""
+    if not has_request_context() or "_metrics" not in g:
+        return {"queries": 0, "db_time": 0.0}
+    state = g._metrics
+    return {"queries": state["queries"], "db_time": state["db_time"]}
+
+
+def _endpoint_label() -> str:
+    return request.endpoint or "unmatched"
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("_metrics_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get("_metrics_start")
+    elapsed = time.perf_counter() - started.pop() if started else 0.0
+    DB_STATEMENTS.inc()
+    if has_request_context() and "_metrics" in g:
+        state = g._metrics
+        state["queries"] += 1
+        state["db_time"] += elapsed
+        state["statements"][statement] += 1
+
+
+def init_metrics(app, db):
+    """Attach the SQL event listeners and request hooks, and register GET /metrics."""
+    app.config.setdefault("N_PLUS_ONE_THRESHOLD", 5)
+    app.config.setdefault("METRICS_TOKEN", None)
+
+    with app.app_context():
+        event.listen(db.engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(db.engine, "after_cursor_execute", _after_cursor_execute)
+
+    @app.before_request
+    def _start_request_metrics():
+        g._metrics = {
+            "start": time.perf_counter(),
+            "queries": 0,
+            "db_time": 0.0,
+            "statements": _Tally(),
+        }
+
+    @app.after_request
+    def _finish_request_metrics(response):
+        state = g.pop("_metrics", None)
+        if state is None:
+            return response
+        endpoint = _endpoint_label()
+        HTTP_REQUESTS.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+        HTTP_LATENCY.observe(time.perf_counter() - state["start"], endpoint=endpoint)
+        DB_QUERIES.observe(state["queries"], endpoint=endpoint)
+        DB_TIME.observe(state["db_time"], endpoint=endpoint)
+
+        threshold = current_app.config["N_PLUS_ONE_THRESHOLD"]
+        if threshold:
+            repeated = [(sql, n) for sql, n in state["statements"].items() if n >= threshold]
+            if repeated:
+                N_PLUS_ONE.inc(endpoint=endpoint)
+                for sql, n in repeated:
+                    current_app.logger.warning(
+                        f"Possible N+1 in {endpoint}: statement ran {n} times: {' '.join(sql.split())[:200]}"
+                    )
+        return response
+
+    @app.route("/metrics", methods=["GET"])
+    def metrics():
+        token = current_app.config["METRICS_TOKEN"]
+        if token and request.headers.get("Authorization") != f"Bearer {token}":
+            return Response("forbidden\n", status=403, mimetype="text/plain")
+        return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4; charset=utf-8")
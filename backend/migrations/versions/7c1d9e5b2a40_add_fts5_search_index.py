@@ -0,0 +1,46 @@
+"""Add FTS5 search index over posts and replies
+
+Revision ID: 7c1d9e5b2a40
+Revises: 3f8a2c91d4e7
+Create Date: 2026-10-18 11:02:17.220941
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '7c1d9e5b2a40'
+down_revision = '3f8a2c91d4e7'
+branch_labels = None
+depends_on = None
+
+TABLES = {"posts": "posts_fts", "replies": "replies_fts"}
+
+
+def upgrade():
+    for source, fts in TABLES.items():
+        op.execute(
+            f"CREATE VIRTUAL TABLE {fts} USING fts5("
+            f"content, content='{source}', content_rowid='id', tokenize='porter unicode61')"
+        )
+        op.execute(
+            f"CREATE TRIGGER {fts}_ai AFTER INSERT ON {source} BEGIN "
+            f"INSERT INTO {fts}(rowid, content) VALUES (new.id, new.content); END"
+        )
+        op.execute(
+            f"CREATE TRIGGER {fts}_ad AFTER DELETE ON {source} BEGIN "
+            f"INSERT INTO {fts}({fts}, rowid, content) VALUES ('delete', old.id, old.content); END"
+        )
+        op.execute(
+            f"CREATE TRIGGER {fts}_au AFTER UPDATE OF content ON {source} BEGIN "
+            f"INSERT INTO {fts}({fts}, rowid, content) VALUES ('delete', old.id, old.content); "
+            f"INSERT INTO {fts}(rowid, content) VALUES (new.id, new.content); END"
+        )
+        op.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+
+def downgrade():
+    for source, fts in TABLES.items():
+        for suffix in ("ai", "ad", "au"):
+            op.execute(f"DROP TRIGGER IF EXISTS {fts}_{suffix}")
+        op.execute(f"DROP TABLE IF EXISTS {fts}")
@@ -0,0 +1,94 @@
+"""Add leaderboard buckets of likes received per author
+
+Revision ID: a7d3e5f1b284
+Revises: f4c8a2d6e913
+Create Date: 2026-10-19 15:12:08.344190
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7d3e5f1b284'
+down_revision = 'f4c8a2d6e913'
+branch_labels = None
+depends_on = None
+
+LIKED_AUTHOR = (
+    "COALESCE((SELECT author_id FROM posts WHERE id = {row}.post_id), "
+    "(SELECT author_id FROM replies WHERE id = {row}.reply_id))"
+)
+
+
+def _buckets(row):
+    ts = f"COALESCE({row}.created_at, CURRENT_TIMESTAMP)"
+    return [
+        f"'day:' || date({ts})",
+        f"'week:' || date({ts}, '-6 days', 'weekday 1')",
+        f"'quarter:' || strftime('%Y', {ts}) || '-Q' || ((CAST(strftime('%m', {ts}) AS INTEGER) + 2) / 3)",
+        "'all'",
+    ]
+
+
+def _taken_back(column):
+    return (
+        "UPDATE leaderboard_buckets SET likes = likes - "
+        f"(SELECT count(*) FROM likes WHERE {column} = old.id "
+        f"AND leaderboard_buckets.bucket IN ({', '.join(_buckets('likes'))})) "
+        f"WHERE user_id = old.author_id AND bucket IN ("
+        + " UNION ".join(f"SELECT {key} FROM likes WHERE {column} = old.id" for key in _buckets("likes"))
+        + "); "
+    )
+
+
+def _triggers():
+    new_author, old_author = LIKED_AUTHOR.format(row="new"), LIKED_AUTHOR.format(row="old")
+    keys = " UNION ALL ".join(f"SELECT {key} AS bucket" for key in _buckets("new"))
+    yield "leaderboard_likes_ai", (
+        "AFTER INSERT ON likes BEGIN "
+        f"INSERT INTO leaderboard_buckets (bucket, user_id, likes) "
+        f"SELECT k.bucket, {new_author}, 1 FROM ({keys}) AS k WHERE {new_author} IS NOT NULL "
+        "ON CONFLICT (bucket, user_id) DO UPDATE SET likes = likes + 1; END"
+    )
+    yield "leaderboard_likes_ad", (
+        "AFTER DELETE ON likes BEGIN "
+        f"UPDATE leaderboard_buckets SET likes = likes - 1 WHERE user_id = {old_author} "
+        f"AND bucket IN ({', '.join(_buckets('old'))}); END"
+    )
+    yield "leaderboard_posts_bd", f"BEFORE DELETE ON posts BEGIN {_taken_back('post_id')}END"
+    yield "leaderboard_replies_bd", f"BEFORE DELETE ON replies BEGIN {_taken_back('reply_id')}END"
+    yield "leaderboard_users_ad", (
+        "AFTER DELETE ON users BEGIN DELETE FROM leaderboard_buckets WHERE user_id = old.id; END"
+    )
+
+
+def upgrade():
+    op.create_table('leaderboard_buckets',
+    sa.Column('bucket', sa.String(length=20), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('likes', sa.Integer(), server_default='0', nullable=False),
+    sa.PrimaryKeyConstraint('bucket', 'user_id')
+    )
+    with op.batch_alter_table('leaderboard_buckets', schema=None) as batch_op:
+        batch_op.create_index('ix_leaderboard_buckets_bucket_likes', ['bucket', sa.text('likes DESC'), 'user_id'], unique=False)
+
+    author = LIKED_AUTHOR.format(row="likes")
+    for key in _buckets("likes"):
+        op.execute(
+            f"INSERT INTO leaderboard_buckets (bucket, user_id, likes) "
+            f"SELECT {key}, {author} AS author_id, count(*) FROM likes "
+            f"WHERE author_id IS NOT NULL GROUP BY 1, 2"
+        )
+    for name, body in _triggers():
+        op.execute(f"CREATE TRIGGER {name} {body}")
+
+
+def downgrade():
+    for name, _ in _triggers():
+        op.execute(f"DROP TRIGGER IF EXISTS {name}")
+
+    with op.batch_alter_table('leaderboard_buckets', schema=None) as batch_op:
+        batch_op.drop_index('ix_leaderboard_buckets_bucket_likes')
+
+    op.drop_table('leaderboard_buckets')
@@ -0,0 +1,60 @@
+"""Add feed index and sync_versions section counters
+
+Revision ID: a8e4c6f29d15
+Revises: f3b7d2a9c461
+Create Date: 2026-10-19 01:22:05.118934
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'a8e4c6f29d15'
+down_revision = 'f3b7d2a9c461'
+branch_labels = None
+depends_on = None
+
+USER_PROFILE_UPDATE = "UPDATE OF name, avatar_url, email, position, department, role ON users"
+SECTION_SOURCES = {
+    "posts": [("posts", ("INSERT", "UPDATE", "DELETE")), ("users", (USER_PROFILE_UPDATE,))],
+    "polls": [
+        ("polls", ("INSERT", "UPDATE", "DELETE")),
+        ("poll_options", ("INSERT", "UPDATE", "DELETE")),
+        ("votes", ("INSERT", "UPDATE", "DELETE")),
+        ("users", (USER_PROFILE_UPDATE,)),
+    ],
+}
+
+
+def _triggers():
+    for section, sources in SECTION_SOURCES.items():
+        for table, events in sources:
+            for ev in events:
+                verb = ev.split()[0]
+                target = "" if " ON " in ev else f" ON {table}"
+                yield f"sync_{section}_{table}_a{verb[0].lower()}", section, f"{ev}{target}"
+
+
+def upgrade():
+    with op.batch_alter_table('posts', schema=None) as batch_op:
+        batch_op.create_index('ix_posts_feed', ['pinned', 'created_at', 'id'], unique=False)
+
+    op.execute(
+        "CREATE TABLE sync_versions (section TEXT PRIMARY KEY, version INTEGER NOT NULL DEFAULT 0)"
+    )
+    for section in SECTION_SOURCES:
+        op.execute(f"INSERT INTO sync_versions (section, version) VALUES ('{section}', 0)")
+    for name, section, event in _triggers():
+        op.execute(
+            f"CREATE TRIGGER {name} AFTER {event} BEGIN "
+            f"UPDATE sync_versions SET version = version + 1 WHERE section = '{section}'; END"
+        )
+
+
+def downgrade():
+    for name, _, _ in _triggers():
+        op.execute(f"DROP TRIGGER IF EXISTS {name}")
+    op.execute("DROP TABLE IF EXISTS sync_versions")
+
+    with op.batch_alter_table('posts', schema=None) as batch_op:
+        batch_op.drop_index('ix_posts_feed')
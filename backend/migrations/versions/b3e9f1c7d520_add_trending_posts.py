@@ -0,0 +1,81 @@
+"""Add trending scores per post
+
+Revision ID: b3e9f1c7d520
+Revises: a7d3e5f1b284
+Create Date: 2026-10-19 16:47:52.118630
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3e9f1c7d520'
+down_revision = 'a7d3e5f1b284'
+branch_labels = None
+depends_on = None
+
+LIKE, REPLY = 1.0, 2.0
+
+
+def _add(post_id, weight):
+    return (
+        f"INSERT INTO trending_posts (post_id, score) SELECT {post_id}, {weight} WHERE {post_id} IS NOT NULL "
+        f"ON CONFLICT (post_id) DO UPDATE SET score = score + {weight}; "
+    )
+
+
+def _sub(post_id, weight):
+    return f"UPDATE trending_posts SET score = max(score - {weight}, 0) WHERE post_id = {post_id}; "
+
+
+def _triggers():
+    yield "trending_likes_ai", f"AFTER INSERT ON likes WHEN new.post_id IS NOT NULL BEGIN {_add('new.post_id', LIKE)}END"
+    yield "trending_likes_ad", f"AFTER DELETE ON likes WHEN old.post_id IS NOT NULL BEGIN {_sub('old.post_id', LIKE)}END"
+    yield "trending_replies_ai", (
+        f"AFTER INSERT ON replies WHEN new.deleted_at IS NULL BEGIN {_add('new.post_id', REPLY)}END"
+    )
+    yield "trending_replies_ad", (
+        f"AFTER DELETE ON replies WHEN old.deleted_at IS NULL BEGIN {_sub('old.post_id', REPLY)}END"
+    )
+    yield "trending_replies_restored_au", (
+        "AFTER UPDATE OF deleted_at ON replies WHEN old.deleted_at IS NOT NULL AND new.deleted_at IS NULL BEGIN "
+        f"{_add('new.post_id', REPLY)}END"
+    )
+    yield "trending_replies_deleted_au", (
+        "AFTER UPDATE OF deleted_at ON replies WHEN old.deleted_at IS NULL AND new.deleted_at IS NOT NULL BEGIN "
+        f"{_sub('new.post_id', REPLY)}END"
+    )
+    yield "trending_posts_ad", "AFTER DELETE ON posts BEGIN DELETE FROM trending_posts WHERE post_id = old.id; END"
+
+
+def upgrade():
+    op.create_table('trending_posts',
+    sa.Column('post_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('score', sa.Float(), server_default='0', nullable=False),
+    sa.PrimaryKeyConstraint('post_id')
+    )
+    with op.batch_alter_table('trending_posts', schema=None) as batch_op:
+        batch_op.create_index('ix_trending_posts_score', ['score', 'post_id'], unique=False)
+    with op.batch_alter_table('likes', schema=None) as batch_op:
+        batch_op.create_index('ix_likes_created_at', ['created_at', 'post_id'], unique=False)
+    with op.batch_alter_table('replies', schema=None) as batch_op:
+        batch_op.create_index('ix_replies_created_at', ['created_at'], unique=False)
+
+    # left empty: the app's first refresh (or `flask trending-refresh`) scores recent activity
+    for name, body in _triggers():
+        op.execute(f"CREATE TRIGGER {name} {body}")
+
+
+def downgrade():
+    for name, _ in _triggers():
+        op.execute(f"DROP TRIGGER IF EXISTS {name}")
+
+    with op.batch_alter_table('replies', schema=None) as batch_op:
+        batch_op.drop_index('ix_replies_created_at')
+    with op.batch_alter_table('likes', schema=None) as batch_op:
+        batch_op.drop_index('ix_likes_created_at')
+    with op.batch_alter_table('trending_posts', schema=None) as batch_op:
+        batch_op.drop_index('ix_trending_posts_score')
+
+    op.drop_table('trending_posts')
@@ -0,0 +1,55 @@
+"""Add user search indexes
+
+Revision ID: b4e6f0a3c812
+Revises: 7c1d9e5b2a40
+Create Date: 2026-10-18 12:30:54.118302
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b4e6f0a3c812'
+down_revision = '7c1d9e5b2a40'
+branch_labels = None
+depends_on = None
+
+COLUMNS = "name, login_id, email, department"
+NEW = "new.name, new.login_id, new.email, new.department"
+OLD = "old.name, old.login_id, old.email, old.department"
+
+
+def upgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.create_index('ix_users_login_id_lower', [sa.text('lower(login_id)')], unique=False)
+        batch_op.create_index('ix_users_name_lower', [sa.text('lower(name)')], unique=False)
+
+    op.execute(
+        f"CREATE VIRTUAL TABLE users_fts USING fts5("
+        f"{COLUMNS}, content='users', content_rowid='id', tokenize='trigram')"
+    )
+    op.execute(
+        f"CREATE TRIGGER users_fts_ai AFTER INSERT ON users BEGIN "
+        f"INSERT INTO users_fts(rowid, {COLUMNS}) VALUES (new.id, {NEW}); END"
+    )
+    op.execute(
+        f"CREATE TRIGGER users_fts_ad AFTER DELETE ON users BEGIN "
+        f"INSERT INTO users_fts(users_fts, rowid, {COLUMNS}) VALUES ('delete', old.id, {OLD}); END"
+    )
+    op.execute(
+        f"CREATE TRIGGER users_fts_au AFTER UPDATE OF {COLUMNS} ON users BEGIN "
+        f"INSERT INTO users_fts(users_fts, rowid, {COLUMNS}) VALUES ('delete', old.id, {OLD}); "
+        f"INSERT INTO users_fts(rowid, {COLUMNS}) VALUES (new.id, {NEW}); END"
+    )
+    op.execute("INSERT INTO users_fts(users_fts) VALUES ('rebuild')")
+
+
+def downgrade():
+    for suffix in ("ai", "ad", "au"):
+        op.execute(f"DROP TRIGGER IF EXISTS users_fts_{suffix}")
+    op.execute("DROP TABLE IF EXISTS users_fts")
+
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_index('ix_users_name_lower')
+        batch_op.drop_index('ix_users_login_id_lower')
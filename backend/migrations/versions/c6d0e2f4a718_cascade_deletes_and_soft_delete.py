@@ -0,0 +1,96 @@
+"""ON DELETE clauses on foreign keys, deleted_at on posts and replies
+
+Revision ID: c6d0e2f4a718
+Revises: a8e4c6f29d15
+Create Date: 2026-10-19 09:41:27.530216
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c6d0e2f4a718'
+down_revision = 'a8e4c6f29d15'
+branch_labels = None
+depends_on = None
+
+# reflected SQLite foreign keys are unnamed; the convention names them for drop_constraint
+NAMING_CONVENTION = {"fk": "fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s"}
+
+# table -> [(column, referred table, ondelete)]
+FOREIGN_KEYS = {
+    'posts': [('author_id', 'users', 'CASCADE')],
+    'replies': [('post_id', 'posts', 'CASCADE'), ('author_id', 'users', 'CASCADE')],
+    'likes': [('user_id', 'users', 'CASCADE'), ('post_id', 'posts', 'CASCADE'), ('reply_id', 'replies', 'CASCADE')],
+    'polls': [('created_by_id', 'users', 'CASCADE')],
+    'poll_options': [('poll_id', 'polls', 'CASCADE')],
+    'votes': [('user_id', 'users', 'CASCADE'), ('poll_option_id', 'poll_options', 'CASCADE')],
+    'notifications': [
+        ('user_id', 'users', 'CASCADE'), ('actor_id', 'users', 'SET NULL'), ('post_id', 'posts', 'CASCADE'),
+        ('reply_id', 'replies', 'CASCADE'), ('poll_id', 'polls', 'CASCADE'),
+    ],
+}
+
+OLD_REPLIES_COUNT_AD = (
+    "CREATE TRIGGER replies_count_ad AFTER DELETE ON replies BEGIN "
+    "UPDATE posts SET reply_count = reply_count - 1 WHERE id = old.post_id; END"
+)
+NEW_REPLY_COUNT_TRIGGERS = [
+    "CREATE TRIGGER replies_count_ad AFTER DELETE ON replies "
+    "WHEN old.deleted_at IS NULL BEGIN "
+    "UPDATE posts SET reply_count = reply_count - 1 WHERE id = old.post_id; END",
+    "CREATE TRIGGER replies_count_au AFTER UPDATE OF deleted_at ON replies "
+    "WHEN (old.deleted_at IS NULL) != (new.deleted_at IS NULL) BEGIN "
+    "UPDATE posts SET reply_count = reply_count + "
+    "CASE WHEN new.deleted_at IS NULL THEN 1 ELSE -1 END WHERE id = new.post_id; END",
+]
+
+
+def _drop_triggers(skip=()):
+    """Table rebuilds drop a table's triggers, and renames fail on triggers naming a
+    missing table, so every trigger is set aside for the rebuild and restored after."""
+    bind = op.get_bind()
+    triggers = bind.exec_driver_sql(
+        "SELECT name, sql FROM sqlite_master WHERE type = 'trigger' ORDER BY name"
+    ).all()
+    for name, _ in triggers:
+        op.execute(f"DROP TRIGGER {name}")
+    return [sql for name, sql in triggers if name not in skip]
+
+
+def _rebuild_foreign_keys(ondelete: bool):
+    for table, keys in FOREIGN_KEYS.items():
+        with op.batch_alter_table(table, schema=None, naming_convention=NAMING_CONVENTION) as batch_op:
+            for column, referred, action in keys:
+                name = f"fk_{table}_{column}_{referred}"
+                batch_op.drop_constraint(name, type_='foreignkey')
+                batch_op.create_foreign_key(name, referred, [column], ['id'], ondelete=action if ondelete else None)
+
+
+def upgrade():
+    triggers = _drop_triggers(skip=('replies_count_ad',))
+    _rebuild_foreign_keys(ondelete=True)
+
+    for table in ('posts', 'replies'):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('deleted_at', sa.DateTime(), nullable=True))
+            batch_op.create_index(f'ix_{table}_deleted_at', ['deleted_at'], unique=False,
+                                  sqlite_where=sa.text('deleted_at IS NOT NULL'))
+
+    for sql in triggers + NEW_REPLY_COUNT_TRIGGERS:
+        op.execute(sql)
+
+
+def downgrade():
+    triggers = _drop_triggers(skip=('replies_count_ad', 'replies_count_au'))
+
+    for table in ('replies', 'posts'):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_index(f'ix_{table}_deleted_at')
+            batch_op.drop_column('deleted_at')
+
+    _rebuild_foreign_keys(ondelete=False)
+
+    for sql in triggers + [OLD_REPLIES_COUNT_AD]:
+        op.execute(sql)
@@ -0,0 +1,25 @@
+"""Add a per-user index on notifications
+
+Revision ID: c7e2a4f8d913
+Revises: b3e9f1c7d520
+Create Date: 2026-10-19 18:05:41.527306
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7e2a4f8d913'
+down_revision = 'b3e9f1c7d520'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('notifications', schema=None) as batch_op:
+        batch_op.create_index('ix_notifications_user_created', ['user_id', 'created_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('notifications', schema=None) as batch_op:
+        batch_op.drop_index('ix_notifications_user_created')
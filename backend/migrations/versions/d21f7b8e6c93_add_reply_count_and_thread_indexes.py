@@ -0,0 +1,55 @@
+"""Add stored reply_count and thread indexes
+
+Revision ID: d21f7b8e6c93
+Revises: b4e6f0a3c812
+Create Date: 2026-10-18 13:48:09.662415
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd21f7b8e6c93'
+down_revision = 'b4e6f0a3c812'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('posts', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('reply_count', sa.Integer(), nullable=False, server_default='0'))
+
+    with op.batch_alter_table('replies', schema=None) as batch_op:
+        batch_op.create_index('ix_replies_post_created', ['post_id', 'created_at', 'id'], unique=False)
+
+    with op.batch_alter_table('likes', schema=None) as batch_op:
+        batch_op.create_index('ix_likes_post_id', ['post_id'], unique=False)
+        batch_op.create_index('ix_likes_reply_id', ['reply_id'], unique=False)
+
+    op.execute(
+        "UPDATE posts SET reply_count = (SELECT count(*) FROM replies WHERE replies.post_id = posts.id)"
+    )
+    op.execute(
+        "CREATE TRIGGER replies_count_ai AFTER INSERT ON replies BEGIN "
+        "UPDATE posts SET reply_count = reply_count + 1 WHERE id = new.post_id; END"
+    )
+    op.execute(
+        "CREATE TRIGGER replies_count_ad AFTER DELETE ON replies BEGIN "
+        "UPDATE posts SET reply_count = reply_count - 1 WHERE id = old.post_id; END"
+    )
+
+
+def downgrade():
+    op.execute("DROP TRIGGER IF EXISTS replies_count_ad")
+    op.execute("DROP TRIGGER IF EXISTS replies_count_ai")
+
+    with op.batch_alter_table('likes', schema=None) as batch_op:
+        batch_op.drop_index('ix_likes_reply_id')
+        batch_op.drop_index('ix_likes_post_id')
+
+    with op.batch_alter_table('replies', schema=None) as batch_op:
+        batch_op.drop_index('ix_replies_post_created')
+
+    with op.batch_alter_table('posts', schema=None) as batch_op:
+        batch_op.drop_column('reply_count')
@@ -0,0 +1,67 @@
+"""Add media_assets for upload deduplication and reference counting
+
+Revision ID: d8f1a3b5c920
+Revises: c6d0e2f4a718
+Create Date: 2026-10-19 11:02:48.274190
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd8f1a3b5c920'
+down_revision = 'c6d0e2f4a718'
+branch_labels = None
+depends_on = None
+
+MEDIA_COLUMNS = ('image_url', 'gif_url')
+
+
+def _media_refs(row, delta):
+    return "".join(
+        f"UPDATE media_assets SET ref_count = ref_count {delta} 1, last_used_at = CURRENT_TIMESTAMP "
+        f"WHERE url = {row}.{column}; "
+        for column in MEDIA_COLUMNS
+    )
+
+
+def _triggers():
+    for table in ('posts', 'replies'):
+        yield f"media_refs_{table}_ai", f"AFTER INSERT ON {table} BEGIN {_media_refs('new', '+')}END"
+        yield f"media_refs_{table}_ad", f"AFTER DELETE ON {table} BEGIN {_media_refs('old', '-')}END"
+        yield (f"media_refs_{table}_au", f"AFTER UPDATE OF {', '.join(MEDIA_COLUMNS)} ON {table} BEGIN "
+               f"{_media_refs('old', '-')}{_media_refs('new', '+')}END")
+
+
+def upgrade():
+    op.create_table('media_assets',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('content_hash', sa.String(length=64), nullable=True),
+    sa.Column('storage_key', sa.String(length=255), nullable=False),
+    sa.Column('url', sa.String(length=255), nullable=False),
+    sa.Column('size', sa.Integer(), nullable=True),
+    sa.Column('content_type', sa.String(length=50), nullable=True),
+    sa.Column('ref_count', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('last_used_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('content_hash'),
+    sa.UniqueConstraint('url')
+    )
+    with op.batch_alter_table('media_assets', schema=None) as batch_op:
+        batch_op.create_index('ix_media_assets_unreferenced', ['last_used_at'], unique=False,
+                              sqlite_where=sa.text('ref_count = 0'))
+
+    for name, body in _triggers():
+        op.execute(f"CREATE TRIGGER {name} {body}")
+
+
+def downgrade():
+    for name, _ in _triggers():
+        op.execute(f"DROP TRIGGER IF EXISTS {name}")
+
+    with op.batch_alter_table('media_assets', schema=None) as batch_op:
+        batch_op.drop_index('ix_media_assets_unreferenced')
+
+    op.drop_table('media_assets')
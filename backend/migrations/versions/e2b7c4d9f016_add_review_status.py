@@ -0,0 +1,47 @@
+"""Add review_status to posts and replies for asynchronous moderation
+
+Revision ID: e2b7c4d9f016
+Revises: d8f1a3b5c920
+Create Date: 2026-10-19 12:26:03.918452
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2b7c4d9f016'
+down_revision = 'd8f1a3b5c920'
+branch_labels = None
+depends_on = None
+
+
+def _drop_triggers():
+    """Dropping a column rebuilds the table, which drops its triggers; they are set aside and restored."""
+    bind = op.get_bind()
+    triggers = bind.exec_driver_sql(
+        "SELECT name, sql FROM sqlite_master WHERE type = 'trigger' ORDER BY name"
+    ).all()
+    for name, _ in triggers:
+        op.execute(f"DROP TRIGGER {name}")
+    return [sql for _, sql in triggers]
+
+
+def upgrade():
+    for table in ('posts', 'replies'):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('review_status', sa.String(length=20), nullable=True))
+            batch_op.create_index(f'ix_{table}_review_status', ['review_status', 'id'], unique=False,
+                                  sqlite_where=sa.text('review_status IS NOT NULL'))
+
+
+def downgrade():
+    triggers = _drop_triggers()
+
+    for table in ('replies', 'posts'):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_index(f'ix_{table}_review_status')
+            batch_op.drop_column('review_status')
+
+    for sql in triggers:
+        op.execute(sql)
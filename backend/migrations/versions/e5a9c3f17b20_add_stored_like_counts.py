@@ -0,0 +1,52 @@
+"""Add stored like_count to posts and replies
+
+Revision ID: e5a9c3f17b20
+Revises: d21f7b8e6c93
+Create Date: 2026-10-18 23:58:41.207316
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5a9c3f17b20'
+down_revision = 'd21f7b8e6c93'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('posts', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('like_count', sa.Integer(), nullable=False, server_default='0'))
+
+    with op.batch_alter_table('replies', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('like_count', sa.Integer(), nullable=False, server_default='0'))
+
+    op.execute(
+        "UPDATE posts SET like_count = (SELECT count(*) FROM likes WHERE likes.post_id = posts.id)"
+    )
+    op.execute(
+        "UPDATE replies SET like_count = (SELECT count(*) FROM likes WHERE likes.reply_id = replies.id)"
+    )
+    op.execute(
+        "CREATE TRIGGER likes_count_ai AFTER INSERT ON likes BEGIN "
+        "UPDATE posts SET like_count = like_count + 1 WHERE id = new.post_id; "
+        "UPDATE replies SET like_count = like_count + 1 WHERE id = new.reply_id; END"
+    )
+    op.execute(
+        "CREATE TRIGGER likes_count_ad AFTER DELETE ON likes BEGIN "
+        "UPDATE posts SET like_count = like_count - 1 WHERE id = old.post_id; "
+        "UPDATE replies SET like_count = like_count - 1 WHERE id = old.reply_id; END"
+    )
+
+
+def downgrade():
+    op.execute("DROP TRIGGER IF EXISTS likes_count_ad")
+    op.execute("DROP TRIGGER IF EXISTS likes_count_ai")
+
+    with op.batch_alter_table('replies', schema=None) as batch_op:
+        batch_op.drop_column('like_count')
+
+    with op.batch_alter_table('posts', schema=None) as batch_op:
+        batch_op.drop_column('like_count')
@@ -0,0 +1,26 @@
+"""Add token_version to users
+
+Revision ID: f3b7d2a9c461
+Revises: e5a9c3f17b20
+Create Date: 2026-10-19 00:41:17.530288
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3b7d2a9c461'
+down_revision = 'e5a9c3f17b20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('token_version', sa.Integer(), nullable=False, server_default='1'))
+
+
+def downgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('token_version')
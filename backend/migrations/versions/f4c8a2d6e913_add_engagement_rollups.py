@@ -0,0 +1,170 @@
+"""Add daily engagement rollups per user and per department
+
+Revision ID: f4c8a2d6e913
+Revises: e2b7c4d9f016
+Create Date: 2026-10-19 13:41:27.502816
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f4c8a2d6e913'
+down_revision = 'e2b7c4d9f016'
+branch_labels = None
+depends_on = None
+
+METRICS = ('posts', 'replies', 'likes_given', 'likes_received', 'votes')
+LIKED_AUTHOR = (
+    "COALESCE((SELECT author_id FROM posts WHERE id = {row}.post_id), "
+    "(SELECT author_id FROM replies WHERE id = {row}.reply_id))"
+)
+
+
+def _day(row):
+    return f"COALESCE(date({row}.created_at), date('now'))"
+
+
+def _add(metric, user, day):
+    return (
+        f"INSERT INTO engagement_user_daily (user_id, day, department, {metric}) "
+        f"SELECT {user}, {day}, COALESCE((SELECT department FROM users WHERE id = {user}), ''), 1 "
+        f"WHERE {user} IS NOT NULL "
+        f"ON CONFLICT (user_id, day) DO UPDATE SET {metric} = {metric} + 1; "
+        f"INSERT INTO engagement_department_daily (department, day, {metric}) "
+        f"SELECT department, day, 1 FROM engagement_user_daily WHERE user_id = {user} AND day = {day} "
+        f"ON CONFLICT (department, day) DO UPDATE SET {metric} = {metric} + 1; "
+    )
+
+
+def _sub(metric, user, day):
+    return (
+        f"UPDATE engagement_department_daily SET {metric} = {metric} - 1 WHERE day = {day} AND department = "
+        f"(SELECT department FROM engagement_user_daily WHERE user_id = {user} AND day = {day}); "
+        f"UPDATE engagement_user_daily SET {metric} = {metric} - 1 WHERE user_id = {user} AND day = {day}; "
+    )
+
+
+def _likes_received_sub(column):
+    liked_on = f"SELECT count(*) FROM likes WHERE {column} = old.id AND {_day('likes')} = {{table}}.day"
+    days = f"SELECT {_day('likes')} FROM likes WHERE {column} = old.id"
+    return (
+        f"UPDATE engagement_department_daily SET likes_received = likes_received - "
+        f"({liked_on.format(table='engagement_department_daily')}) "
+        f"WHERE department = (SELECT department FROM engagement_user_daily WHERE user_id = old.author_id LIMIT 1) "
+        f"AND day IN ({days}); "
+        f"UPDATE engagement_user_daily SET likes_received = likes_received - "
+        f"({liked_on.format(table='engagement_user_daily')}) "
+        f"WHERE user_id = old.author_id AND day IN ({days}); "
+    )
+
+
+def _triggers():
+    for table, column in (('posts', 'post_id'), ('replies', 'reply_id')):
+        yield f"engagement_{table}_ai", f"AFTER INSERT ON {table} BEGIN {_add(table, 'new.author_id', _day('new'))}END"
+        yield f"engagement_{table}_ad", f"AFTER DELETE ON {table} BEGIN {_sub(table, 'old.author_id', _day('old'))}END"
+        yield f"engagement_{table}_bd", f"BEFORE DELETE ON {table} BEGIN {_likes_received_sub(column)}END"
+    yield "engagement_likes_ai", (
+        f"AFTER INSERT ON likes BEGIN {_add('likes_given', 'new.user_id', _day('new'))}"
+        f"{_add('likes_received', LIKED_AUTHOR.format(row='new'), _day('new'))}END"
+    )
+    yield "engagement_likes_ad", (
+        f"AFTER DELETE ON likes BEGIN {_sub('likes_given', 'old.user_id', _day('old'))}"
+        f"{_sub('likes_received', LIKED_AUTHOR.format(row='old'), _day('old'))}END"
+    )
+    yield "engagement_votes_ai", f"AFTER INSERT ON votes BEGIN {_add('votes', 'new.user_id', _day('new'))}END"
+    yield "engagement_votes_ad", f"AFTER DELETE ON votes BEGIN {_sub('votes', 'old.user_id', _day('old'))}END"
+    moved = ", ".join(f"{m} = engagement_department_daily.{m} - u.{m}" for m in METRICS)
+    added = ", ".join(f"{m} = {m} + excluded.{m}" for m in METRICS)
+    metrics = ", ".join(METRICS)
+    yield "engagement_users_department_au", (
+        "AFTER UPDATE OF department ON users "
+        "WHEN COALESCE(old.department, '') != COALESCE(new.department, '') BEGIN "
+        f"UPDATE engagement_department_daily SET {moved} FROM engagement_user_daily AS u "
+        "WHERE u.user_id = new.id AND u.day = engagement_department_daily.day "
+        "AND u.department = engagement_department_daily.department; "
+        f"INSERT INTO engagement_department_daily (department, day, {metrics}) "
+        f"SELECT COALESCE(new.department, ''), day, {metrics} FROM engagement_user_daily WHERE user_id = new.id "
+        f"ON CONFLICT (department, day) DO UPDATE SET {added}; "
+        "UPDATE engagement_user_daily SET department = COALESCE(new.department, '') WHERE user_id = new.id; END"
+    )
+    yield "engagement_users_ad", (
+        "AFTER DELETE ON users BEGIN DELETE FROM engagement_user_daily WHERE user_id = old.id; END"
+    )
+
+
+def _backfill():
+    def row(user, day, source, metric):
+        columns = ", ".join(f"{int(m == metric)} AS {m}" for m in METRICS)
+        return f"SELECT {user} AS user_id, {day} AS day, {columns} FROM {source}"
+
+    events = " UNION ALL ".join((
+        row("author_id", _day("posts"), "posts", "posts"),
+        row("author_id", _day("replies"), "replies", "replies"),
+        row("user_id", _day("likes"), "likes", "likes_given"),
+        row("COALESCE(p.author_id, r.author_id)", _day("likes"),
+            "likes LEFT JOIN posts p ON p.id = likes.post_id LEFT JOIN replies r ON r.id = likes.reply_id",
+            "likes_received"),
+        row("user_id", _day("votes"), "votes", "votes"),
+    ))
+    metrics = ", ".join(METRICS)
+    op.execute(
+        f"INSERT INTO engagement_user_daily (user_id, day, department, {metrics}) "
+        f"SELECT e.user_id, e.day, COALESCE(u.department, ''), {', '.join(f'sum(e.{m})' for m in METRICS)} "
+        f"FROM ({events}) AS e JOIN users u ON u.id = e.user_id GROUP BY e.user_id, e.day"
+    )
+    op.execute(
+        f"INSERT INTO engagement_department_daily (department, day, {metrics}) "
+        f"SELECT department, day, {', '.join(f'sum({m})' for m in METRICS)} "
+        "FROM engagement_user_daily GROUP BY department, day"
+    )
+
+
+def upgrade():
+    op.create_table('engagement_user_daily',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('department', sa.String(length=100), server_default='', nullable=False),
+    sa.Column('posts', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('replies', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('likes_given', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('likes_received', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('votes', sa.Integer(), server_default='0', nullable=False),
+    sa.PrimaryKeyConstraint('user_id', 'day')
+    )
+    with op.batch_alter_table('engagement_user_daily', schema=None) as batch_op:
+        batch_op.create_index('ix_engagement_user_daily_department_day', ['department', 'day'], unique=False)
+        batch_op.create_index('ix_engagement_user_daily_day', ['day', 'department', 'user_id'], unique=False)
+
+    op.create_table('engagement_department_daily',
+    sa.Column('department', sa.String(length=100), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('posts', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('replies', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('likes_given', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('likes_received', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('votes', sa.Integer(), server_default='0', nullable=False),
+    sa.PrimaryKeyConstraint('department', 'day')
+    )
+    with op.batch_alter_table('engagement_department_daily', schema=None) as batch_op:
+        batch_op.create_index('ix_engagement_department_daily_day', ['day'], unique=False)
+
+    _backfill()
+    for name, body in _triggers():
+        op.execute(f"CREATE TRIGGER {name} {body}")
+
+
+def downgrade():
+    for name, _ in _triggers():
+        op.execute(f"DROP TRIGGER IF EXISTS {name}")
+
+    with op.batch_alter_table('engagement_department_daily', schema=None) as batch_op:
+        batch_op.drop_index('ix_engagement_department_daily_day')
+
+    op.drop_table('engagement_department_daily')
+    with op.batch_alter_table('engagement_user_daily', schema=None) as batch_op:
+        batch_op.drop_index('ix_engagement_user_daily_day')
+        batch_op.drop_index('ix_engagement_user_daily_department_day')
+
+    op.drop_table('engagement_user_daily')
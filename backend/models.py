@@ -1,7 +1,10 @@
 from extensions import db
 from flask import request
 from datetime import timezone, datetime
-from flask_jwt_extended import get_jwt_identity
+from auth import password_hasher, revoke_tokens
+from sqlalchemy import event
+from sqlalchemy.orm.attributes import NO_VALUE, NEVER_SET
+from variants import AVATAR_WIDTHS, image_sources
 
 
 def format_datetime(dt: datetime):
@@ -23,29 +26,43 @@ class User(db.Model):
     email = db.Column(db.String(150), unique=True, nullable=True)
     position = db.Column(db.String(100))
     department = db.Column(db.String(100))
+    is_active = db.Column(db.Boolean, nullable=False, default=True, server_default=db.true())
+    # embedded in access tokens; bumping it revokes every token issued before
+    token_version = db.Column(db.Integer, nullable=False, default=1, server_default="1")
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    __table_args__ = (
+        # mention autocomplete: exact login lookups and name/login prefix ranges
+        db.Index("ix_users_login_id_lower", db.func.lower(login_id)),
+        db.Index("ix_users_name_lower", db.func.lower(name)),
+    )
+
     # relationships
-    posts = db.relationship("Post", backref="author", lazy="select", cascade="all, delete-orphan")
-    replies = db.relationship("Reply", backref="author", lazy="select", cascade="all, delete-orphan")
-    votes = db.relationship("Vote", back_populates="user", lazy="select")
-    notifications = db.relationship("Notification", backref="user", lazy="select", cascade="all, delete-orphan", foreign_keys="Notification.user_id")
-    notifications_as_actor = db.relationship("Notification", lazy="select", foreign_keys="Notification.actor_id")
-    polls_created = db.relationship("Poll", backref="created_by_user", lazy="select", cascade="all, delete-orphan")
-    likes = db.relationship("Like", backref="user", lazy="select", cascade="all, delete-orphan")
+    # children are removed by the ON DELETE clauses; passive_deletes keeps the ORM from loading them first
+    posts = db.relationship("Post", backref="author", lazy="select", cascade="all, delete-orphan", passive_deletes=True)
+    replies = db.relationship("Reply", backref="author", lazy="select", cascade="all, delete-orphan", passive_deletes=True)
+    votes = db.relationship("Vote", back_populates="user", lazy="select", passive_deletes=True)
+    notifications = db.relationship("Notification", backref="user", lazy="select", cascade="all, delete-orphan", foreign_keys="Notification.user_id", passive_deletes=True)
+    notifications_as_actor = db.relationship("Notification", lazy="select", foreign_keys="Notification.actor_id", passive_deletes=True)
+    polls_created = db.relationship("Poll", backref="created_by_user", lazy="select", cascade="all, delete-orphan", passive_deletes=True)
+    likes = db.relationship("Like", backref="user", lazy="select", cascade="all, delete-orphan", passive_deletes=True)
 
     def set_password(self, password: str):
-        self.password = password
+        self.password = password_hasher().hash(password)
 
     def check_password(self, password: str) -> bool:
-        return self.password == password
+        return password_hasher().verify(self.password, password)[0]
 
     def role_lower(self):
         return (self.role or "").lower()
 
     def to_json(self):
         avatar_full_url = None
+        try:
+            host_url = request.host_url.rstrip('/')
+        except RuntimeError:
+            host_url = ""
         if self.avatar_url:
             url = str(self.avatar_url)
             if url.startswith("http://") or url.startswith("https://"):
@@ -53,10 +70,6 @@ class User(db.Model):
             else:
                 url = url.lstrip("/")
                 final_path = url if url.startswith("statics/") else f"statics/profile/{url}"
-                try:
-                    host_url = request.host_url.rstrip('/')
-                except RuntimeError:
-                    host_url = ""
                 avatar_full_url = f"{host_url}/{final_path}" if host_url else f"/{final_path}"
 
         return {
@@ -65,6 +78,7 @@ class User(db.Model):
             "name": self.name,
             "role": self.role,
             "avatarUrl": avatar_full_url,
+            "avatarSources": image_sources(avatar_full_url, AVATAR_WIDTHS, host_url),
             "email": self.email,
             "position": self.position,
             "department": self.department,
@@ -73,21 +87,51 @@ class User(db.Model):
         }
 
 
+@event.listens_for(User.role, "set")
+def _revoke_on_role_change(target, value, oldvalue, initiator):
+    if oldvalue not in (NO_VALUE, NEVER_SET) and (oldvalue or "").lower() != (value or "").lower():
+        target.token_version = (target.token_version or 1) + 1
+        revoke_tokens(target.id)
+
+
+@event.listens_for(User.is_active, "set")
+def _revoke_on_deactivate(target, value, oldvalue, initiator):
+    if oldvalue is True and not value:
+        target.token_version = (target.token_version or 1) + 1
+        revoke_tokens(target.id)
+
+
 # -------------------- POST --------------------
 class Post(db.Model):
     __tablename__ = "posts"
 
     id = db.Column(db.Integer, primary_key=True)
-    author_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
+    author_id = db.Column(db.Integer, db.ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     content = db.Column(db.Text, nullable=False)
     image_url = db.Column(db.String(255), nullable=True)
     gif_url = db.Column(db.String(255), nullable=True)
     pinned = db.Column(db.Boolean, default=False)
+    # maintained by the replies_count_* and likes_count_* triggers in counters.py
+    reply_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    like_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     edited_at = db.Column(db.DateTime, nullable=True) 
+    # soft-deleted: hidden everywhere, physically removed later by deletion.purge_deleted
+    deleted_at = db.Column(db.DateTime, nullable=True)
+    # NULL once published; "pending_review" / "flagged" while async moderation has a say (review.py)
+    review_status = db.Column(db.String(20), nullable=True)
+
+    __table_args__ = (
+        # feed order: pinned first, then newest; keyset pages walk this index
+        db.Index("ix_posts_feed", "pinned", "created_at", "id"),
+        db.Index("ix_posts_deleted_at", "deleted_at", sqlite_where=db.text("deleted_at IS NOT NULL")),
+        db.Index("ix_posts_review_status", "review_status", "id",
+                 sqlite_where=db.text("review_status IS NOT NULL")),
+    )
+
     # relationships
-    replies = db.relationship("Reply", backref="post", lazy="select", cascade="all, delete-orphan")
-    likes = db.relationship("Like", backref="post", lazy="select", cascade="all, delete-orphan")
+    replies = db.relationship("Reply", backref="post", lazy="select", cascade="all, delete-orphan", passive_deletes=True)
+    likes = db.relationship("Like", backref="post", lazy="select", cascade="all, delete-orphan", passive_deletes=True)
     
     def edit(self, user: "User", new_content: str):
         if self.author_id != user.id:
@@ -105,8 +149,10 @@ class Post(db.Model):
             "authorId": self.author_id,
             "content": self.content,
             "imageUrl": self.image_url,
+            "imageSources": image_sources(self.image_url),
             "gifUrl": self.gif_url,
             "pinned": self.pinned,
+            "reviewStatus": self.review_status,
             "likeCount": len(self.likes),
             "createdAt": self.created_at.replace(tzinfo=timezone.utc).isoformat(),
 
@@ -118,15 +164,28 @@ class Reply(db.Model):
     __tablename__ = "replies"
 
     id = db.Column(db.Integer, primary_key=True)
-    post_id = db.Column(db.Integer, db.ForeignKey("posts.id"), nullable=False)
-    author_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
+    post_id = db.Column(db.Integer, db.ForeignKey("posts.id", ondelete="CASCADE"), nullable=False)
+    author_id = db.Column(db.Integer, db.ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     content = db.Column(db.Text, nullable=False)
     image_url = db.Column(db.String(255), nullable=True)
     gif_url = db.Column(db.String(255), nullable=True)
+    # maintained by the likes_count_* triggers in counters.py
+    like_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     edited_at = db.Column(db.DateTime, nullable=True)
+    deleted_at = db.Column(db.DateTime, nullable=True)
+    review_status = db.Column(db.String(20), nullable=True)
 
-    likes = db.relationship("Like", backref="reply", lazy="select", cascade="all, delete-orphan")
+    __table_args__ = (
+        # keyset pagination of a thread by (created_at, id)
+        db.Index("ix_replies_post_created", "post_id", "created_at", "id"),
+        db.Index("ix_replies_created_at", "created_at"),
+        db.Index("ix_replies_deleted_at", "deleted_at", sqlite_where=db.text("deleted_at IS NOT NULL")),
+        db.Index("ix_replies_review_status", "review_status", "id",
+                 sqlite_where=db.text("review_status IS NOT NULL")),
+    )
+
+    likes = db.relationship("Like", backref="reply", lazy="select", cascade="all, delete-orphan", passive_deletes=True)
     
     def edit(self, user: "User", new_content: str):
         if self.author_id != user.id:
@@ -145,9 +204,11 @@ class Reply(db.Model):
             "authorId": self.author_id,
             "content": self.content,
             "imageUrl": self.image_url,
+            "imageSources": image_sources(self.image_url),
             "gifUrl": self.gif_url,
             "likeCount": len(self.likes),
             "userLiked": any(l.user_id == logged_in_user_id for l in self.likes) if logged_in_user_id else False,
+            "reviewStatus": self.review_status,
             "createdAt": self.created_at.replace(tzinfo=timezone.utc).isoformat(),
             "user": self.author.to_json() if self.author else {
                 "id": None, "name": "Unknown", "avatarUrl": "/default-avatar.png"
@@ -160,14 +221,18 @@ class Like(db.Model):
     __tablename__ = "likes"
 
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
-    post_id = db.Column(db.Integer, db.ForeignKey("posts.id"), nullable=True)
-    reply_id = db.Column(db.Integer, db.ForeignKey("replies.id"), nullable=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    post_id = db.Column(db.Integer, db.ForeignKey("posts.id", ondelete="CASCADE"), nullable=True)
+    reply_id = db.Column(db.Integer, db.ForeignKey("replies.id", ondelete="CASCADE"), nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     __table_args__ = (
         db.UniqueConstraint("user_id", "post_id", name="unique_user_post_like"),
         db.UniqueConstraint("user_id", "reply_id", name="unique_user_reply_like"),
+        db.Index("ix_likes_post_id", "post_id"),
+        db.Index("ix_likes_reply_id", "reply_id"),
+        # the trending refresh reads recent likes (trending.py)
+        db.Index("ix_likes_created_at", "created_at", "post_id"),
     )
 
     def to_json(self):
@@ -188,26 +253,19 @@ class Poll(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
     description = db.Column(db.Text)
-    created_by_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
+    created_by_id = db.Column(db.Integer, db.ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     end_at = db.Column(db.DateTime, nullable=False)
     is_active = db.Column(db.Boolean, default=True)
 
-    options = db.relationship("PollOption", backref="poll", lazy="select", cascade="all, delete-orphan")
+    options = db.relationship("PollOption", backref="poll", lazy="select", cascade="all, delete-orphan", passive_deletes=True)
 
     def has_expired(self) -> bool:
         return datetime.utcnow() > self.end_at
 
     def _current_user_vote(self, user_id: int = None):
         if user_id is None:
-
-            try:
-                user_jwt = get_jwt_identity()
-                if not user_jwt:
-                    return None
-                user_id = int(user_jwt)
-            except RuntimeError:
-                return None
+            return None
         return (
 
             Vote.query.join(PollOption, Vote.poll_option_id == PollOption.id)
@@ -236,14 +294,15 @@ class PollOption(db.Model):
     __tablename__ = "poll_options"
 
     id = db.Column(db.Integer, primary_key=True)
-    poll_id = db.Column(db.Integer, db.ForeignKey("polls.id"), nullable=False)
+    poll_id = db.Column(db.Integer, db.ForeignKey("polls.id", ondelete="CASCADE"), nullable=False)
     text = db.Column(db.String(200), nullable=False)
 
     votes = db.relationship(
         "Vote",
         back_populates="option",
         lazy="select",
-        cascade="all, delete-orphan"
+        cascade="all, delete-orphan",
+        passive_deletes=True,
     )
     def to_json(self, include_votes=False):
         data = {"id": self.id, "pollId": self.poll_id, "text": self.text}
@@ -265,8 +324,8 @@ class Vote(db.Model):
     __tablename__ = "votes"
 
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
-    poll_option_id = db.Column(db.Integer, db.ForeignKey("poll_options.id"), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    poll_option_id = db.Column(db.Integer, db.ForeignKey("poll_options.id", ondelete="CASCADE"), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     __table_args__ = (
@@ -293,19 +352,23 @@ class Notification(db.Model):
     __tablename__ = "notifications"
 
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
-    actor_id = db.Column(db.Integer, db.ForeignKey('users.id'))  # the one who triggered
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    actor_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete="SET NULL"))  # the one who triggered
     action_type = db.Column(db.String(50))
     message = db.Column(db.Text, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     is_read = db.Column(db.Boolean, default=False)
 
-    post_id = db.Column(db.Integer, db.ForeignKey("posts.id"), nullable=True)
-    reply_id = db.Column(db.Integer, db.ForeignKey("replies.id"), nullable=True)
-    poll_id = db.Column(db.Integer, db.ForeignKey("polls.id"), nullable=True)
+    post_id = db.Column(db.Integer, db.ForeignKey("posts.id", ondelete="CASCADE"), nullable=True)
+    reply_id = db.Column(db.Integer, db.ForeignKey("replies.id", ondelete="CASCADE"), nullable=True)
+    poll_id = db.Column(db.Integer, db.ForeignKey("polls.id", ondelete="CASCADE"), nullable=True)
     actor = db.relationship("User", foreign_keys=[actor_id], lazy="joined")
 
-    
+    __table_args__ = (
+        # a user's newest notifications, read in index order
+        db.Index("ix_notifications_user_created", "user_id", "created_at"),
+    )
+
     def to_json(self):
         actor_data = None
         if self.actor:
@@ -325,4 +388,105 @@ class Notification(db.Model):
             "replyId": self.reply_id,
             "pollId": self.poll_id,
             "actor": actor_data
-        }
\ No newline at end of file
+        }
+
+# -------------------------
+# MediaAsset
+# -------------------------
+class MediaAsset(db.Model):
+    """One stored upload. ref_count is kept by triggers (counters.py) on posts/replies image_url and gif_url."""
+    __tablename__ = "media_assets"
+
+    id = db.Column(db.Integer, primary_key=True)
+    content_hash = db.Column(db.String(64), unique=True, nullable=True)  # sha256; unknown for direct Cloudinary uploads
+    storage_key = db.Column(db.String(255), nullable=False)
+    url = db.Column(db.String(255), unique=True, nullable=False)
+    size = db.Column(db.Integer, nullable=True)
+    content_type = db.Column(db.String(50), nullable=True)
+    ref_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_used_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        # garbage-collection candidates
+        db.Index("ix_media_assets_unreferenced", "last_used_at", sqlite_where=db.text("ref_count = 0")),
+    )
+
+
+# -------------------------
+# Engagement rollups
+# -------------------------
+class EngagementUserDaily(db.Model):
+    """
+    One user's activity on one UTC day, kept by triggers (counters.py) on
+    posts, replies, likes and votes; analytics.py reads it. No foreign key:
+    the rows must outlive the cascades that decrement them when a user is deleted.
+    """
+    __tablename__ = "engagement_user_daily"
+
+    user_id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    department = db.Column(db.String(100), nullable=False, default="", server_default="")  # users.department, "" when unset
+    posts = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    replies = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    likes_given = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    likes_received = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    votes = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+
+    __table_args__ = (
+        db.Index("ix_engagement_user_daily_department_day", "department", "day"),
+        # active employees per department over a range of days
+        db.Index("ix_engagement_user_daily_day", "day", "department", "user_id"),
+    )
+
+
+class EngagementDepartmentDaily(db.Model):
+    """The EngagementUserDaily rows of one department and day, summed."""
+    __tablename__ = "engagement_department_daily"
+
+    department = db.Column(db.String(100), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    posts = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    replies = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    likes_given = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    likes_received = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    votes = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+
+    __table_args__ = (
+        db.Index("ix_engagement_department_daily_day", "day"),
+    )
+
+
+class LeaderboardBucket(db.Model):
+    """
+    Likes received by one author within one time bucket ("day:2026-10-19",
+    "week:2026-10-19" for the week starting that Monday, "quarter:2026-Q4",
+    "all"), kept by triggers (counters.py) on likes; see leaderboard.py.
+    """
+    __tablename__ = "leaderboard_buckets"
+
+    bucket = db.Column(db.String(20), primary_key=True)
+    user_id = db.Column(db.Integer, primary_key=True)
+    likes = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+
+    __table_args__ = (
+        # a bucket's top K, read in order
+        db.Index("ix_leaderboard_buckets_bucket_likes", "bucket", db.text("likes DESC"), "user_id"),
+    )
+
+
+class TrendingPost(db.Model):
+    """
+    A post's time-decayed like and reply score. Triggers (counters.py) add
+    each event in full; trending.py decays the scores. Posts without recent
+    activity have no row.
+    """
+    __tablename__ = "trending_posts"
+
+    post_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    score = db.Column(db.Float, nullable=False, default=0, server_default="0")
+
+    __table_args__ = (
+        # sort=trending walks this backwards: highest score first
+        db.Index("ix_trending_posts_score", "score", "post_id"),
+    )
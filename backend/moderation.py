@@ -0,0 +1,132 @@
+# moderation.py
+"""
+Admin bulk moderation: one call acts on every matching post and reply.
+
+    POST /admin/moderation
+    {"action": "hide", "kind": "both", "author_id": 42,
+     "since": "2026-10-18T08:00:00", "until": "2026-10-18T09:30:00"}
+
+Items are selected by `ids` (with kind "post" or "reply"), `author_id` and
+a `since`/`until` range on created_at; the filters combine with AND and at
+least one is required. Actions:
+
+- hide                 stamp deleted_at: gone from every read at once,
+                       physically removed later by the purge (deletion.py),
+                       which runs whether or not SOFT_DELETE is on
+- delete               DELETE the rows now; the foreign keys cascade to
+                       their replies, likes and notifications
+- unpin                clear `pinned` on matching posts
+- purge-notifications  DELETE notifications pointing at matching items
+
+Each action is a few UPDATE/DELETE ... WHERE statements in one transaction,
+and the response holds the number of rows each touched.
+"""
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+from flask import jsonify, request
+from flask_jwt_extended import jwt_required
+from sqlalchemy import delete, select, update
+
+from auth import is_admin
+from extensions import db
+from models import Notification, Post, Reply
+
+ACTIONS = ("hide", "delete", "unpin", "purge-notifications")
+KINDS = {"post": (Post,), "reply": (Reply,), "both": (Reply, Post)}
+MAX_MODERATION_IDS = 5000
+
+
+def _parse_time(value) -> Optional[datetime]:
+    if value in (None, ""):
+        return None
+    parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    if parsed.tzinfo is not None:
+        # stored timestamps are naive UTC
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def _criteria(model, ids, author_id, since, until):
+    clauses = []
+    if ids is not None:
+        clauses.append(model.id.in_(ids))
+    if author_id is not None:
+        clauses.append(model.author_id == author_id)
+    if since is not None:
+        clauses.append(model.created_at >= since)
+    if until is not None:
+        clauses.append(model.created_at < until)
+    return clauses
+
+
+def _execute(stmt) -> int:
+    return db.session.execute(stmt.execution_options(synchronize_session=False)).rowcount
+
+
+def moderate(action: str, kind: str = "both", ids=None, author_id: Optional[int] = None,
+             since: Optional[datetime] = None, until: Optional[datetime] = None) -> Dict[str, int]:
+    """Apply `action` to every matching item in one transaction. Returns rows touched per table."""
+    counts = {}
+    try:
+        for model in KINDS[kind]:
+            where = _criteria(model, ids, author_id, since, until)
+            table = model.__tablename__
+            if action == "hide":
+                counts[table] = _execute(
+                    update(model).where(*where, model.deleted_at.is_(None)).values(deleted_at=datetime.utcnow())
+                )
+            elif action == "delete":
+                counts[table] = _execute(delete(model).where(*where))
+            elif action == "unpin" and model is Post:
+                counts[table] = _execute(update(Post).where(*where, Post.pinned.is_(True)).values(pinned=False))
+            elif action == "purge-notifications":
+                column = Notification.post_id if model is Post else Notification.reply_id
+                counts["notifications"] = counts.get("notifications", 0) + _execute(
+                    delete(Notification).where(column.in_(select(model.id).where(*where)))
+                )
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return counts
+
+
+def init_moderation(app):
+    @app.route("/admin/moderation", methods=["POST"])
+    @jwt_required()
+    def bulk_moderation():
+        if not is_admin():
+            return jsonify({"error": "Only admins can moderate content"}), 403
+
+        data = request.get_json(silent=True) or {}
+        action = data.get("action")
+        kind = data.get("kind") or "both"
+        if action not in ACTIONS:
+            return jsonify({"error": f"action must be one of {', '.join(ACTIONS)}"}), 400
+        if kind not in KINDS:
+            return jsonify({"error": "kind must be post, reply or both"}), 400
+        if action == "unpin" and kind == "reply":
+            return jsonify({"error": "Only posts can be unpinned"}), 400
+
+        ids = data.get("ids")
+        if ids is not None:
+            if kind == "both":
+                return jsonify({"error": "ids need kind post or reply"}), 400
+            if not isinstance(ids, list) or not all(isinstance(i, int) for i in ids):
+                return jsonify({"error": "ids must be a list of integers"}), 400
+            if len(ids) > MAX_MODERATION_IDS:
+                return jsonify({"error": f"At most {MAX_MODERATION_IDS} ids per call"}), 400
+        author_id = data.get("author_id")
+        if author_id is not None and not isinstance(author_id, int):
+            return jsonify({"error": "author_id must be an integer"}), 400
+        try:
+            since = _parse_time(data.get("since"))
+            until = _parse_time(data.get("until"))
+        except ValueError:
+            return jsonify({"error": "since and until must be ISO 8601 timestamps"}), 400
+        if ids is None and author_id is None and since is None and until is None:
+            return jsonify({"error": "Give ids, author_id, since or until"}), 400
+
+        counts = moderate(action, kind, ids, author_id, since, until)
+        return jsonify({"action": action, "affected": counts}), 200
@@ -0,0 +1,213 @@
+# outbound.py
+"""
+Shared HTTP client for calls to external services (Perspective today).
+
+One OutboundClient per service, kept in app.extensions["outbound"]:
+
+- a requests.Session with a keep-alive pool (OUTBOUND_POOL_SIZE connections),
+  so a call reuses a warm TCP+TLS connection instead of handshaking again
+- at most OUTBOUND_MAX_CONCURRENCY calls in flight; a caller waits up to
+  OUTBOUND_QUEUE_TIMEOUT for a slot, then gets OutboundBusy
+- connection errors, 429 and 5xx are retried up to OUTBOUND_RETRIES times
+  with full-jitter exponential backoff, all within one OUTBOUND_TIMEOUT
+  budget; a read timeout is not retried, since it already used the budget.
+  Other 4xx answers come back at once and count as errors.
+- a circuit breaker: after OUTBOUND_BREAKER_THRESHOLD failed calls in a row
+  the service counts as down and calls fail at once with CircuitOpen for
+  OUTBOUND_BREAKER_RESET seconds. Then a single trial call is let through,
+  and its outcome closes the breaker or opens it again.
+
+    response = outbound("perspective").post(url, json=payload, params={"key": key})
+
+Every attempt is counted in the outbound metrics (metrics.py) with outcome
+ok, retry or error, and every call turned away with busy or short_circuit.
+"""
+import random
+import threading
+import time
+from typing import Optional
+
+import requests
+from flask import current_app
+from requests.adapters import HTTPAdapter
+
+from metrics import OUTBOUND_CALLS, record_outbound
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class OutboundError(Exception):
+    """A call that was not attempted because of local policy."""
+
+
+class OutboundBusy(OutboundError):
+    pass
+
+
+class CircuitOpen(OutboundError):
+    pass
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker: closed -> open -> half-open (one trial) -> closed/open."""
+
+    def __init__(self, threshold: int, reset_after: float):
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if time.monotonic() - self.opened_at >= self.reset_after else "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < self.reset_after or self._trial:
+                return False
+            self._trial = True
+            return True
+
+    def release(self):
+        """Give back a trial slot that was never used."""
+        with self._lock:
+            self._trial = False
+
+    def record(self, ok: bool):
+        with self._lock:
+            self._trial = False
+            if ok:
+                self.failures = 0
+                self.opened_at = None
+                return
+            self.failures += 1
+            if self.opened_at is not None or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+
+
+class OutboundClient:
+    def __init__(self, service: str, pool_size: int = 10, max_concurrency: int = 10,
+                 queue_timeout: float = 1.0, timeout: float = 5.0, connect_timeout: float = 2.0, retries: int = 2,
+                 backoff_base: float = 0.1, backoff_max: float = 2.0,
+                 breaker_threshold: int = 5, breaker_reset: float = 30.0):
+        self.service = service
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.queue_timeout = queue_timeout
+        self.breaker = CircuitBreaker(breaker_threshold, breaker_reset)
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self.session = requests.Session()
+        # retries are ours, so the adapter never retries on its own
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _failed(self, started: float):
+        record_outbound(self.service, "error", time.perf_counter() - started)
+        self.breaker.record(ok=False)
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """
+        Send with retries inside one `timeout` budget. Returns the response
+        (a 429/5xx only once retries are exhausted) or raises
+        requests.RequestException / OutboundError.
+        """
+        if not self.breaker.allow():
+            OUTBOUND_CALLS.inc(service=self.service, outcome="short_circuit")
+            raise CircuitOpen(f"{self.service} is unavailable")
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            # not the upstream's fault: leave the breaker as it was
+            self.breaker.release()
+            OUTBOUND_CALLS.inc(service=self.service, outcome="busy")
+            raise OutboundBusy(f"Too many concurrent {self.service} calls")
+
+        deadline = time.monotonic() + self.timeout
+        fixed_timeout = "timeout" in kwargs
+        started = time.perf_counter()
+        settled = False  # every way out records one outcome, which also frees a half-open trial
+        try:
+            for attempt in range(self.retries + 1):
+                if not fixed_timeout:
+                    kwargs["timeout"] = (self.connect_timeout, max(deadline - time.monotonic(), 0.1))
+                started = time.perf_counter()
+                error = response = None
+                try:
+                    response = self.session.request(method, url, **kwargs)
+                except requests.ConnectionError as e:
+                    error = e
+                # anything else (a read timeout, a body cut off mid-way, ...) is final:
+                # the finally below records it as an error
+                else:
+                    if response.status_code < 400:
+                        record_outbound(self.service, "ok", time.perf_counter() - started)
+                        self.breaker.record(ok=True)
+                        settled = True
+                        return response
+                    if response.status_code not in RETRY_STATUSES:
+                        self._failed(started)
+                        settled = True
+                        return response
+
+                delay = self._backoff(attempt)
+                if attempt == self.retries or time.monotonic() + delay >= deadline:
+                    self._failed(started)
+                    settled = True
+                    if error is not None:
+                        raise error
+                    return response
+                record_outbound(self.service, "retry", time.perf_counter() - started)
+                if response is not None:
+                    response.close()
+                time.sleep(delay)
+        finally:
+            if not settled:
+                self._failed(started)
+            self._slots.release()
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+def outbound(service: str) -> OutboundClient:
+    return current_app.extensions["outbound"][service]
+
+
+def make_client(service: str, config) -> OutboundClient:
+    return OutboundClient(
+        service,
+        pool_size=config["OUTBOUND_POOL_SIZE"],
+        max_concurrency=config["OUTBOUND_MAX_CONCURRENCY"],
+        queue_timeout=config["OUTBOUND_QUEUE_TIMEOUT"],
+        timeout=config["OUTBOUND_TIMEOUT"],
+        connect_timeout=config["OUTBOUND_CONNECT_TIMEOUT"],
+        retries=config["OUTBOUND_RETRIES"],
+        breaker_threshold=config["OUTBOUND_BREAKER_THRESHOLD"],
+        breaker_reset=config["OUTBOUND_BREAKER_RESET"],
+    )
+
+
+def init_outbound(app):
+    app.config.setdefault("OUTBOUND_POOL_SIZE", 10)
+    app.config.setdefault("OUTBOUND_MAX_CONCURRENCY", 10)
+    app.config.setdefault("OUTBOUND_QUEUE_TIMEOUT", 1.0)
+    app.config.setdefault("OUTBOUND_TIMEOUT", 5.0)
+    app.config.setdefault("OUTBOUND_CONNECT_TIMEOUT", 2.0)
+    app.config.setdefault("OUTBOUND_RETRIES", 2)
+    app.config.setdefault("OUTBOUND_BREAKER_THRESHOLD", 5)
+    app.config.setdefault("OUTBOUND_BREAKER_RESET", 30.0)
+    app.extensions["outbound"] = {"perspective": make_client("perspective", app.config)}
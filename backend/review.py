@@ -0,0 +1,357 @@
+# review.py
+"""
+Publish-then-moderate: MODERATION_MODE=async.
+
+In the default "sync" mode every post and reply write waits for the
+Perspective check (helpers.check_banned_content). In "async" mode a write
+with text is committed at once with review_status "pending_review". Its
+author sees it straight away, everyone else once it is published. A
+ReviewWorker thread takes pending items, woken by each write and every
+REVIEW_INTERVAL seconds for anything left behind (a restart, a failed
+call), and asks Perspective:
+
+- clean: review_status is cleared and the item is public. The author is
+  notified, and a new post's mention and admin-post notifications go out now.
+- toxic: review_status becomes "flagged" and deleted_at is stamped, which
+  hides it like a moderator's hide. The author is notified.
+- the call failed: the item stays pending. The worker sets it aside for
+  REVIEW_INTERVAL, doubling on each further failure, so newer items are
+  not stuck behind it. While Perspective is down (the circuit breaker in
+  outbound.py is open) the worker only wakes every REVIEW_INTERVAL.
+
+An item deleted while pending (by its author, an admin or a bulk hide) is
+no longer reviewed: it stays deleted and the purge removes it.
+
+A verdict only lands while the text is still the one that was checked, so
+an edit made during a review is reviewed again. Flagged items are kept out
+of the purge until an admin settles them:
+
+    GET  /admin/review-queue?status=flagged&kind=post
+    POST /admin/review-queue/<kind>/<id>    {"decision": "publish" | "remove"}
+"""
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+from flask import current_app, jsonify, request
+from flask_jwt_extended import jwt_required
+from sqlalchemy import or_, select, update
+
+from auth import is_admin
+from deletion import FLAGGED, remove_post, remove_reply
+from extensions import db
+from helpers import analyze_content, create_notification, notify_all_non_admins, notify_tagged_users
+from mentions import find_mentions
+from models import Post, Reply, User
+from outbound import OutboundError, outbound
+
+PENDING = "pending_review"
+KINDS = {"post": Post, "reply": Reply}
+DECISIONS = ("publish", "remove")
+QUEUE_PAGE_SIZE = 50
+
+
+def async_review() -> bool:
+    return current_app.config["MODERATION_MODE"] == "async"
+
+
+def visible_clause(model, viewer_id: Optional[int]):
+    """Published items, plus the viewer's own items still under review."""
+    return or_(model.review_status.is_(None), model.author_id == viewer_id)
+
+
+def visible(item, viewer_id: Optional[int]) -> bool:
+    return item.review_status is None or item.author_id == viewer_id
+
+
+def request_review():
+    """Wake the worker after committing a pending item."""
+    current_app.extensions["review_worker"].wake()
+
+
+def announce_post(post: Post):
+    """Notifications a post sends once it is public: mentions, and admin posts to everyone."""
+    mentions = find_mentions(post.content)
+    if mentions:
+        try:
+            notify_tagged_users(db, post, mentions)
+        except Exception:
+            current_app.logger.exception("Failed to notify tagged users")
+
+    author = db.session.get(User, post.author_id)
+    if author is not None and author.role_lower() == "admin":
+        try:
+            notify_all_non_admins(db, actor_id=post.author_id, action_type="new_post", post=post)
+        except Exception:
+            current_app.logger.exception("Failed to notify all users about admin post")
+
+
+# ---------------------------------------
+# VERDICTS
+# ---------------------------------------
+def _notify_author(item, kind: str, published: bool):
+    post_id = item.id if kind == "post" else item.post_id
+    create_notification(
+        db=db,
+        user_id=item.author_id,
+        actor_id=None,
+        action_type="review_published" if published else "review_flagged",
+        # a hidden post would hide its notification too, so that one links nowhere
+        post_id=post_id if published or kind == "reply" else None,
+        message=f"Your {kind} is now visible to everyone" if published
+        else f"Your {kind} was hidden by moderation",
+    )
+
+
+def reviewable(model):
+    """Flagged items, and pending ones nobody has deleted in the meantime."""
+    return or_(model.review_status == FLAGGED, (model.review_status == PENDING) & model.deleted_at.is_(None))
+
+
+def publish(kind: str, item_id: int, content: Optional[str] = None) -> bool:
+    """
+    Make a live pending or a flagged item public and notify its author. With
+    `content`, only while the item still has that text. Returns whether it changed.
+    """
+    model = KINDS[kind]
+    # deleted_at is only ever set on a reviewable item when flag() hid it
+    stmt = update(model).where(model.id == item_id, reviewable(model))
+    if content is not None:
+        stmt = stmt.where(model.content == content)
+    changed = db.session.execute(
+        stmt.values(review_status=None, deleted_at=None).execution_options(synchronize_session=False)
+    ).rowcount
+    if not changed:
+        db.session.rollback()
+        return False
+    item = db.session.get(model, item_id)
+    db.session.refresh(item)
+    _notify_author(item, kind, published=True)
+    db.session.commit()
+    # a new post announces itself once; edits never did
+    if kind == "post" and item.edited_at is None:
+        announce_post(item)
+    return True
+
+
+def flag(kind: str, item_id: int, content: str) -> bool:
+    """Hide a pending item whose `content` was found toxic, and notify its author."""
+    model = KINDS[kind]
+    changed = db.session.execute(
+        update(model)
+        .where(model.id == item_id, model.review_status == PENDING, model.deleted_at.is_(None),
+               model.content == content)
+        .values(review_status=FLAGGED, deleted_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if not changed:
+        db.session.rollback()
+        return False
+    _notify_author(db.session.get(model, item_id), kind, published=False)
+    db.session.commit()
+    return True
+
+
+class ReviewPass(NamedTuple):
+    verdicts: int                   # items checked and settled
+    failed: List[Tuple[str, int]]   # (kind, id) whose check or verdict failed
+    more: bool                      # a full batch came back: more may be waiting
+    stalled: bool                   # Perspective turned calls away; the pass stopped early
+
+
+def review_pending(api_key: Optional[str], batch_size: int = 20,
+                   deferred: Optional[Set[Tuple[str, int]]] = None) -> ReviewPass:
+    """
+    Check up to `batch_size` pending items of each kind, oldest first,
+    leaving out the `deferred` ones, and apply the verdicts.
+    """
+    verdicts, failed, more = 0, [], False
+    for kind, model in KINDS.items():
+        skip = [item_id for k, item_id in deferred or () if k == kind]
+        stmt = select(model.id, model.content).where(model.review_status == PENDING, model.deleted_at.is_(None))
+        if skip:
+            stmt = stmt.where(model.id.notin_(skip))
+        rows = db.session.execute(stmt.order_by(model.id).limit(batch_size)).all()
+        db.session.rollback()  # no read transaction held across the remote calls
+        more = more or len(rows) >= batch_size
+        for item_id, content in rows:
+            try:
+                toxic = analyze_content(api_key, content)
+            except OutboundError:
+                # breaker open or every slot busy: the rest of the batch would fare no better
+                current_app.logger.warning("Perspective unavailable; review pass stopped")
+                return ReviewPass(verdicts, failed, more, stalled=True)
+            except Exception:
+                current_app.logger.warning("Review of %s %s failed; retrying later", kind, item_id)
+                failed.append((kind, item_id))
+                continue
+            try:
+                if toxic:
+                    flag(kind, item_id, content)
+                else:
+                    publish(kind, item_id, content)
+                verdicts += 1
+            except Exception:
+                db.session.rollback()
+                current_app.logger.exception("Applying the review of %s %s failed", kind, item_id)
+                failed.append((kind, item_id))
+    return ReviewPass(verdicts, failed, more, stalled=False)
+
+
+class ReviewWorker:
+    """
+    Daemon thread draining the pending queue when woken, or every `interval`
+    seconds. Items whose check failed sit out `interval`, doubling per failure.
+    """
+    MAX_BACKOFF_DOUBLINGS = 5
+
+    def __init__(self, app, api_key: Optional[str], interval: float, batch_size: int):
+        self.app = app
+        self.api_key = api_key
+        self.interval = interval
+        self.batch_size = batch_size
+        self._wake = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._retry: Dict[Tuple[str, int], Tuple[int, float]] = {}  # (kind, id) -> (failures, retry at)
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="review-pending", daemon=True)
+                self._thread.start()
+
+    def wake(self):
+        self._wake.set()
+
+    def run_once(self) -> Optional[ReviewPass]:
+        """One pass; None when Perspective is known to be down."""
+        if self.api_key and outbound("perspective").breaker.state == "open":
+            return None
+        now = time.monotonic()
+        deferred = {key for key, (_, retry_at) in self._retry.items() if retry_at > now}
+        result = review_pending(self.api_key, self.batch_size, deferred)
+        # failure counts are kept while an item is set aside or failing again, dropped once it passes
+        retry = {key: value for key, value in self._retry.items() if key in deferred}
+        for key in result.failed:
+            failures = self._retry.get(key, (0, 0.0))[0] + 1
+            retry[key] = (failures, now + self.interval * 2 ** min(failures - 1, self.MAX_BACKOFF_DOUBLINGS))
+        self._retry = retry
+        return result
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            with self.app.app_context():
+                try:
+                    result = self.run_once()
+                    # go again at once only while checks succeed and a full batch says more is waiting
+                    if result is not None and result.verdicts and result.more and not result.stalled:
+                        self._wake.set()
+                except Exception:
+                    self.app.logger.exception("Review pass failed")
+                finally:
+                    db.session.remove()
+
+
+# ---------------------------------------
+# ADMIN QUEUE
+# ---------------------------------------
+def review_queue(status: str, kinds, limit: int = QUEUE_PAGE_SIZE) -> List[Dict]:
+    """Items in `status`, newest first, with their author's name."""
+    items = []
+    for kind in kinds:
+        model = KINDS[kind]
+        rows = db.session.execute(
+            select(model, User.name)
+            .outerjoin(User, User.id == model.author_id)
+            .where(model.review_status == status, reviewable(model))
+            .order_by(model.id.desc())
+            .limit(limit)
+        ).all()
+        for item, author_name in rows:
+            items.append({
+                "kind": kind,
+                "id": item.id,
+                "postId": item.id if kind == "post" else item.post_id,
+                "authorId": item.author_id,
+                "authorName": author_name,
+                "content": item.content,
+                "imageUrl": item.image_url,
+                "gifUrl": item.gif_url,
+                "reviewStatus": item.review_status,
+                "createdAt": item.created_at.replace(tzinfo=timezone.utc).isoformat(),
+            })
+    items.sort(key=lambda i: i["createdAt"], reverse=True)
+    return items[:limit]
+
+
+def init_review(app, api_key: Optional[str]):
+    app.config.setdefault("MODERATION_MODE", "sync")
+    app.config.setdefault("REVIEW_INTERVAL", 30.0)
+    app.config.setdefault("REVIEW_BATCH_SIZE", 20)
+
+    worker = ReviewWorker(app, api_key, app.config["REVIEW_INTERVAL"], app.config["REVIEW_BATCH_SIZE"])
+    app.extensions["review_worker"] = worker
+
+    @app.before_request
+    def _start_review_worker():
+        if app.config["MODERATION_MODE"] == "async":
+            worker.start()
+
+    @app.route("/admin/review-queue", methods=["GET"])
+    @jwt_required()
+    def list_review_queue():
+        if not is_admin():
+            return jsonify({"error": "Only admins can see the review queue"}), 403
+        status = request.args.get("status", FLAGGED)
+        kind = request.args.get("kind", "both")
+        if status not in (FLAGGED, PENDING):
+            return jsonify({"error": f"status must be {FLAGGED} or {PENDING}"}), 400
+        if kind not in ("post", "reply", "both"):
+            return jsonify({"error": "kind must be post, reply or both"}), 400
+        kinds = ("post", "reply") if kind == "both" else (kind,)
+        limit = min(request.args.get("limit", QUEUE_PAGE_SIZE, type=int), 200)
+        return jsonify({"status": status, "items": review_queue(status, kinds, max(limit, 1))}), 200
+
+    @app.route("/admin/review-queue/<kind>/<int:item_id>", methods=["POST"])
+    @jwt_required()
+    def settle_review(kind, item_id):
+        if not is_admin():
+            return jsonify({"error": "Only admins can settle reviews"}), 403
+        if kind not in KINDS:
+            return jsonify({"error": "kind must be post or reply"}), 404
+        decision = (request.get_json(silent=True) or {}).get("decision")
+        if decision not in DECISIONS:
+            return jsonify({"error": "decision must be publish or remove"}), 400
+
+        model = KINDS[kind]
+        if db.session.execute(
+            select(model.id).where(model.id == item_id, reviewable(model))
+        ).first() is None:
+            return jsonify({"error": "No pending or flagged item with that id"}), 404
+
+        if decision == "publish":
+            publish(kind, item_id)
+        else:
+            try:
+                # cleared first so the purge, or the hard delete, takes it
+                db.session.execute(
+                    update(model).where(model.id == item_id).values(review_status=None)
+                    .execution_options(synchronize_session=False)
+                )
+                (remove_post if kind == "post" else remove_reply)(item_id)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+        return jsonify({"kind": kind, "id": item_id, "decision": decision}), 200
+
+    @app.cli.command("review-pending")
+    def review_pending_command():
+        """Run one review pass over pending posts and replies now."""
+        result = review_pending(api_key, app.config["REVIEW_BATCH_SIZE"])
+        stalled = " (Perspective unavailable)" if result.stalled else ""
+        print(f"Reviewed {result.verdicts:,} items, {len(result.failed):,} failed{stalled}.")
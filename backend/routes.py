@@ -1,18 +1,39 @@
 # routes.py
-from sqlalchemy import func
+from sqlalchemy import select
+import math
 from datetime import datetime
 from flask import request, jsonify, current_app
-from flask_jwt_extended import jwt_required, get_jwt_identity, create_access_token
+from flask_jwt_extended import jwt_required
 from models import User, Post, Reply, Poll, PollOption, Vote, Like, Notification
 from helpers import (
     check_banned_content,
-    extract_mentions,
-    notify_tagged_users,
     create_notification,
     notify_all_non_admins
 )
+from serializers import (
+    json_response,
+    users_payload,
+    posts_payload,
+    replies_payload,
+    polls_payload,
+    notifications_payload,
+    feed_page,
+    trending_page,
+    bootstrap_payload,
+)
 
-import cloudinary.uploader
+from search import search_content, search_users_ranked
+from auth import (
+    HasherBusy, LOGIN_ATTEMPTS, current_user, current_user_id, is_admin, issue_token,
+    password_hasher, throttle_login,
+)
+from likes import MAX_STATE_IDS as MAX_LIKE_STATE_IDS, like_state, set_like, toggle_like
+from deletion import live_post, live_reply, remove_post, remove_reply
+from uploads import UPLOAD_TYPES, InvalidUpload, asset_url
+from storage import FileTooLarge, StorageError
+from media import store_media
+from variants import prerender_url
+from review import PENDING, announce_post, async_review, request_review, visible
 
 MAX_CONTENT_LENGTH = 2000
 
@@ -27,23 +48,79 @@ def register_routes(app, db, PERSPECTIVE_API_KEY):
             db.session.rollback()
             raise
 
+    def uploaded_media(kind, folder=None):
+        """
+        (url, error_response) for the request's image/gif: a verified
+        `<kind>_ref` from a direct upload, else a legacy multipart file
+        stored (or deduplicated) through this worker. (None, None) when neither was sent.
+        """
+        ref = request.form.get(f"{kind}_ref")
+        if ref:
+            try:
+                url = asset_url(ref, kind, current_user_id())
+            except InvalidUpload as e:
+                return None, (jsonify({"error": str(e)}), 400)
+            prerender_url(url)
+            return url, None
+        file = request.files.get(kind)
+        if not file:
+            return None, None
+        if not current_app.config["LEGACY_UPLOADS"]:
+            return None, (jsonify({"error": "Upload the file directly (POST /uploads/sign) and send its reference"}), 400)
+        try:
+            stored = store_media(file, folder=folder, content_type=file.mimetype,
+                                 max_bytes=current_app.config["UPLOAD_MAX_BYTES"], accept=UPLOAD_TYPES[kind])
+            prerender_url(stored.url)
+            return stored.url, None
+        except StorageError as e:
+            return None, (jsonify({"error": str(e)}), 413 if isinstance(e, FileTooLarge) else 400)
+        except Exception:
+            current_app.logger.exception("Storing upload failed")
+            return None, (jsonify({"error": f"Failed to upload {kind}"}), 500)
+
     # -----------------------
     # Authentication
     # -----------------------
     @app.route('/login', methods=['POST'])
     def login():
         data = request.get_json() or {}
-        print("Received JSON:", data)
         login_id = data.get("login_id")
         password = data.get("password")
         if not login_id or not password:
             return jsonify({"error": "login_id and password are required"}), 400
 
+        wait = throttle_login(login_id, request.remote_addr)
+        if wait:
+            LOGIN_ATTEMPTS.inc(outcome="throttled")
+            response = jsonify({"error": "Too many login attempts, try again later"})
+            response.headers["Retry-After"] = str(math.ceil(wait))
+            return response, 429
+
         user = User.query.filter_by(login_id=login_id).first()
-        if not user or not user.check_password(password):
+        hasher = password_hasher()
+        try:
+            ok, needs_rehash = hasher.verify_off_thread(user.password if user else None, password)
+        except HasherBusy:
+            LOGIN_ATTEMPTS.inc(outcome="busy")
+            response = jsonify({"error": "Login is busy, try again shortly"})
+            response.headers["Retry-After"] = "1"
+            return response, 503
+        if not user or not user.is_active or not ok:
+            LOGIN_ATTEMPTS.inc(outcome="failed")
             return jsonify({"error": "Invalid credentials"}), 401
 
-        access_token = create_access_token(identity=str(user.id))
+        if needs_rehash:
+            try:
+                user.password = hasher.hash_off_thread(password)
+                commit_or_rollback()
+            except HasherBusy:
+                pass  # the pool is saturated; the upgrade is retried next time
+            except Exception:
+                # the login itself succeeded; the upgrade is retried next time
+                current_app.logger.exception("Failed to rehash password for user %s", user.id)
+        LOGIN_ATTEMPTS.inc(outcome="success")
+
+        access_token = issue_token(user)
         return jsonify({"message": "Login successful", "token": access_token, "user": user.to_json()}), 200
 
     # -----------------------
@@ -52,8 +129,7 @@ def register_routes(app, db, PERSPECTIVE_API_KEY):
     @app.route('/users', methods=['GET'])
     @jwt_required()
     def list_users():
-        users = User.query.order_by(User.name.asc()).all()
-        return jsonify([u.to_json() for u in users]), 200
+        return json_response(users_payload())
 
     @app.route('/users/<int:user_id>', methods=['GET'])
     @jwt_required()
@@ -70,34 +146,53 @@ def register_routes(app, db, PERSPECTIVE_API_KEY):
         if not q:
             return jsonify([]), 200
 
-        q_lower = q.lower()
-        matches = User.query.filter(
-            (func.lower(User.login_id).like(f"{q_lower}%")) |
-            (func.lower(User.name).like(f"%{q_lower}%"))
-        ).order_by(User.name).limit(25).all()
-
-        results = [
-            {
-                "id": u.id,
-                "loginId": u.login_id,
-                "name": u.name,
-                "email": u.email,
-                "avatarUrl": getattr(u, "avatar_url", None),
-                "department": getattr(u, "department", None),
-                "position": getattr(u, "position", None),
-            } for u in matches
-        ]
-        return jsonify(results), 200
+        results = search_users_ranked(
+            db.session, q,
+            use_memory_index=current_app.config.get("USER_SEARCH_MEMORY_INDEX", True),
+        )
+        return json_response(results)
 
     @app.route("/users/me", methods=["GET"])
     @jwt_required()
     def get_current_user():
-        user_id = int(get_jwt_identity())
-        user = User.query.get(user_id)
+        user = current_user()
         if not user:
             return jsonify({"error": "User not found"}), 404
         return jsonify(user.to_json()), 200
 
+    # -----------------------
+    # Bootstrap
+    # -----------------------
+    @app.route("/bootstrap", methods=["GET"])
+    @jwt_required()
+    def bootstrap():
+        """The home page's user, polls and first feed page in one round trip."""
+        feed_limit = min(request.args.get("feed_limit", 20, type=int), 100)
+        payload = bootstrap_payload(current_user_id(), request.args.get("since"), feed_limit)
+        if payload is None:
+            return jsonify({"error": "User not found"}), 404
+        return json_response(payload)
+
+    # -----------------------
+    # Search
+    # -----------------------
+    @app.route("/search", methods=["GET"])
+    @jwt_required()
+    def search():
+        q = (request.args.get("q") or "").strip()
+        kinds = {"all": ("post", "reply"), "posts": ("post",), "replies": ("reply",)}.get(
+            request.args.get("type", "all")
+        )
+        if kinds is None:
+            return jsonify({"error": "type must be one of all, posts, replies"}), 400
+        try:
+            limit = int(request.args.get("limit", 20))
+            payload = search_content(db.session, q, kinds, limit, request.args.get("cursor"),
+                                     viewer_id=current_user_id())
+        except ValueError:
+            return jsonify({"error": "Invalid limit or cursor"}), 400
+        return json_response(payload)
+
     # -----------------------
     # Posts
     # -----------------------
@@ -105,51 +200,45 @@ def register_routes(app, db, PERSPECTIVE_API_KEY):
     @jwt_required()
     def upload_image():
 
-        file = request.files.get("image")
-        if not file:
-
+        url, error = uploaded_media("image")
+        if error:
+            return error
+        if not url:
             return jsonify({"error": "No file provided"}), 400
-
-        try:
-            result = cloudinary.uploader.upload(file)
-            return jsonify({"url": result["secure_url"]})
-        except Exception as e:
-            return jsonify({"error": str(e)}), 500
+        return jsonify({"url": url})
 
 
     @app.route("/posts", methods=["GET"])
     @jwt_required()
     def get_posts():
-        logged_in_user_id = int(get_jwt_identity())
-        posts = Post.query.order_by(Post.pinned.desc(), Post.created_at.desc()).all()
-        results = []
-        for p in posts:
-            reply_count = db.session.query(func.count(Reply.id)).filter(Reply.post_id == p.id).scalar()
-            results.append({
-                **p.to_json(),
-                "user": p.author.to_json() if p.author else None,
-                "likeCount": Like.query.filter_by(post_id=p.id).count(),
-                "userLiked": Like.query.filter_by(post_id=p.id, user_id=logged_in_user_id).first() is not None,
-                "replyCount": reply_count,
-                "image_url": p.image_url,
-                "gif_url": p.gif_url,
-            })
-        return jsonify(results), 200
+        logged_in_user_id = current_user_id()
+        sort = request.args.get("sort", "latest")
+        if sort not in ("latest", "trending"):
+            return jsonify({"error": "sort must be latest or trending"}), 400
+        if sort == "latest" and "limit" not in request.args and "cursor" not in request.args:
+            return json_response(posts_payload(logged_in_user_id))
+
+        # paged mode: {"posts": [...], "nextCursor": ...}; trending is always paged
+        limit = min(request.args.get("limit", 20, type=int), 100)
+        page = trending_page if sort == "trending" else feed_page
+        try:
+            return json_response(page(logged_in_user_id, limit, request.args.get("cursor")))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
 
     @app.route("/posts/<int:post_id>", methods=["GET"])
     @jwt_required()
     def get_post(post_id):
-        logged_in_user_id = int(get_jwt_identity())
-        post = Post.query.get(post_id)
-        if not post:
+        logged_in_user_id = current_user_id()
+        post = live_post(post_id)
+        if not post or not visible(post, logged_in_user_id):
             return jsonify({"error": "Post not found"}), 404
-        reply_count = db.session.query(func.count(Reply.id)).filter(Reply.post_id == post.id).scalar()
         return jsonify({
             **post.to_json(),
             "user": post.author.to_json() if post.author else None,
-            "likeCount": Like.query.filter_by(post_id=post.id).count(),
+            "likeCount": post.like_count,
             "userLiked": Like.query.filter_by(post_id=post.id, user_id=logged_in_user_id).first() is not None,
-            "replyCount": reply_count,
+            "replyCount": post.reply_count,
             "image_url": post.image_url,
             "gif_url": post.gif_url,
 
@@ -158,42 +247,28 @@ def register_routes(app, db, PERSPECTIVE_API_KEY):
     @app.route("/posts", methods=["POST"])
     @jwt_required()
     def create_post():
-        logged_in_user_id = int(get_jwt_identity())
-        user = User.query.get(logged_in_user_id)
-        if not user:
-            return jsonify({"error": "User not found"}), 404
+        logged_in_user_id = current_user_id()
+        admin = is_admin()
 
         content = request.form.get("content", "").strip()
-        image_file = request.files.get("image")
-        gif_file = request.files.get("gif")
-        pinned = bool(request.form.get("pinned", False)) if user.role_lower() == "admin" else False
-        image_url = None
-        gif_url = None
-        
+        pinned = bool(request.form.get("pinned", False)) if admin else False
 
-        # Cloudinary uploads
-        if image_file:
-            try:
-                upload_result = cloudinary.uploader.upload(image_file)
-                image_url = upload_result.get("secure_url")
-                image_public_id = upload_result.get("public_id")
-            except Exception:
-                return jsonify({"error": "Failed to upload image"}), 500
-
-        if gif_file:
-            try:
-                upload_result = cloudinary.uploader.upload(gif_file)
-                gif_url = upload_result.get("secure_url")
-                gif_public_id = upload_result.get("public_id")
-            except Exception:
-                return jsonify({"error": "Failed to upload gif"}), 500
+        # direct-upload references, or legacy Cloudinary uploads
+        image_url, error = uploaded_media("image")
+        if error:
+            return error
+        gif_url, error = uploaded_media("gif")
+        if error:
+            return error
 
         if not content and not image_url and not gif_url:
             return jsonify({"error": "Content, image, or gif required"}), 400
         if content and len(content) > MAX_CONTENT_LENGTH:
             return jsonify({"error": f"Content too long (max {MAX_CONTENT_LENGTH})"}), 400
 
-        if content:
+        # async mode: published now for the author, checked by the review worker
+        pending = bool(content) and async_review()
+        if content and not pending:
             try:
                 if check_banned_content(PERSPECTIVE_API_KEY, content):
                     return jsonify({"error": "Your content contains unsafe or toxic language."}), 403
@@ -204,38 +279,30 @@ def register_routes(app, db, PERSPECTIVE_API_KEY):
        
 
         post = Post(
-            author_id=user.id,
+            author_id=logged_in_user_id,
             content=content,
             image_url=image_url,
             gif_url=gif_url,
             pinned=pinned,
-            edited_at=None
+            edited_at=None,
+            review_status=PENDING if pending else None,
         )
         db.session.add(post)
         commit_or_rollback()
 
-        mentions = extract_mentions(content) if content else []
-        if mentions:
-            try:
-                notify_tagged_users(db, post, mentions)
-            except Exception:
-                current_app.logger.exception("Failed to notify tagged users")
-
-        # Optional: notify all users if admin
-        if user.role_lower() == "admin":
-            try:
-                notify_all_non_admins(db, actor_id=user.id, action_type="new_post", post=post)
-            except Exception:
-                current_app.logger.exception("Failed to notify all users about admin post")
+        # mentions, and admin posts to everyone; deferred to publication when pending
+        if pending:
+            request_review()
+        else:
+            announce_post(post)
 
         return jsonify(post.to_json()), 201
 
     @app.route("/posts/<int:post_id>", methods=["PUT"])
     @jwt_required()
     def edit_post(post_id):
-        logged_in_user_id = int(get_jwt_identity())
-        user = User.query.get(logged_in_user_id)
-        post = Post.query.get(post_id)
+        logged_in_user_id = current_user_id()
+        post = live_post(post_id)
         if not post:
             return jsonify({"error": "Post not found"}), 404
         if int(post.author_id) != logged_in_user_id:
@@ -243,7 +310,6 @@ def register_routes(app, db, PERSPECTIVE_API_KEY):
             return jsonify({"error": "Only the post author can edit this post"}), 403
 
         new_content = (request.form.get("content") or "").strip()
-        image_file = request.files.get("image")
         gif_from_form = request.form.get("gif", None)       # string url or "" or None
         delete_image_flag = (request.form.get("delete_image") or "").lower() in ("1", "true", "yes")
         delete_gif_flag = (request.form.get("delete_gif") or "").lower() in ("1", "true", "yes")
@@ -252,14 +318,13 @@ def register_routes(app, db, PERSPECTIVE_API_KEY):
         image_url = post.image_url
         gif_url = post.gif_url
 
-        # If a new image file is uploaded -> upload and set image_url, clear gif_url
-        if image_file:
-            try:
-                upload_result = cloudinary.uploader.upload(image_file, folder="posts")
-                image_url = upload_result.get("secure_url")
-                gif_url = None
-            except Exception:
-                return jsonify({"error": "Failed to upload image"}), 500
+        # If a new image is uploaded -> set image_url, clear gif_url
+        new_image_url, error = uploaded_media("image", folder="posts")
+        if error:
+            return error
+        if new_image_url:
+            image_url = new_image_url
+            gif_url = None
         else:
             # if frontend signalled delete_image -> clear image
             if delete_image_flag:
@@ -284,7 +349,8 @@ def register_routes(app, db, PERSPECTIVE_API_KEY):
         if new_content and len(new_content) > MAX_CONTENT_LENGTH:
             return jsonify({"error": f"Content too long (max {MAX_CONTENT_LENGTH})"}), 400
 
-        if new_content:
+        pending = bool(new_content) and new_content != post.content and async_review()
+        if new_content and not pending:
             try:
                 if check_banned_content(PERSPECTIVE_API_KEY, new_content):
                     return jsonify({"error": "Your content contains unsafe or toxic language."}), 403
@@ -296,7 +362,11 @@ def register_routes(app, db, PERSPECTIVE_API_KEY):
         post.image_url = image_url
         post.gif_url = gif_url
         post.edited_at = datetime.utcnow()
+        if pending:
+            post.review_status = PENDING
         commit_or_rollback()
+        if pending:
+            request_review()
 
         # include image/gif in response so frontend can refresh
         response = { **post.to_json(), "image_url": post.image_url, "gif_url": post.gif_url }
@@ -306,49 +376,48 @@ def register_routes(app, db, PERSPECTIVE_API_KEY):
     @app.route("/posts/<int:post_id>", methods=["DELETE"])
     @jwt_required()
     def delete_post(post_id):
-        logged_in_user_id = int(get_jwt_identity())
-        user = User.query.get(logged_in_user_id)
-        post = Post.query.get(post_id)
+        logged_in_user_id = current_user_id()
+        post = live_post(post_id)
         if not post:
             return jsonify({"error": "Post not found"}), 404
-        if post.author_id != logged_in_user_id and (user.role_lower() != "admin"):
+        if post.author_id != logged_in_user_id and not is_admin():
             return jsonify({"error": "Only the post author or admin can delete this post"}), 403
 
-        db.session.delete(post)
+        remove_post(post.id)
         commit_or_rollback()
         return jsonify({"message": "Post deleted"}), 200
 
     @app.route("/posts/<int:post_id>/like", methods=["POST"])
     @jwt_required()
     def toggle_post_like(post_id):
-        logged_in_user_id = int(get_jwt_identity())
-        user = User.query.get(logged_in_user_id)
-        post = Post.query.get(post_id)
-        if not user or not post:
-            return jsonify({"error": "Post or user not found"}), 404
+        logged_in_user_id = current_user_id()
+        result = toggle_like(logged_in_user_id, "post", post_id)
+        if result is None:
+            return jsonify({"error": "Post not found"}), 404
 
-        existing_like = Like.query.filter_by(user_id=user.id, post_id=post.id).first()
-        if existing_like:
-            db.session.delete(existing_like)
-            message = "Like removed"
-        else:
-            like = Like(user_id=user.id, post_id=post.id)
-            db.session.add(like)
-            message = "Post liked"
-        commit_or_rollback()
+        liked, like_count = result
+        message = "Post liked" if liked else "Like removed"
+        return jsonify({"message": message, "liked": liked, "likeCount": like_count}), 200
+
+    @app.route("/posts/<int:post_id>/like", methods=["PUT", "DELETE"])
+    @jwt_required()
+    def set_post_like(post_id):
+        logged_in_user_id = current_user_id()
+        liked = request.method == "PUT"
+        result = set_like(logged_in_user_id, "post", post_id, liked)
+        if result is None:
+            return jsonify({"error": "Post not found"}), 404
 
-        like_count = Like.query.filter_by(post_id=post.id).count()
-        return jsonify({"message": message, "likeCount": like_count}), 200
+        changed, like_count = result
+        return jsonify({"liked": liked, "changed": changed, "likeCount": like_count}), 200
 
 
     @app.route("/posts/<int:post_id>/toggle-pin", methods=["POST"])
     @jwt_required()
     def toggle_pin(post_id):
-        logged_in_user_id = int(get_jwt_identity())
-        user = User.query.get(logged_in_user_id)
-        if not user or user.role_lower() != "admin":
+        if not is_admin():
             return jsonify({"error": "Only admin can pin/unpin posts"}), 403
-        post = Post.query.get(post_id)
+        post = live_post(post_id)
         if not post:
             return jsonify({"error": "Post not found"}), 404
         post.pinned = not post.pinned
@@ -362,62 +431,47 @@ def register_routes(app, db, PERSPECTIVE_API_KEY):
     @app.route("/posts/<int:post_id>/replies", methods=["GET"])
     @jwt_required()
     def get_post_replies(post_id):
-        logged_in_user_id = int(get_jwt_identity())
-        post = Post.query.get(post_id)
-        if not post:
+        logged_in_user_id = current_user_id()
+        total = db.session.execute(
+            select(Post.reply_count).where(Post.id == post_id, Post.deleted_at.is_(None))
+        ).scalar()
+        if total is None:
             return jsonify({"error": "Post not found"}), 404
 
-        page = int(request.args.get("page", 1))
-        per_page = int(request.args.get("per_page", 20))
-        replies = Reply.query.filter_by(post_id=post.id).order_by(Reply.created_at.asc()).paginate(
-            page=page, per_page=per_page, error_out=False
-        )
-
-        results = [r.to_json(logged_in_user_id) for r in replies.items]
-        return jsonify({
-           "postId": post.id,
-           "totalReplies": replies.total,
-           "page": page,
-           "perPage": per_page,
-           "replies": results
-        }), 200
+        page = request.args.get("page", type=int)
+        per_page = min(request.args.get("per_page", 20, type=int), 100)
+        try:
+            payload = replies_payload(post_id, logged_in_user_id, per_page, total,
+                                      cursor=request.args.get("cursor"), page=page)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        return json_response(payload)
 
         
     @app.route("/replies", methods=["POST"])
     @jwt_required()
     def create_reply():
-        logged_in_user_id = int(get_jwt_identity())
-        user = User.query.get(logged_in_user_id)
+        user = current_user()
         post_id = request.form.get("post_id")
-        post = Post.query.get(post_id)
+        post = live_post(post_id)
         if not user or not post:
             return jsonify({"error": "User or Post not found"}), 404
 
         content = (request.form.get("content") or "").strip()
-        image_file = request.files.get("image")
-        gif_file = request.files.get("gif")
         delete_image_flag = (request.form.get("delete_image") or "").lower() in ("1","true","yes")
         delete_gif_flag = (request.form.get("delete_gif") or "").lower() in ("1","true","yes")
         gif_from_form = request.form.get("gif", None)  # string URL
-        image_url = None
-        gif_url = None
 
-        # Cloudinary uploads
-        if image_file:
-            try:
-                upload_result = cloudinary.uploader.upload(image_file)
-                image_url = upload_result.get("secure_url")
-            except Exception:
-                return jsonify({"error": "Failed to upload image"}), 500
+        # direct-upload references, or legacy Cloudinary uploads
+        image_url, error = uploaded_media("image")
+        if error:
+            return error
 
          # Handle GIF
-        if gif_file:
-            try:
-                upload_result = cloudinary.uploader.upload(gif_file)
-                gif_url = upload_result.get("secure_url")
-            except Exception:
-                return jsonify({"error": "Failed to upload gif"}), 500
-        elif gif_from_form:
+        gif_url, error = uploaded_media("gif")
+        if error:
+            return error
+        if not gif_url and gif_from_form:
             gif_url = gif_from_form
 
         # Apply explicit deletes
@@ -431,7 +485,8 @@ def register_routes(app, db, PERSPECTIVE_API_KEY):
         if content and len(content) > MAX_CONTENT_LENGTH:
             return jsonify({"error": f"Content too long (max {MAX_CONTENT_LENGTH})"}), 400
 
-        if content:
+        pending = bool(content) and async_review()
+        if content and not pending:
             try:
                if check_banned_content(PERSPECTIVE_API_KEY, content):
                     return jsonify({"error": "Your content contains unsafe or toxic language."}), 403
@@ -445,10 +500,13 @@ def register_routes(app, db, PERSPECTIVE_API_KEY):
             content=content,
             image_url=image_url,
             gif_url=gif_url,
-            edited_at=None
+            edited_at=None,
+            review_status=PENDING if pending else None,
         )
         db.session.add(reply)
         commit_or_rollback()
+        if pending:
+            request_review()
          # Ensure author info is attached for frontend
         reply_json = reply.to_json()
         reply_json["user"] = {
@@ -465,41 +523,36 @@ def register_routes(app, db, PERSPECTIVE_API_KEY):
     @app.route("/replies/<int:reply_id>", methods=["PUT"])
     @jwt_required()
     def edit_reply(reply_id):
-        logged_in_user_id = int(get_jwt_identity())
-        user = User.query.get(logged_in_user_id)
-        reply = Reply.query.get(reply_id)
+        logged_in_user_id = current_user_id()
+        reply = live_reply(reply_id)
         if not reply:
             return jsonify({"error": "Reply not found"}), 404
         if reply.author_id != logged_in_user_id:
             return jsonify({"error": "Only the reply author can edit this reply"}), 403
 
         new_content = (request.form.get("content") or "").strip()
-        image_file = request.files.get("image")
-        gif_file = request.files.get("gif")
         gif_from_form = request.form.get("gif", None)
         delete_image_flag = (request.form.get("delete_image") or "").lower() in ("1","true","yes")
         delete_gif_flag = (request.form.get("delete_gif") or "").lower() in ("1","true","yes")
         image_url = reply.image_url
         gif_url = reply.gif_url
 
-        # Upload files if present
-        if image_file:
-            try:
-               upload_result = cloudinary.uploader.upload(image_file)
-               image_url = upload_result.get("secure_url")
-               gif_url = None  # prefer image
-            except Exception:
-               return jsonify({"error": "Failed to upload image"}), 500
+        # Uploaded media if present
+        new_image_url, error = uploaded_media("image")
+        if error:
+            return error
+        if new_image_url:
+            image_url = new_image_url
+            gif_url = None  # prefer image
         elif delete_image_flag:
             image_url = None
 
-        if gif_file:
-            try:
-               upload_result = cloudinary.uploader.upload(gif_file)
-               gif_url = upload_result.get("secure_url")
-               image_url = None
-            except Exception:
-               return jsonify({"error": "Failed to upload gif"}), 500
+        new_gif_url, error = uploaded_media("gif")
+        if error:
+            return error
+        if new_gif_url:
+            gif_url = new_gif_url
+            image_url = None
         elif gif_from_form is not None:
             gif_from_form = gif_from_form.strip()
             if gif_from_form:
@@ -516,7 +569,8 @@ def register_routes(app, db, PERSPECTIVE_API_KEY):
         if new_content and len(new_content) > MAX_CONTENT_LENGTH:
             return jsonify({"error": f"Content too long (max {MAX_CONTENT_LENGTH})"}), 400
 
-        if new_content:
+        pending = bool(new_content) and new_content != reply.content and async_review()
+        if new_content and not pending:
             try:
                 
                 if check_banned_content(PERSPECTIVE_API_KEY, new_content):
@@ -529,48 +583,68 @@ def register_routes(app, db, PERSPECTIVE_API_KEY):
         reply.image_url = image_url 
         reply.gif_url = gif_url 
         reply.edited_at = datetime.utcnow()
+        if pending:
+            reply.review_status = PENDING
         commit_or_rollback()
+        if pending:
+            request_review()
        
         return jsonify(reply.to_json()), 200
 
     @app.route("/replies/<int:reply_id>", methods=["DELETE"])
     @jwt_required()
     def delete_reply(reply_id):
-        logged_in_user_id = int(get_jwt_identity())
-        user = User.query.get(logged_in_user_id)
-        reply = Reply.query.get(reply_id)
+        logged_in_user_id = current_user_id()
+        reply = live_reply(reply_id)
 
         if not reply:
             return jsonify({"error": "Reply not found"}), 404
 
-        if reply.author_id != logged_in_user_id and (user.role_lower() != "admin"):
+        if reply.author_id != logged_in_user_id and not is_admin():
             return jsonify({"error": "Only the reply author or admin can delete this reply"}), 403
 
-        db.session.delete(reply)
+        remove_reply(reply.id)
         commit_or_rollback()
         return jsonify({"message": "Reply deleted"}), 200
 
     @app.route("/replies/<int:reply_id>/like", methods=["POST"])
     @jwt_required()
     def toggle_reply_like(reply_id):
-        logged_in_user_id = int(get_jwt_identity())
-        user = User.query.get(logged_in_user_id)
-        reply = Reply.query.get(reply_id)
-        if not user or not reply:
-            return jsonify({"error": "Reply or user not found"}), 404
-
-        existing_like = Like.query.filter_by(user_id=user.id, reply_id=reply.id).first()
-        if existing_like:
-            db.session.delete(existing_like)
-            message = "Like removed"
-        else:
-            like = Like(user_id=user.id, reply_id=reply.id)
-            db.session.add(like)
-            message = "Reply liked"
-        commit_or_rollback()
+        logged_in_user_id = current_user_id()
+        result = toggle_like(logged_in_user_id, "reply", reply_id)
+        if result is None:
+            return jsonify({"error": "Reply not found"}), 404
 
-        like_count = Like.query.filter_by(reply_id=reply.id).count()
-        return jsonify({"message": message, "likeCount": like_count}), 200
+        liked, like_count = result
+        message = "Reply liked" if liked else "Like removed"
+        return jsonify({"message": message, "liked": liked, "likeCount": like_count}), 200
+
+    @app.route("/replies/<int:reply_id>/like", methods=["PUT", "DELETE"])
+    @jwt_required()
+    def set_reply_like(reply_id):
+        logged_in_user_id = current_user_id()
+        liked = request.method == "PUT"
+        result = set_like(logged_in_user_id, "reply", reply_id, liked)
+        if result is None:
+            return jsonify({"error": "Reply not found"}), 404
+
+        changed, like_count = result
+        return jsonify({"liked": liked, "changed": changed, "likeCount": like_count}), 200
+
+    @app.route("/likes/state", methods=["POST"])
+    @jwt_required()
+    def get_like_state():
+        logged_in_user_id = current_user_id()
+        data = request.get_json(silent=True) or {}
+        try:
+            post_ids = [int(i) for i in data.get("postIds") or []]
+            reply_ids = [int(i) for i in data.get("replyIds") or []]
+        except (TypeError, ValueError):
+            return jsonify({"error": "postIds and replyIds must be lists of ids"}), 400
+        if len(post_ids) + len(reply_ids) > MAX_LIKE_STATE_IDS:
+            return jsonify({"error": f"At most {MAX_LIKE_STATE_IDS} ids per request"}), 400
+
+        return json_response(like_state(logged_in_user_id, post_ids, reply_ids))
 
     # -----------------------
     # Polls
@@ -578,9 +652,8 @@ def register_routes(app, db, PERSPECTIVE_API_KEY):
     @app.route("/polls", methods=["GET"])
     @jwt_required()
     def get_all_polls():
-        polls = Poll.query.order_by(Poll.created_at.desc()).all()
-        polls_data = [p.to_json(include_votes=True) for p in polls]
-        return jsonify(polls_data), 200
+        logged_in_user_id = current_user_id()
+        return json_response(polls_payload(logged_in_user_id))
 
     @app.route("/polls/active", methods=["GET"])
     @jwt_required()
@@ -588,17 +661,15 @@ def register_routes(app, db, PERSPECTIVE_API_KEY):
         poll = Poll.query.filter_by(is_active=True).order_by(Poll.created_at.desc()).first()
         if not poll:
             return jsonify(None), 200
-        user_id = get_jwt_identity()
-        poll_data = poll.to_json(include_votes=True)
+        poll_data = poll.to_json(include_votes=True, user_id=current_user_id())
        
         return jsonify(poll_data), 200
 
     @app.route("/polls", methods=["POST"])
     @jwt_required()
     def create_poll():
-        logged_in_user_id = int(get_jwt_identity())
-        user = User.query.get(logged_in_user_id)
-        if not user or user.role_lower() != "admin":
+        logged_in_user_id = current_user_id()
+        if not is_admin():
             return jsonify({"error": "Only admins can create polls"}), 403
 
         data = request.get_json() or {}
@@ -615,15 +686,14 @@ def register_routes(app, db, PERSPECTIVE_API_KEY):
         except Exception:
             return jsonify({"error": "Invalid end date format"}), 400
 
-        poll = Poll(title=title, description=description, created_by_id=user.id, end_at=end_at)
+        poll = Poll(title=title, description=description, created_by_id=logged_in_user_id, end_at=end_at)
        
         db.session.add(poll)
         commit_or_rollback()
-        if user.role_lower() == "admin":
-            try:
-                notify_all_non_admins(db, actor_id=user.id, action_type="new_poll", poll=poll)
-            except Exception:
-                current_app.logger.exception("Failed to notify users about new poll")
+        try:
+            notify_all_non_admins(db, actor_id=logged_in_user_id, action_type="new_poll", poll=poll)
+        except Exception:
+            current_app.logger.exception("Failed to notify users about new poll")
 
         for opt_text in options:
             opt_text = opt_text.strip()
@@ -631,7 +701,7 @@ def register_routes(app, db, PERSPECTIVE_API_KEY):
                 db.session.add(PollOption(poll_id=poll.id, text=opt_text))
         commit_or_rollback()
 
-        poll_data = poll.to_json(include_votes=True)
+        poll_data = poll.to_json(include_votes=True, user_id=current_user_id())
        
 
         return jsonify(poll_data), 201
@@ -642,16 +712,14 @@ def register_routes(app, db, PERSPECTIVE_API_KEY):
         poll = Poll.query.get(poll_id)
         if not poll:
             return jsonify({"error": "Poll not found"}), 404
-        poll_data = poll.to_json(include_votes=True)
+        poll_data = poll.to_json(include_votes=True, user_id=current_user_id())
        
         return jsonify(poll_data), 200
 
     @app.route("/polls/<int:poll_id>", methods=["DELETE"])
     @jwt_required()
     def delete_poll(poll_id):
-        logged_in_user_id = int(get_jwt_identity())
-        user = User.query.get(logged_in_user_id)
-        if not user or user.role_lower() != "admin":
+        if not is_admin():
             return jsonify({"error": "Only admins can delete polls"}), 403
 
         poll = Poll.query.get(poll_id)
@@ -665,10 +733,7 @@ def register_routes(app, db, PERSPECTIVE_API_KEY):
     @app.route("/polls/<int:poll_id>/vote", methods=["POST"])
     @jwt_required()
     def vote_poll(poll_id):
-        logged_in_user_id = int(get_jwt_identity())
-        user = User.query.get(logged_in_user_id)
-        if not user:
-            return jsonify({"error": "User not found"}), 404
+        logged_in_user_id = current_user_id()
 
         poll = Poll.query.get(poll_id)
         if not poll or poll.has_expired():
@@ -687,29 +752,26 @@ def register_routes(app, db, PERSPECTIVE_API_KEY):
 
         existing_vote = (
         Vote.query.join(PollOption, Vote.poll_option_id == PollOption.id)
-        .filter(Vote.user_id == user.id, PollOption.poll_id == poll.id)
+        .filter(Vote.user_id == logged_in_user_id, PollOption.poll_id == poll.id)
         .first()
         )
 
         if existing_vote:
             existing_vote.poll_option_id = option.id
         else:
-            new_vote = Vote(user_id=user.id, poll_option_id=option.id)
+            new_vote = Vote(user_id=logged_in_user_id, poll_option_id=option.id)
             db.session.add(new_vote)
         commit_or_rollback()
 
         poll = Poll.query.get(poll_id)
-        poll_data = poll.to_json(include_votes=True)
+        poll_data = poll.to_json(include_votes=True, user_id=current_user_id())
         return jsonify(poll_data), 200
     
     @app.route("/polls/<int:poll_id>", methods=["PUT"])
     @jwt_required()
     def edit_poll(poll_id):
 
-        logged_in_user_id = int(get_jwt_identity())
-        user = User.query.get(logged_in_user_id)
-
-        if not user or user.role_lower() != "admin":
+        if not is_admin():
             return jsonify({"error": "Only admins can edit polls"}), 403
 
         poll = Poll.query.get(poll_id)
@@ -736,7 +798,7 @@ def register_routes(app, db, PERSPECTIVE_API_KEY):
 
         commit_or_rollback()
 
-        poll_data = poll.to_json(include_votes=True)  # keep votes intact
+        poll_data = poll.to_json(include_votes=True, user_id=current_user_id())  # keep votes intact
         return jsonify(poll_data), 200
 
     # -----------------------
@@ -745,58 +807,13 @@ def register_routes(app, db, PERSPECTIVE_API_KEY):
     @app.route("/notifications", methods=["GET"])
     @jwt_required()
     def get_notifications():
-        logged_in_user_id = int(get_jwt_identity())
-        notifs = Notification.query.filter_by(user_id=logged_in_user_id)\
-            .order_by(Notification.created_at.desc()).limit(50).all()
-        results = []
-        for n in notifs:
-            actor_name = None
-            actor_avatar = None
-            # Determine actor info
-            if getattr(n, "actor", None):
-                
-                actor_name = n.actor.name
-                actor_avatar = n.actor.avatar_url or "/default-avatar.png"
-            else:
-                # fallback: try to pick the post author or poll creator
-                if n.post_id:
-                    post = Post.query.get(n.post_id)
-                    if post and getattr(post, "author", None):
-                        actor_name = post.author.name
-                        actor_avatar = post.author.avatar_url or "/default-avatar.png"
-                if not actor_name and n.poll_id:
-                    poll = Poll.query.get(n.poll_id)
-                    # you used created_by_id on Poll; check relationship name
-                    creator = getattr(poll, "created_by_user", None) if poll else None
-                    if creator:
-                        actor_name = creator.name
-                        actor_avatar = creator.avatar_url or "/default-avatar.png"
-
-            # final fallback
-            if not actor_name:
-                actor_name = "System"
-                actor_avatar = "/default-avatar.png"
-
-            results.append({
-                "id": n.id,
-                "actor": {
-                    "name": actor_name,
-                    "avatarUrl": actor_avatar
-                },
-                "message": n.message,
-                "action_type": n.action_type,
-                "post_id": n.post_id,
-                "poll_id": n.poll_id,
-                "is_read": n.is_read,
-                "created_at": n.created_at.isoformat()
-            })
-
-        return jsonify(results), 200
+        logged_in_user_id = current_user_id()
+        return json_response(notifications_payload(logged_in_user_id))
 
     @app.route("/notifications/<int:notif_id>/read", methods=["POST"])
     @jwt_required()
     def mark_notification_read(notif_id):
-        logged_in_user_id = int(get_jwt_identity())
+        logged_in_user_id = current_user_id()
         notif = Notification.query.get(notif_id)
         if not notif or notif.user_id != logged_in_user_id:
             return jsonify({"error": "Notification not found"}), 404
@@ -808,7 +825,7 @@ def register_routes(app, db, PERSPECTIVE_API_KEY):
     @app.route("/notifications/clear", methods=["DELETE"])
     @jwt_required()
     def clear_notifications():
-        user_id = int(get_jwt_identity())
+        user_id = current_user_id()
     
         # Delete only this user's notifications
         Notification.query.filter_by(user_id=user_id).delete()
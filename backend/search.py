@@ -0,0 +1,387 @@
+# search.py
+"""
+Full-text search over posts and replies, and ranked user lookup, backed by
+SQLite FTS5.
+
+`posts_fts` and `replies_fts` are external-content FTS5 tables over
+`posts.content` and `replies.content`; `users_fts` is a trigram index over
+name, login_id, email and department. Triggers keep them in sync with every
+insert, update and delete (including ORM cascades), so the write paths in
+routes.py need no extra calls.
+"""
+import base64
+import bisect
+import html
+import json
+import re
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import DateTime, event, inspect, select, text
+
+from models import User
+
+# source table -> (fts table, indexed columns, tokenizer)
+FTS_TABLES = {
+    "posts": ("posts_fts", ("content",), "porter unicode61"),
+    "replies": ("replies_fts", ("content",), "porter unicode61"),
+    "users": ("users_fts", ("name", "login_id", "email", "department"), "trigram"),
+}
+
+# \x02 / \x03 mark matches inside snippets; they are swapped for <mark> after escaping
+_HL_START, _HL_END = "\x02", "\x03"
+SNIPPET_TOKENS = 16
+MAX_LIMIT = 50
+
+
+def fts_ddl(source: str, fts: str, columns, tokenize: str) -> List[str]:
+    cols = ", ".join(columns)
+    new_vals = ", ".join(f"new.{c}" for c in columns)
+    old_vals = ", ".join(f"old.{c}" for c in columns)
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+        f"{cols}, content='{source}', content_rowid='id', tokenize='{tokenize}')",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {source} BEGIN "
+        f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_vals}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {source} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_vals}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {cols} ON {source} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_vals}); "
+        f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_vals}); END",
+    ]
+
+
+def create_search_index(connection, rebuild: bool = False):
+    """Create the FTS tables and triggers if missing; `rebuild` re-reads every row."""
+    for source, (fts, columns, tokenize) in FTS_TABLES.items():
+        for stmt in fts_ddl(source, fts, columns, tokenize):
+            connection.exec_driver_sql(stmt)
+        if rebuild:
+            connection.exec_driver_sql(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+
+def init_search(app, db):
+    """
+    Make `db.create_all()` (seed and benchmark scripts) also create the FTS
+    tables; migrated databases get them from the Alembic revision.
+    """
+    @event.listens_for(db.metadata, "after_create")
+    def _create_fts(target, connection, **kw):
+        if connection.dialect.name == "sqlite":
+            create_search_index(connection, rebuild=True)
+
+    @app.cli.command("search-rebuild")
+    def search_rebuild():
+        """Recreate missing FTS objects and re-index posts, replies and users."""
+        with db.engine.begin() as connection:
+            create_search_index(connection, rebuild=True)
+        print("Search index rebuilt.")
+
+
+# ---------------------------------------
+# QUERY HELPERS
+# ---------------------------------------
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def to_match_query(q: str) -> Optional[str]:
+    """
+    Turn free text into a safe FTS5 MATCH expression: every word must appear,
+    the last one as a prefix so results update while typing.
+    """
+    terms = _TOKEN_RE.findall(q or "")[:10]
+    if not terms:
+        return None
+    quoted = [f'"{t}"' for t in terms]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+
+def render_snippet(raw: Optional[str]) -> str:
+    escaped = html.escape(raw or "")
+    return escaped.replace(_HL_START, "<mark>").replace(_HL_END, "</mark>")
+
+
+def encode_cursor(rank: float, kind: str, item_id: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps([rank, kind, item_id]).encode()).decode()
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Tuple[float, str, int]]:
+    if not cursor:
+        return None
+    try:
+        rank, kind, item_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return float(rank), str(kind), int(item_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def _branch(kind: str) -> str:
+    if kind == "post":
+        return f"""
+            SELECT 'post' AS kind, p.id AS id, p.id AS post_id, p.created_at AS created_at,
+                   u.id AS author_id, u.name AS author_name, u.avatar_url AS author_avatar,
+                   bm25(posts_fts) AS rank,
+                   snippet(posts_fts, 0, '{_HL_START}', '{_HL_END}', '…', {SNIPPET_TOKENS}) AS snippet
+            FROM posts_fts
+            JOIN posts p ON p.id = posts_fts.rowid
+            LEFT JOIN users u ON u.id = p.author_id
+            WHERE posts_fts MATCH :match AND p.deleted_at IS NULL
+              AND (p.review_status IS NULL OR p.author_id = :viewer_id)"""
+    return f"""
+            SELECT 'reply' AS kind, r.id AS id, r.post_id AS post_id, r.created_at AS created_at,
+                   u.id AS author_id, u.name AS author_name, u.avatar_url AS author_avatar,
+                   bm25(replies_fts) AS rank,
+                   snippet(replies_fts, 0, '{_HL_START}', '{_HL_END}', '…', {SNIPPET_TOKENS}) AS snippet
+            FROM replies_fts
+            JOIN replies r ON r.id = replies_fts.rowid
+            JOIN posts p ON p.id = r.post_id
+            LEFT JOIN users u ON u.id = r.author_id
+            WHERE replies_fts MATCH :match AND r.deleted_at IS NULL AND p.deleted_at IS NULL
+              AND (r.review_status IS NULL OR r.author_id = :viewer_id)
+              AND (p.review_status IS NULL OR p.author_id = :viewer_id)"""
+
+
+def search_content(session, q: str, kinds=("post", "reply"), limit: int = 20,
+                   cursor: Optional[str] = None, viewer_id: Optional[int] = None) -> Dict:
+    """
+    BM25-ranked matches across posts and replies, best first, paginated by
+    an opaque (rank, kind, id) cursor. Items under review only match for
+    their author, `viewer_id`.
+    """
+    match = to_match_query(q)
+    if not match:
+        return {"results": [], "nextCursor": None}
+    limit = max(1, min(limit, MAX_LIMIT))
+    after = decode_cursor(cursor)
+
+    union = " UNION ALL ".join(_branch(k) for k in kinds)
+    sql = f"SELECT * FROM ({union}) AS hits"
+    params = {"match": match, "limit": limit + 1, "viewer_id": viewer_id}
+    if after:
+        sql += """
+            WHERE rank > :after_rank
+               OR (rank = :after_rank AND (kind > :after_kind
+                   OR (kind = :after_kind AND id > :after_id)))"""
+        params.update(after_rank=after[0], after_kind=after[1], after_id=after[2])
+    sql += " ORDER BY rank, kind, id LIMIT :limit"
+
+    rows = session.execute(text(sql).columns(created_at=DateTime), params).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    results = [{
+        "type": r.kind,
+        "id": r.id,
+        "postId": r.post_id,
+        "snippet": render_snippet(r.snippet),
+        "rank": r.rank,
+        "createdAt": r.created_at,
+        "author": {
+            "id": r.author_id,
+            "name": r.author_name or "Unknown",
+            "avatarUrl": r.author_avatar or "/default-avatar.png",
+        },
+    } for r in rows]
+    next_cursor = encode_cursor(rows[-1].rank, rows[-1].kind, rows[-1].id) if has_more else None
+    return {"results": results, "nextCursor": next_cursor}
+
+
+# ---------------------------------------
+# USER SEARCH
+# ---------------------------------------
+# rank tiers: exact login_id, then prefix of the name / a name word / login_id, then substring
+TIER_EXACT_LOGIN, TIER_PREFIX, TIER_SUBSTRING = 0, 1, 2
+USER_RESULT_LIMIT = 25
+SUBSTRING_CANDIDATES = 200
+
+
+def _user_result(row) -> Dict:
+    return {
+        "id": row.id,
+        "loginId": row.login_id,
+        "name": row.name,
+        "email": row.email,
+        "avatarUrl": row.avatar_url,
+        "department": row.department,
+        "position": row.position,
+    }
+
+
+class UserPrefixIndex:
+    """
+    In-memory index of active users for the mention autocomplete.
+
+    Exact login ids live in a dict and prefixes are answered by bisecting a
+    sorted list of (key, position) pairs built from the login id, the full
+    name and each word of the name. Substring matches are left to
+    SQL (`_sql_user_search`), and only looked up when the first two tiers do not fill a page.
+    """
+
+    def __init__(self, rows):
+        self.users = [_user_result(r) for r in rows]
+        self.by_login = {}
+        keys = []
+        for pos, u in enumerate(self.users):
+            login = (u["loginId"] or "").lower()
+            name = (u["name"] or "").lower()
+            self.by_login[login] = pos
+            keys.append((login, pos))
+            keys.append((name, pos))
+            for word in name.split()[1:]:
+                keys.append((word, pos))
+        keys.sort()
+        self.keys = [k for k, _ in keys]
+        self.positions = [p for _, p in keys]
+        self.built_at = time.monotonic()
+
+    def prefix(self, q: str, limit: int) -> List[int]:
+        found, seen = [], set()
+        start = bisect.bisect_left(self.keys, q)
+        for i in range(start, len(self.keys)):
+            if not self.keys[i].startswith(q):
+                break
+            pos = self.positions[i]
+            if pos not in seen:
+                seen.add(pos)
+                found.append(pos)
+                if len(found) >= limit * 4:  # enough to sort by name and cut
+                    break
+        return found
+
+    def search(self, q: str, limit: int) -> Tuple[List[Dict], set]:
+        """Tiers 0 and 1 only; returns (results, ids already returned)."""
+        results, ids = [], set()
+        exact = self.by_login.get(q)
+        if exact is not None:
+            results.append(self.users[exact])
+            ids.add(self.users[exact]["id"])
+        prefixed = sorted(
+            (self.users[p] for p in self.prefix(q, limit)),
+            key=lambda u: ((u["name"] or "").lower(), u["id"]),
+        )
+        for u in prefixed:
+            if len(results) >= limit:
+                break
+            if u["id"] not in ids:
+                results.append(u)
+                ids.add(u["id"])
+        return results, ids
+
+
+_user_index: Optional[UserPrefixIndex] = None
+_user_index_lock = threading.Lock()
+
+
+USER_INDEX_ATTRS = ("login_id", "name", "email", "avatar_url", "department", "position", "is_active")
+
+
+def invalidate_user_index():
+    """Drop the in-memory index; the ORM listeners below call it when users change."""
+    global _user_index
+    _user_index = None
+
+
+def _get_user_index(session, ttl: float) -> UserPrefixIndex:
+    global _user_index
+    index = _user_index
+    if index is not None and time.monotonic() - index.built_at < ttl:
+        return index
+    with _user_index_lock:
+        if _user_index is None or time.monotonic() - _user_index.built_at >= ttl:
+            rows = session.execute(
+                select(User.id, User.login_id, User.name, User.email, User.avatar_url,
+                       User.department, User.position)
+                .where(User.is_active.is_(True))
+            ).all()
+            _user_index = UserPrefixIndex(rows)
+        return _user_index
+
+
+@event.listens_for(User, "after_insert")
+@event.listens_for(User, "after_delete")
+def _user_added_or_removed(mapper, connection, target):
+    invalidate_user_index()
+
+
+@event.listens_for(User, "after_update")
+def _user_updated(mapper, connection, target):
+    state = inspect(target)
+    if any(state.attrs[attr].history.has_changes() for attr in USER_INDEX_ATTRS):
+        invalidate_user_index()
+
+
+_USER_COLUMNS_SQL = "u.id, u.login_id, u.name, u.email, u.avatar_url, u.department, u.position"
+
+
+def _sql_user_search(session, q: str, limit: int, min_tier: int = TIER_EXACT_LOGIN,
+                     exclude=()) -> List[Dict]:
+    """
+    Ranked lookup in SQL. Exact and prefix tiers use the lower(login_id) and
+    lower(name) expression indexes; the substring tier uses the trigram index,
+    which needs three characters. Shorter queries match names only, by a scan
+    that stops at SUBSTRING_CANDIDATES hits.
+    """
+    # each branch is cut to a page in index order so common names and
+    # departments do not drag thousands of rows into the final sort
+    branches = []
+    if min_tier <= TIER_EXACT_LOGIN:
+        branches.append(f"SELECT id, {TIER_EXACT_LOGIN} AS tier FROM users WHERE lower(login_id) = :q")
+    if min_tier <= TIER_PREFIX:
+        branches.append(
+            f"SELECT * FROM (SELECT id, {TIER_PREFIX} AS tier FROM users "
+            f"WHERE lower(name) >= :q AND lower(name) < :q_hi ORDER BY lower(name) LIMIT :branch_limit)"
+        )
+        branches.append(
+            f"SELECT * FROM (SELECT id, {TIER_PREFIX} AS tier FROM users "
+            f"WHERE lower(login_id) >= :q AND lower(login_id) < :q_hi ORDER BY lower(login_id) LIMIT :branch_limit)"
+        )
+    if len(q) >= 3:
+        branches.append(
+            f"SELECT * FROM (SELECT rowid AS id, {TIER_SUBSTRING} AS tier FROM users_fts "
+            f"WHERE users_fts MATCH :match LIMIT :substring_limit)"
+        )
+    else:
+        branches.append(
+            f"SELECT * FROM (SELECT id, {TIER_SUBSTRING} AS tier FROM users "
+            f"WHERE is_active = 1 AND instr(lower(name), :q) > 0 LIMIT :substring_limit)"
+        )
+
+    sql = f"""
+        SELECT {_USER_COLUMNS_SQL}, min(hits.tier) AS tier
+        FROM ({' UNION ALL '.join(branches)}) AS hits
+        JOIN users u ON u.id = hits.id
+        WHERE u.is_active = 1
+        GROUP BY u.id
+        ORDER BY tier, lower(u.name), u.id
+        LIMIT :limit"""
+    params = {
+        "q": q,
+        "q_hi": q + "\uffff",
+        "match": '"' + q.replace('"', '""') + '"',
+        "limit": limit + len(exclude),
+        "branch_limit": limit + len(exclude),
+        "substring_limit": SUBSTRING_CANDIDATES,
+    }
+    rows = session.execute(text(sql), params).all()
+    return [_user_result(r) for r in rows if r.id not in exclude][:limit]
+
+
+def search_users_ranked(session, q: str, limit: int = USER_RESULT_LIMIT,
+                        use_memory_index: bool = True, index_ttl: float = 60.0) -> List[Dict]:
+    """
+    Users matching `q` ranked exact login_id first, then name/login prefix,
+    then substring of name, login_id, email or department (of the name only
+    for queries under three characters).
+    """
+    q = (q or "").strip().lower()
+    if not q:
+        return []
+    if not use_memory_index:
+        return _sql_user_search(session, q, limit)
+
+    results, ids = _get_user_index(session, index_ttl).search(q, limit)
+    if len(results) < limit:
+        results += _sql_user_search(session, q, limit - len(results), TIER_SUBSTRING, ids)
+    return results
@@ -40,7 +40,6 @@ def seed_users():
             user = User(
                 login_id=u["login_id"],
                 name=u["name"],
-                password=u["password"],  # plain text
                 role=u["role"],
                 position=u.get("position"),
                 department=u.get("department"),
@@ -49,6 +48,7 @@ def seed_users():
                 created_at=datetime.now(timezone.utc),
                 updated_at=datetime.now(timezone.utc),
             )
+            user.set_password(u["password"])
             db.session.add(user)
             print(f"Added user {u['login_id']} - {u['name']}")
 
@@ -0,0 +1,597 @@
+# serializers.py
+"""
+Column-projection serializers for the list endpoints.
+
+The list routes used to load full ORM objects and build each dict through
+`to_json`, which lazy-loads authors, likes and votes per row. The functions
+here select only the columns each payload needs, fetch counts and flags in
+batched grouped queries and return plain dicts with the same keys the React
+pages already read.
+"""
+import base64
+import json
+from functools import lru_cache
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from flask import Response, request
+from sqlalchemy import select, bindparam, text, tuple_
+from sqlalchemy.orm import aliased
+
+from extensions import db
+from models import User, Post, Reply, Like, Poll, PollOption, Vote, Notification, TrendingPost
+from variants import AVATAR_WIDTHS, image_sources
+from review import visible_clause
+
+try:
+    import orjson
+except ImportError:  # optional: fall back to the stdlib encoder
+    orjson = None
+
+DEFAULT_AVATAR = "/default-avatar.png"
+
+
+# ---------------------------------------
+# ENCODING
+# ---------------------------------------
+def _iso_utc(dt: Optional[datetime]) -> Optional[str]:
+    """Same output as `dt.replace(tzinfo=timezone.utc).isoformat()` for naive UTC values."""
+    if dt is None:
+        return None
+    if dt.tzinfo is None:
+        return dt.isoformat() + "+00:00"
+    return dt.replace(tzinfo=timezone.utc).isoformat()
+
+
+def _json_default(obj):
+    if isinstance(obj, datetime):
+        return _iso_utc(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(payload) -> bytes:
+    """
+    Encode a payload built by this module.
+    Naive datetimes are treated as UTC, matching the models' to_json output.
+    """
+    if orjson is not None:
+        return orjson.dumps(payload, option=orjson.OPT_NAIVE_UTC | orjson.OPT_SORT_KEYS)
+    return json.dumps(payload, default=_json_default, sort_keys=True, separators=(",", ":")).encode("utf-8")
+
+
+def json_response(payload, status: int = 200) -> Response:
+    return Response(dumps(payload), status=status, mimetype="application/json")
+
+
+# ---------------------------------------
+# USERS
+# ---------------------------------------
+USER_COLUMNS = (
+    User.id, User.login_id, User.name, User.role, User.avatar_url,
+    User.email, User.position, User.department, User.created_at, User.updated_at,
+)
+
+
+def _host_url() -> str:
+    try:
+        return request.host_url.rstrip("/")
+    except RuntimeError:
+        return ""
+
+
+def avatar_full_url(avatar_url: Optional[str], host_url: str) -> Optional[str]:
+    """Mirror of the avatar resolution in `User.to_json`."""
+    if not avatar_url:
+        return None
+    url = str(avatar_url)
+    if url.startswith("http://") or url.startswith("https://"):
+        return url
+    url = url.lstrip("/")
+    final_path = url if url.startswith("statics/") else f"statics/profile/{url}"
+    return f"{host_url}/{final_path}" if host_url else f"/{final_path}"
+
+
+def user_dict(values, host_url: str, avatars: Optional[Dict] = None) -> Optional[Dict]:
+    """
+    Build the `User.to_json` shape from the USER_COLUMNS values, in order.
+    `avatars` memoizes the resolved avatar URL and its sources, which most users share.
+    """
+    user_id, login_id, name, role, avatar_url, email, position, department, created_at, updated_at = values
+    if user_id is None:
+        return None
+    resolved = avatars.get(avatar_url) if avatars is not None else None
+    if resolved is None:
+        avatar = avatar_full_url(avatar_url, host_url)
+        resolved = (avatar, image_sources(avatar, AVATAR_WIDTHS, host_url))
+        if avatars is not None:
+            avatars[avatar_url] = resolved
+    avatar, avatar_sources = resolved
+    return {
+        "id": user_id,
+        "loginId": login_id,
+        "name": name,
+        "role": role,
+        "avatarUrl": avatar,
+        "avatarSources": avatar_sources,
+        "email": email,
+        "position": position,
+        "department": department,
+        "createdAt": created_at,
+        "updatedAt": updated_at,
+    }
+
+
+def _user_columns(user_entity=User, prefix: str = "u_"):
+    return [getattr(user_entity, c.key).label(f"{prefix}{c.key}") for c in USER_COLUMNS]
+
+
+def users_payload() -> List[Dict]:
+    host_url = _host_url()
+    avatars = {}
+    rows = db.session.execute(
+        select(*USER_COLUMNS).where(User.is_active.is_(True)).order_by(User.name.asc())
+    )
+    return [user_dict(r, host_url, avatars) for r in rows]
+
+
+def leaderboard_entries(rows) -> List[Dict]:
+    """
+    Leaderboard rows (USER_COLUMNS values + likes, best first) with
+    competition ranks: equal likes share a rank (1, 2, 2, 4).
+    """
+    host_url = _host_url()
+    entries, avatars, rank, previous = [], {}, 0, None
+    for position, row in enumerate(rows, start=1):
+        likes = row[-1]
+        if likes != previous:
+            rank, previous = position, likes
+        entries.append({"rank": rank, "likes": likes, "user": user_dict(row[:-1], host_url, avatars)})
+    return entries
+
+
+# ---------------------------------------
+# POSTS
+# ---------------------------------------
+def posts_select(user_id: int):
+    """
+    One statement for the feed: post columns, the author's columns, the stored
+    like/reply counts and the caller's like flag as a joined subquery.
+    Soft-deleted posts are left out, and so are other people's posts still
+    under review (review.py).
+    """
+    liked = (
+        select(Like.post_id.label("post_id"))
+        .where(Like.user_id == user_id, Like.post_id.isnot(None))
+        .subquery()
+    )
+    author = aliased(User)
+    return (
+        select(
+            Post.id, Post.author_id, Post.content, Post.image_url, Post.gif_url,
+            Post.pinned, Post.created_at,
+            *_user_columns(author),
+            Post.like_count,
+            Post.reply_count,
+            liked.c.post_id.isnot(None).label("user_liked"),
+            Post.review_status,
+        )
+        .outerjoin(author, author.id == Post.author_id)
+        .outerjoin(liked, liked.c.post_id == Post.id)
+        .where(Post.deleted_at.is_(None), visible_clause(Post, user_id))
+    )
+
+
+def post_dict(row, host_url: str, avatars: Optional[Dict] = None) -> Dict:
+    """`row` comes from `posts_select`: 7 post columns, the author, then the aggregates."""
+    post_id, author_id, content, image_url, gif_url, pinned, created_at = row[:7]
+    like_count, reply_count, user_liked, review_status = row[17:21]
+    return {
+        "id": post_id,
+        "authorId": author_id,
+        "content": content,
+        "imageUrl": image_url,
+        "imageSources": image_sources(image_url),
+        "gifUrl": gif_url,
+        "pinned": pinned,
+        "reviewStatus": review_status,
+        "createdAt": created_at,
+        "user": user_dict(row[7:17], host_url, avatars),
+        "likeCount": like_count,
+        "userLiked": bool(user_liked),
+        "replyCount": reply_count,
+        "image_url": image_url,
+        "gif_url": gif_url,
+    }
+
+
+def posts_payload(user_id: int) -> List[Dict]:
+    host_url = _host_url()
+    stmt = posts_select(user_id).order_by(Post.pinned.desc(), Post.created_at.desc())
+    avatars = {}
+    return [post_dict(r, host_url, avatars) for r in db.session.execute(stmt)]
+
+
+def encode_feed_cursor(pinned: bool, created_at: datetime, post_id: int) -> str:
+    raw = json.dumps([bool(pinned), created_at.isoformat(), post_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_feed_cursor(cursor: str) -> Tuple[bool, datetime, int]:
+    try:
+        pinned, created_at, post_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return bool(pinned), datetime.fromisoformat(created_at), int(post_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def feed_page(user_id: int, limit: int = 20, cursor: Optional[str] = None) -> Dict:
+    """
+    One keyset page of the feed in `posts_payload` order (pinned first, then
+    newest), walking ix_posts_feed instead of sorting the whole history.
+    """
+    limit = max(limit, 1)
+    stmt = posts_select(user_id).order_by(Post.pinned.desc(), Post.created_at.desc(), Post.id.desc())
+    if cursor:
+        pinned, created_at, post_id = decode_feed_cursor(cursor)
+        stmt = stmt.where(tuple_(Post.pinned, Post.created_at, Post.id) < tuple_(pinned, created_at, post_id))
+    rows = db.session.execute(stmt.limit(limit + 1)).all()
+    host_url = _host_url()
+    avatars = {}
+    items = [post_dict(r, host_url, avatars) for r in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        last = items[-1]
+        next_cursor = encode_feed_cursor(last["pinned"], last["createdAt"], last["id"])
+    return {"posts": items, "nextCursor": next_cursor}
+
+
+def encode_trending_cursor(score: float, post_id: int) -> str:
+    raw = json.dumps([score, post_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_trending_cursor(cursor: str) -> Tuple[float, int]:
+    try:
+        score, post_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return float(score), int(post_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def trending_page(user_id: int, limit: int = 20, cursor: Optional[str] = None) -> Dict:
+    """
+    One keyset page of trending posts (trending.py), highest score first,
+    walking ix_trending_posts_score. Posts without recent likes or replies
+    are not trending. A refresh between two pages rescales the scores, so a
+    later page may repeat a post the client already has.
+    """
+    limit = max(limit, 1)
+    stmt = (
+        posts_select(user_id)
+        .add_columns(TrendingPost.score)
+        .join(TrendingPost, TrendingPost.post_id == Post.id)
+        .where(TrendingPost.score > 0)
+        .order_by(TrendingPost.score.desc(), TrendingPost.post_id.desc())
+    )
+    if cursor:
+        score, post_id = decode_trending_cursor(cursor)
+        stmt = stmt.where(tuple_(TrendingPost.score, TrendingPost.post_id) < tuple_(score, post_id))
+    rows = db.session.execute(stmt.limit(limit + 1)).all()
+    host_url = _host_url()
+    avatars = {}
+    items = [post_dict(r, host_url, avatars) for r in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        next_cursor = encode_trending_cursor(last.score, last.id)
+    return {"posts": items, "nextCursor": next_cursor}
+
+
+# ---------------------------------------
+# REPLIES
+# ---------------------------------------
+UNKNOWN_AUTHOR = {"id": None, "name": "Unknown", "avatarUrl": DEFAULT_AVATAR}
+
+REPLY_COLUMNS = (
+    Reply.id, Reply.post_id, Reply.author_id, Reply.content, Reply.image_url,
+    Reply.gif_url, Reply.created_at, Reply.like_count, Reply.review_status,
+)
+
+
+def encode_reply_cursor(created_at: datetime, reply_id: int) -> str:
+    raw = json.dumps([created_at.isoformat(), reply_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_reply_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        created_at, reply_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(created_at), int(reply_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def hydrate_replies(rows, user_id: Optional[int], host_url: str) -> List[Dict]:
+    """
+    Build reply dicts for a page of REPLY_COLUMNS rows with two batched
+    lookups (authors and the caller's likes) instead of loading relationships
+    per reply.
+    """
+    if not rows:
+        return []
+    ids = [r[0] for r in rows]
+    author_ids = {r[2] for r in rows}
+
+    avatars = {}
+    authors = {
+        u[0]: user_dict(u, host_url, avatars)
+        for u in db.session.execute(select(*USER_COLUMNS).where(User.id.in_(author_ids)))
+    }
+    liked = set()
+    if user_id:
+        liked = set(db.session.execute(
+            select(Like.reply_id).where(Like.user_id == user_id, Like.reply_id.in_(ids))
+        ).scalars())
+
+    results = []
+    for reply_id, post_id, author_id, content, image_url, gif_url, created_at, like_count, review_status in rows:
+        author = authors.get(author_id)
+        results.append({
+            "id": reply_id,
+            "postId": post_id,
+            "authorId": author_id,
+            "content": content,
+            "imageUrl": image_url,
+            "imageSources": image_sources(image_url),
+            "gifUrl": gif_url,
+            "likeCount": like_count,
+            "userLiked": reply_id in liked,
+            "reviewStatus": review_status,
+            "createdAt": created_at,
+            "user": author if author is not None else dict(UNKNOWN_AUTHOR),
+        })
+    return results
+
+
+def replies_payload(post_id: int, user_id: Optional[int], per_page: int, total: int,
+                    cursor: Optional[str] = None, page: Optional[int] = None) -> Dict:
+    """
+    One page of a thread in (created_at, id) order. By default pages are
+    keyset-paginated through `nextCursor`, which costs the same on page 1000
+    as on page 1; an explicit `page` falls back to OFFSET for old clients.
+    `total` is the post's stored reply_count.
+    """
+    per_page = max(per_page, 1)
+    stmt = select(*REPLY_COLUMNS) \
+        .where(Reply.post_id == post_id, Reply.deleted_at.is_(None), visible_clause(Reply, user_id)) \
+        .order_by(Reply.created_at.asc(), Reply.id.asc())
+    payload = {"postId": post_id, "totalReplies": total, "perPage": per_page}
+
+    if page is not None:
+        page = max(page, 1)
+        rows = db.session.execute(stmt.limit(per_page).offset((page - 1) * per_page)).all()
+        has_more = page * per_page < total
+        payload["page"] = page
+    else:
+        if cursor:
+            created_at, reply_id = decode_reply_cursor(cursor)
+            stmt = stmt.where(tuple_(Reply.created_at, Reply.id) > tuple_(created_at, reply_id))
+        rows = db.session.execute(stmt.limit(per_page + 1)).all()
+        has_more = len(rows) > per_page
+        rows = rows[:per_page]
+
+    payload["replies"] = hydrate_replies(rows, user_id, _host_url())
+    payload["nextCursor"] = encode_reply_cursor(rows[-1].created_at, rows[-1].id) if rows and has_more else None
+    return payload
+
+
+# ---------------------------------------
+# POLLS
+# ---------------------------------------
+def polls_payload(user_id: Optional[int], poll_ids: Optional[Iterable[int]] = None) -> List[Dict]:
+    """
+    Equivalent of `[p.to_json(include_votes=True) for p in polls]` in four
+    queries regardless of how many polls, options and voters there are.
+    """
+    stmt = select(
+        Poll.id, Poll.title, Poll.description, Poll.created_by_id, Poll.created_at,
+        Poll.end_at, Poll.is_active,
+    ).order_by(Poll.created_at.desc())
+    if poll_ids is not None:
+        stmt = stmt.where(Poll.id.in_(list(poll_ids)))
+    polls = db.session.execute(stmt).all()
+    if not polls:
+        return []
+    ids = [p.id for p in polls]
+
+    options_by_poll: Dict[int, List[Dict]] = {pid: [] for pid in ids}
+    options_by_id: Dict[int, Dict] = {}
+    for o in db.session.execute(
+        select(PollOption.id, PollOption.poll_id, PollOption.text)
+        .where(PollOption.poll_id.in_(ids))
+        .order_by(PollOption.id)
+    ):
+        data = {"id": o.id, "pollId": o.poll_id, "text": o.text, "voteCount": 0, "voters": []}
+        options_by_poll[o.poll_id].append(data)
+        options_by_id[o.id] = data
+
+    if options_by_id:
+        for v in db.session.execute(
+            select(Vote.poll_option_id, User.id, User.name, User.avatar_url)
+            .join(User, User.id == Vote.user_id)
+            .where(Vote.poll_option_id.in_(list(options_by_id)))
+            .order_by(Vote.id)
+        ):
+            data = options_by_id[v.poll_option_id]
+            data["voteCount"] += 1
+            data["voters"].append({
+                "id": v.id,
+                "name": v.name,
+                "avatarUrl": v.avatar_url or DEFAULT_AVATAR,
+            })
+
+    user_votes: Dict[int, int] = {}
+    if user_id:
+        for poll_id, option_id in db.session.execute(
+            select(PollOption.poll_id, Vote.poll_option_id)
+            .join(PollOption, PollOption.id == Vote.poll_option_id)
+            .where(Vote.user_id == user_id, PollOption.poll_id.in_(ids))
+            .order_by(Vote.id.desc())
+        ):
+            user_votes[poll_id] = option_id
+
+    now = datetime.utcnow()
+    return [
+        {
+            "id": p.id,
+            "title": p.title,
+            "description": p.description,
+            "createdBy": p.created_by_id,
+            "createdAt": p.created_at,
+            "endAt": p.end_at,
+            "isActive": p.is_active,
+            "hasExpired": now > p.end_at,
+            "hasVoted": p.id in user_votes,
+            "userVoteOptionId": user_votes.get(p.id),
+            "options": options_by_poll[p.id],
+        }
+        for p in polls
+    ]
+
+
+# ---------------------------------------
+# NOTIFICATIONS
+# ---------------------------------------
+@lru_cache(maxsize=None)
+def _notifications_stmt():
+    actor = aliased(User)
+    post_author = aliased(User)
+    poll_creator = aliased(User)
+    stmt = (
+        select(
+            Notification.id, Notification.message, Notification.action_type,
+            Notification.post_id, Notification.poll_id, Notification.is_read,
+            Notification.created_at,
+            actor.id.label("actor_id"), actor.name.label("actor_name"),
+            actor.avatar_url.label("actor_avatar"),
+            post_author.name.label("post_author_name"),
+            post_author.avatar_url.label("post_author_avatar"),
+            poll_creator.name.label("poll_creator_name"),
+            poll_creator.avatar_url.label("poll_creator_avatar"),
+        )
+        .outerjoin(actor, actor.id == Notification.actor_id)
+        .outerjoin(Post, Post.id == Notification.post_id)
+        .outerjoin(post_author, post_author.id == Post.author_id)
+        .outerjoin(Poll, Poll.id == Notification.poll_id)
+        .outerjoin(poll_creator, poll_creator.id == Poll.created_by_id)
+        .where(Notification.user_id == bindparam("user_id"), Post.deleted_at.is_(None))
+        .order_by(Notification.created_at.desc())
+        .limit(bindparam("limit"))
+    )
+    return stmt
+
+
+def notifications_payload(user_id: int, limit: int = 50) -> List[Dict]:
+    """
+    Actor falls back to the post author, then the poll creator, then "System",
+    all resolved with outer joins instead of a lookup per notification.
+
+    Runs on the session's connection: a page of plain columns needs none of
+    the ORM's result handling, which was most of this endpoint's CPU. That
+    also skips autoflush, so call it only where nothing is pending. Rows are
+    unpacked by position, in _notifications_stmt's column order; named access
+    on a Row costs about a microsecond per attribute.
+    """
+    host_url = _host_url()
+    sources = {DEFAULT_AVATAR: None}
+    results = []
+    rows = db.session.connection().execute(_notifications_stmt(), {"user_id": user_id, "limit": limit}).all()
+    for (notification_id, message, action_type, post_id, poll_id, is_read, created_at,
+         actor_id, actor_name, actor_avatar, post_author_name, post_author_avatar,
+         poll_creator_name, poll_creator_avatar) in rows:
+        if actor_id is not None:
+            actor_avatar = actor_avatar or DEFAULT_AVATAR
+        elif post_author_name:
+            actor_name, actor_avatar = post_author_name, post_author_avatar or DEFAULT_AVATAR
+        elif poll_creator_name:
+            actor_name, actor_avatar = poll_creator_name, poll_creator_avatar or DEFAULT_AVATAR
+        else:
+            actor_name, actor_avatar = None, None
+        if not actor_name:
+            actor_name, actor_avatar = "System", DEFAULT_AVATAR
+
+        if actor_avatar not in sources:
+            sources[actor_avatar] = image_sources(avatar_full_url(actor_avatar, host_url), AVATAR_WIDTHS, host_url)
+
+        results.append({
+            "id": notification_id,
+            "actor": {"name": actor_name, "avatarUrl": actor_avatar, "avatarSources": sources[actor_avatar]},
+            "message": message,
+            "action_type": action_type,
+            "post_id": post_id,
+            "poll_id": poll_id,
+            "is_read": is_read,
+            # this endpoint has always sent a naive isoformat string
+            "created_at": created_at.isoformat() if created_at else None,
+        })
+    return results
+
+
+# ---------------------------------------
+# BOOTSTRAP
+# ---------------------------------------
+BOOTSTRAP_SECTIONS = ("user", "polls", "feed")
+
+
+def encode_since(values: Dict) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values, sort_keys=True).encode()).decode()
+
+
+def decode_since(token: Optional[str]) -> Dict:
+    """Unreadable tokens count as no token: every section is sent."""
+    if not token:
+        return {}
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token.encode()))
+        return values if isinstance(values, dict) else {}
+    except Exception:
+        return {}
+
+
+def bootstrap_payload(user_id: int, since: Optional[str] = None, feed_limit: int = 20) -> Optional[Dict]:
+    """
+    The home page's user, polls and first feed page in one response.
+
+    Each section has a version: the user's updated_at, and the sync_versions
+    counters (see counters.py) for polls and posts. Sections whose version
+    matches the `since` token the client got last time are left out and
+    listed under "unchanged"; the new token is returned as "since".
+    Returns None when the user does not exist.
+    """
+    user_row = db.session.execute(select(*USER_COLUMNS).where(User.id == user_id)).first()
+    if user_row is None:
+        return None
+    versions = dict(db.session.execute(text("SELECT section, version FROM sync_versions")).all())
+    current = {
+        "uid": user_id,
+        "user": user_row.updated_at.isoformat() if user_row.updated_at else None,
+        "polls": versions.get("polls"),
+        "feed": versions.get("posts"),
+    }
+    previous = decode_since(since)
+    if previous.get("uid") != user_id:
+        previous = {}
+
+    payload = {"since": encode_since(current), "unchanged": []}
+    for section in BOOTSTRAP_SECTIONS:
+        # a missing counter (table not created yet) never counts as unchanged
+        if current[section] is not None and previous.get(section) == current[section]:
+            payload["unchanged"].append(section)
+            continue
+        if section == "user":
+            payload["user"] = user_dict(user_row, _host_url())
+        elif section == "polls":
+            payload["polls"] = polls_payload(user_id)
+        else:
+            payload["feed"] = feed_page(user_id, feed_limit)
+    return payload
@@ -0,0 +1,193 @@
+# storage.py
+"""
+Where uploaded media lives, behind one small interface (STORAGE_BACKEND):
+
+- "cloudinary": files go to Cloudinary and are served from its CDN
+- "local": content-addressed files under LOCAL_STORAGE_ROOT. A file is
+  streamed to disk while it is hashed and stored as `ab/abcdef....png` after
+  its sha256, so an identical file is written once and its URL never changes.
+  The app serves them at /media/<key> with send_file, which hands the file
+  to the front server when USE_X_SENDFILE is on, and with year-long
+  immutable cache headers.
+
+    stored = storage().save(file, folder="posts", content_type="image/png")
+    stored.url
+
+The local backend needs no network, so the whole stack can run and be
+benchmarked offline.
+"""
+import hashlib
+import os
+import secrets
+from typing import Iterable, NamedTuple, Optional
+
+import cloudinary.uploader
+import cloudinary.utils
+from flask import current_app, jsonify, send_file
+
+from metrics import outbound_call
+
+CHUNK_SIZE = 64 * 1024
+EXTENSIONS = {"image/jpeg": ".jpg", "image/png": ".png", "image/webp": ".webp", "image/gif": ".gif"}
+MEDIA_MAX_AGE = 365 * 24 * 3600
+
+
+class StorageError(ValueError):
+    """A file the storage refused; the message is safe to show to the client."""
+
+
+class FileTooLarge(StorageError):
+    pass
+
+
+class FileTypeNotAllowed(StorageError):
+    pass
+
+
+class StoredFile(NamedTuple):
+    key: str
+    url: str
+    size: Optional[int]
+    content_type: Optional[str]
+
+
+def sniff_content_type(head: bytes) -> Optional[str]:
+    """Content type from the file's leading bytes, for the image types we accept."""
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if head.startswith((b"GIF87a", b"GIF89a")):
+        return "image/gif"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+
+# ---------------------------------------
+# BACKENDS
+# ---------------------------------------
+class CloudinaryStorage:
+    name = "cloudinary"
+
+    def save(self, file, folder: Optional[str] = None, content_type: Optional[str] = None,
+             max_bytes: Optional[int] = None, accept: Optional[Iterable[str]] = None) -> StoredFile:
+        options = {"folder": folder} if folder else {}
+        with outbound_call("cloudinary"):
+            result = cloudinary.uploader.upload(file, **options)
+        return StoredFile(result["public_id"], result["secure_url"], result.get("bytes"), content_type)
+
+    def url(self, key: str) -> str:
+        return cloudinary.utils.cloudinary_url(key, secure=True)[0]
+
+    def delete(self, key: str):
+        with outbound_call("cloudinary"):
+            cloudinary.uploader.destroy(key, invalidate=True)
+
+
+class LocalStorage:
+    name = "local"
+
+    def __init__(self, root: str, base_url: str = "/media"):
+        self.root = os.path.abspath(root)
+        self.base_url = base_url.rstrip("/")
+
+    def path(self, key: str) -> Optional[str]:
+        """Absolute path of a stored key, or None when the key escapes the root or is missing."""
+        path = os.path.abspath(os.path.join(self.root, key))
+        if not path.startswith(self.root + os.sep) or not os.path.isfile(path):
+            return None
+        return path
+
+    def url(self, key: str) -> str:
+        return f"{self.base_url}/{key}"
+
+    @staticmethod
+    def content_hash(key: str) -> Optional[str]:
+        """The sha256 a key was derived from ("ab/<sha256>.png")."""
+        name = os.path.splitext(os.path.basename(key))[0]
+        return name if len(name) == 64 else None
+
+    def delete(self, key: str):
+        path = self.path(key)
+        if path is not None:
+            os.unlink(path)
+
+    def save(self, file, folder: Optional[str] = None, content_type: Optional[str] = None,
+             max_bytes: Optional[int] = None, accept: Optional[Iterable[str]] = None) -> StoredFile:
+        """
+        Stream `file` to disk, hashing as it goes. The content type is sniffed
+        from the first bytes; `accept` limits it. `folder` is ignored: keys
+        depend on the content only.
+        """
+        stream = getattr(file, "stream", file)
+        os.makedirs(self.root, exist_ok=True)
+        tmp = os.path.join(self.root, f".upload-{secrets.token_hex(8)}")
+        digest = hashlib.sha256()
+        size, head = 0, b""
+        try:
+            with open(tmp, "wb") as out:
+                while True:
+                    chunk = stream.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    if len(head) < 16:
+                        head += chunk[:16 - len(head)]
+                    size += len(chunk)
+                    if max_bytes is not None and size > max_bytes:
+                        raise FileTooLarge(f"File too large (max {max_bytes} bytes)")
+                    digest.update(chunk)
+                    out.write(chunk)
+            sniffed = sniff_content_type(head)
+            if accept is not None and sniffed not in set(accept):
+                raise FileTypeNotAllowed("File type not allowed")
+            hexdigest = digest.hexdigest()
+            key = f"{hexdigest[:2]}/{hexdigest}{EXTENSIONS.get(sniffed, '')}"
+            final = os.path.join(self.root, key)
+            if os.path.exists(final):
+                os.unlink(tmp)
+            else:
+                os.makedirs(os.path.dirname(final), exist_ok=True)
+                os.replace(tmp, final)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+        return StoredFile(key, self.url(key), size, sniffed or content_type)
+
+    def serve(self, key: str):
+        """A send_file response for `key` (X-Sendfile when USE_X_SENDFILE is on), or None."""
+        path = self.path(key)
+        if path is None:
+            return None
+        response = send_file(path, conditional=True, etag=True, max_age=MEDIA_MAX_AGE)
+        # content-addressed: the bytes behind a key never change
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
+
+
+def make_storage(config):
+    if config["STORAGE_BACKEND"] == "local":
+        return LocalStorage(config["LOCAL_STORAGE_ROOT"], config["LOCAL_MEDIA_URL"])
+    return CloudinaryStorage()
+
+
+def storage():
+    return current_app.extensions["storage"]
+
+
+def init_storage(app):
+    app.config.setdefault("STORAGE_BACKEND", "cloudinary")
+    app.config.setdefault("LOCAL_STORAGE_ROOT", os.path.join(app.root_path, "media"))
+    app.config.setdefault("LOCAL_MEDIA_URL", "/media")
+    backend = make_storage(app.config)
+    app.extensions["storage"] = backend
+
+    if backend.name == "local":
+        @app.route("/media/<path:key>", methods=["GET"])
+        def serve_media(key):
+            response = backend.serve(key)
+            if response is None:
+                return jsonify({"error": "Not found"}), 404
+            return response
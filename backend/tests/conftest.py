@@ -0,0 +1,41 @@
+# tests/conftest.py
+"""One app on a throwaway SQLite file, shared by every test module."""
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+_db = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
+os.environ["DATABASE_URL"] = f"sqlite:///{_db.name}"
+os.environ.setdefault("JWT_TOKEN_KEY", "x" * 40)
+
+from app import app as flask_app, db  # noqa: E402
+from auth import issue_token  # noqa: E402
+from models import User  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def app():
+    with flask_app.app_context():
+        db.drop_all()
+        db.create_all()
+        db.session.add(User(login_id="E101", name="Aung Ko", password="Emp@101", role="employee", email="a@x.com"))
+        db.session.commit()
+    yield flask_app
+    os.unlink(_db.name)
+
+
+@pytest.fixture
+def user_id(app):
+    return 1
+
+
+@pytest.fixture
+def client(app, user_id):
+    with app.app_context():
+        token = issue_token(db.session.get(User, user_id))
+    client = app.test_client()
+    client.environ_base["HTTP_AUTHORIZATION"] = f"Bearer {token}"
+    return client
@@ -0,0 +1,63 @@
+# tests/test_auth.py
+"""Tokens issued before role and ver claims keep working until they expire; a saturated hasher answers 503."""
+import time
+
+import pytest
+from flask_jwt_extended import create_access_token
+
+from auth import issue_token, revoke_tokens
+from extensions import db
+from models import User
+
+
+@pytest.fixture
+def admin(app):
+    with app.app_context():
+        user = User(login_id="A901", name="Old Admin", password="x", role="admin", email="old@x.com")
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+    # no app context held across the requests, or they would share one `g`
+    yield user_id
+    with app.app_context():
+        db.session.delete(db.session.get(User, user_id))
+        db.session.commit()
+        revoke_tokens()
+
+
+def _get(app, token, path="/admin/review-queue"):
+    return app.test_client().get(path, headers={"Authorization": f"Bearer {token}"})
+
+
+def test_token_without_claims_reads_the_role_from_the_row(app, admin):
+    with app.app_context():
+        legacy = create_access_token(identity=str(admin))
+        employee = create_access_token(identity="1")
+    assert _get(app, legacy).status_code == 200
+    assert _get(app, employee).status_code == 403
+
+
+def test_token_without_claims_is_revoked_with_the_user(app, admin):
+    with app.app_context():
+        legacy = create_access_token(identity=str(admin))
+        db.session.get(User, admin).is_active = False
+        db.session.commit()
+        revoke_tokens(admin)
+    assert _get(app, legacy, "/users/me").status_code == 401
+
+
+def test_stale_version_is_revoked(app, admin):
+    with app.app_context():
+        token = issue_token(db.session.get(User, admin))
+        db.session.get(User, admin).role = "employee"
+        db.session.commit()
+        revoke_tokens(admin)
+    assert _get(app, token, "/users/me").status_code == 401
+
+
+def test_login_waiting_past_the_hash_timeout_gets_503(app, monkeypatch):
+    hasher = app.extensions["auth"]["hasher"]
+    monkeypatch.setattr(hasher, "verify", lambda stored, candidate: time.sleep(0.2) or (False, False))
+    monkeypatch.setattr(hasher, "timeout", 0.01)
+    response = app.test_client().post("/login", json={"login_id": "nobody", "password": "pw"})
+    assert response.status_code == 503 and response.headers["Retry-After"] == "1"
@@ -0,0 +1,31 @@
+# tests/test_batch.py
+"""POST /batch refuses nested batches however the path is spelled."""
+import pytest
+
+
+def _batch(client, path):
+    response = client.post("/batch", json={"requests": [
+        {"id": "inner", "method": "POST", "path": path,
+         "body": {"requests": [{"path": "/notifications"}]}},
+    ]})
+    assert response.status_code == 200
+    return response.get_json()["responses"][0]
+
+
+@pytest.mark.parametrize("path", ["/batch", "/%62atch", "/%62%61%74%63%68", "/batch?x=1"])
+def test_nested_batch_is_refused(client, path):
+    item = _batch(client, path)
+    assert item["status"] == 400
+    assert item["body"] == {"error": "batches cannot be nested"}
+
+
+@pytest.mark.parametrize("path", ["/batch/", "//batch"])
+def test_nested_batch_spellings_never_run(client, path):
+    item = _batch(client, path)
+    assert item["status"] != 200
+    assert "responses" not in (item["body"] if isinstance(item["body"], dict) else {})
+
+
+def test_items_still_run(client):
+    response = client.post("/batch", json={"requests": [{"id": "n", "path": "/notifications"}]})
+    assert response.get_json()["responses"][0]["status"] == 200
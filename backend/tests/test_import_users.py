@@ -0,0 +1,87 @@
+# tests/test_import_users.py
+"""Rows the users table cannot hold as given are rejected, never altered or lost."""
+import pytest
+from sqlalchemy import select, update
+
+from auth import is_hashed, is_interim
+from extensions import db
+from import_users import LOGIN_ID_LENGTH, import_users, validate_row
+from models import User
+
+
+def _row(employee_id):
+    return {"employee_id": employee_id, "name": "Aung Ko", "password": "pw", "role": "employee"}
+
+
+def test_longest_login_id_is_kept_whole():
+    values, reason = validate_row(_row("E" * LOGIN_ID_LENGTH), 2)
+    assert reason is None and values["login_id"] == "E" * LOGIN_ID_LENGTH
+
+
+def test_longer_login_id_is_rejected():
+    # truncated, both would upsert into one user
+    for suffix in ("-1", "-2"):
+        values, reason = validate_row(_row("E" * LOGIN_ID_LENGTH + suffix), 3)
+        assert values is None and reason.startswith("line 3: employee_id")
+
+
+@pytest.fixture
+def employees(app):
+    with app.app_context():
+        active = set(db.session.execute(select(User.id).where(User.is_active.is_(True))).scalars())
+        rows = [
+            User(login_id="I301", name="U1", password="x", role="employee", email="i301@x.com"),
+            User(login_id="I302", name="U2", password="x", role="employee", email="i302@x.com"),
+        ]
+        db.session.add_all(rows)
+        db.session.commit()
+        ids = [u.id for u in rows]
+    yield ids
+    with app.app_context():
+        # the import deactivates every user missing from its file
+        db.session.execute(update(User).where(User.id.in_(active)).values(is_active=True))
+        db.session.execute(User.__table__.delete().where(User.login_id.like("I3%")))
+        db.session.commit()
+
+
+def _import(tmp_path, lines):
+    path = tmp_path / "employees.csv"
+    path.write_text("employee_id,name,password,role,email\n" + "\n".join(lines) + "\n")
+    return import_users(str(path))
+
+
+def _user(user_id):
+    db.session.expire_all()
+    return db.session.get(User, user_id)
+
+
+def test_rejected_row_keeps_its_employee_active(app, employees, tmp_path):
+    kept, typo = employees
+    stats = _import(tmp_path, ["I301,U1,pw,employee,i301@x.com", "I302,U2,pw,staff,i302@x.com"])
+    assert stats["rejected"] == 1 and stats["updated"] == 1
+    with app.app_context():
+        assert _user(typo).is_active and _user(typo).token_version == 1
+        assert _user(kept).is_active
+        assert not _user(1).is_active  # absent from the file
+
+
+def test_email_conflict_ignores_case(app, employees, tmp_path):
+    # I301 is not in the file, so only the database knows its email
+    stats = _import(tmp_path, ["I302,U2,pw,employee,i302@x.com", "I303,U3,pw,employee,I301@X.com"])
+    assert stats["rejected"] == 1 and stats["inserted"] == 0
+    with app.app_context():
+        assert db.session.execute(select(User.id).where(User.login_id == "I303")).first() is None
+
+
+def test_new_users_get_bcrypt_on_first_login(app, employees, tmp_path):
+    stats = _import(tmp_path, ["I301,U1,pw,employee,i301@x.com", "I302,U2,pw,employee,i302@x.com",
+                               "I303,U3,secret,employee,i303@x.com"])
+    assert stats["inserted"] == 1
+    with app.app_context():
+        assert is_interim(User.query.filter_by(login_id="I303").one().password)
+    client = app.test_client()
+    assert client.post("/login", json={"login_id": "I303", "password": "wrong"}).status_code == 401
+    assert client.post("/login", json={"login_id": "I303", "password": "secret"}).status_code == 200
+    with app.app_context():
+        assert is_hashed(User.query.filter_by(login_id="I303").one().password)
+    assert client.post("/login", json={"login_id": "I303", "password": "secret"}).status_code == 200
@@ -0,0 +1,20 @@
+# tests/test_moderation.py
+"""Hidden items are purged by the worker even with SOFT_DELETE off."""
+from extensions import db
+from models import Post
+from moderation import moderate
+
+
+def test_hidden_post_is_purged_without_soft_delete(app, monkeypatch):
+    monkeypatch.setitem(app.config, "SOFT_DELETE", False)
+    with app.app_context():
+        post = Post(author_id=1, content="hide me")
+        db.session.add(post)
+        db.session.commit()
+        post_id = post.id
+        assert moderate("hide", "post", ids=[post_id]) == {"posts": 1}
+    # one tick of the background worker
+    purge = next(job for job in app.extensions["purge_worker"].jobs if job.__name__ == "_purge")
+    with app.app_context():
+        purge()
+        assert db.session.get(Post, post_id) is None
@@ -0,0 +1,62 @@
+# tests/test_outbound.py
+"""Every outbound call ends in exactly one breaker outcome."""
+import time
+
+import pytest
+import requests
+
+from outbound import CircuitOpen, OutboundClient
+
+
+def _response(status: int) -> requests.Response:
+    response = requests.Response()
+    response.status_code = status
+    response._content = b"{}"
+    return response
+
+
+def _client(monkeypatch, *outcomes) -> OutboundClient:
+    client = OutboundClient("test", retries=0, breaker_threshold=2, breaker_reset=0.05)
+    outcomes = list(outcomes)
+
+    def request(method, url, **kwargs):
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return _response(outcome)
+    monkeypatch.setattr(client.session, "request", request)
+    return client
+
+
+def _open(client):
+    client.breaker.record(ok=False)
+    client.breaker.record(ok=False)
+    assert client.breaker.state == "open"
+    time.sleep(0.06)
+    assert client.breaker.state == "half-open"
+
+
+@pytest.mark.parametrize("error", [
+    requests.exceptions.ChunkedEncodingError("connection dropped mid-body"),
+    requests.exceptions.ContentDecodingError("bad gzip"),
+    requests.ReadTimeout("too slow"),
+])
+def test_failed_trial_reopens_the_breaker(monkeypatch, error):
+    client = _client(monkeypatch, error, 200)
+    _open(client)
+    with pytest.raises(type(error)):
+        client.post("http://upstream.test")
+    assert client.breaker.state == "open"
+
+    time.sleep(0.06)  # a later trial is let through again and closes the breaker
+    assert client.post("http://upstream.test").status_code == 200
+    assert client.breaker.state == "closed"
+
+
+def test_client_errors_count_against_the_breaker(monkeypatch):
+    client = _client(monkeypatch, 403, 403)
+    assert client.post("http://upstream.test").status_code == 403
+    assert client.breaker.failures == 1
+    client.post("http://upstream.test")
+    with pytest.raises(CircuitOpen):
+        client.post("http://upstream.test")
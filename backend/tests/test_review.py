@@ -0,0 +1,128 @@
+# tests/test_review.py
+"""Async moderation never brings back an item deleted while it was pending."""
+import time
+
+import pytest
+
+import review
+from deletion import purge_deleted, remove_post, remove_reply
+from extensions import db
+from models import Notification, Post, Reply
+from moderation import moderate
+from outbound import CircuitOpen
+from review import FLAGGED, PENDING, ReviewWorker, flag, publish, review_pending
+
+
+@pytest.fixture
+def ctx(app, monkeypatch):
+    monkeypatch.setitem(app.config, "SOFT_DELETE", True)
+    monkeypatch.setattr(review, "analyze_content", lambda api_key, text: "toxic" in text)
+    with app.app_context():
+        yield
+        db.session.rollback()
+
+
+def _post(content="hello", status=PENDING) -> int:
+    post = Post(author_id=1, content=content, review_status=status)
+    db.session.add(post)
+    db.session.commit()
+    return post.id
+
+
+def _state(post_id):
+    db.session.expire_all()
+    post = db.session.get(Post, post_id)
+    return post and (post.review_status, post.deleted_at is not None)
+
+
+def _notifications(post_id) -> int:
+    return Notification.query.filter_by(post_id=post_id).count()
+
+
+@pytest.mark.parametrize("content", ["hello", "toxic words"])
+def test_deleted_pending_post_stays_deleted(ctx, content):
+    post_id = _post(content)
+    remove_post(post_id)
+    db.session.commit()
+
+    review_pending(None)
+    assert _state(post_id) == (PENDING, True)
+    assert _notifications(post_id) == 0
+    assert not publish("post", post_id, content)
+    assert not flag("post", post_id, content)
+
+    purge_deleted()
+    assert _state(post_id) is None
+
+
+def test_bulk_hide_of_pending_items_sticks(ctx):
+    post_id = _post()
+    reply = Reply(post_id=_post("thread", status=None), author_id=1, content="pending reply", review_status=PENDING)
+    db.session.add(reply)
+    db.session.commit()
+    reply_id = reply.id
+    moderate("hide", "both", author_id=1)
+
+    review_pending(None)
+    assert _state(post_id) == (PENDING, True)
+    assert db.session.get(Reply, reply_id).deleted_at is not None
+
+
+def test_flagged_item_is_kept_until_an_admin_publishes_it(ctx):
+    post_id = _post("toxic words")
+    review_pending(None)
+    assert _state(post_id) == (FLAGGED, True)
+
+    purge_deleted()
+    assert _state(post_id) == (FLAGGED, True)
+    assert publish("post", post_id)
+    assert _state(post_id) == (None, False)
+
+
+def test_deleted_pending_reply_is_purged(ctx):
+    post_id = _post("thread", status=None)
+    reply = Reply(post_id=post_id, author_id=1, content="hi", review_status=PENDING)
+    db.session.add(reply)
+    db.session.commit()
+    reply_id = reply.id
+    remove_reply(reply_id)
+    db.session.commit()
+
+    review_pending(None)
+    purge_deleted()
+    db.session.expire_all()
+    assert db.session.get(Reply, reply_id) is None
+
+
+def test_failing_item_does_not_block_newer_ones(ctx, app, monkeypatch):
+    def analyze(api_key, text):
+        if text == "unreadable":
+            raise ValueError("bad answer")
+        return False
+    monkeypatch.setattr(review, "analyze_content", analyze)
+    review_pending(None, batch_size=1000)  # settle whatever earlier tests left
+    stuck, first, second = _post("unreadable"), _post("one"), _post("two")
+
+    worker = ReviewWorker(app, None, interval=30.0, batch_size=2)
+    result = worker.run_once()
+    assert (result.verdicts, result.failed, result.more) == (1, [("post", stuck)], True)
+    assert _state(first) == (None, False) and _state(second) == (PENDING, False)
+
+    result = worker.run_once()  # the failed item sits out, so the next one gets its turn
+    assert result.verdicts == 1 and result.failed == []
+    assert _state(second) == (None, False) and _state(stuck) == (PENDING, False)
+
+
+def test_outage_stops_the_pass(ctx, app, monkeypatch):
+    def unavailable(api_key, text):
+        raise CircuitOpen("perspective is unavailable")
+    monkeypatch.setattr(review, "analyze_content", unavailable)
+    post_id = _post()
+
+    result = review_pending(None)
+    assert result.stalled and result.verdicts == 0 and result.failed == []
+    assert _state(post_id) == (PENDING, False)
+
+    breaker = app.extensions["outbound"]["perspective"].breaker
+    monkeypatch.setattr(breaker, "opened_at", time.monotonic())
+    assert ReviewWorker(app, "key", interval=30.0, batch_size=20).run_once() is None
@@ -0,0 +1,47 @@
+# tests/test_search.py
+"""User search keeps short substring matches and sees user changes at once."""
+import pytest
+
+from extensions import db
+from models import User
+from search import search_users_ranked
+
+
+@pytest.fixture
+def users(app):
+    with app.app_context():
+        rows = [
+            User(login_id="S201", name="Mary Soo", password="x", role="employee", email="s201@x.com"),
+            User(login_id="S202", name="Hoang Vu", password="x", role="employee", email="s202@x.com"),
+        ]
+        db.session.add_all(rows)
+        db.session.commit()
+        yield [u.id for u in rows]
+        for u in rows:
+            db.session.delete(u)
+        db.session.commit()
+
+
+def _ids(q, **kw):
+    return [u["id"] for u in search_users_ranked(db.session, q, **kw)]
+
+
+@pytest.mark.parametrize("memory", [True, False])
+def test_short_query_matches_inside_names(users, memory):
+    mary, hoang = users
+    assert _ids("oo", use_memory_index=memory) == [mary]
+    assert hoang in _ids("u", use_memory_index=memory)
+    # prefixes still rank first
+    assert _ids("ho", use_memory_index=memory)[0] == hoang
+
+
+def test_memory_index_follows_user_changes(users):
+    mary, _ = users
+    assert _ids("mary") == [mary]
+    db.session.get(User, mary).name = "Marian Soo"
+    db.session.commit()
+    assert _ids("mary") == []
+    assert _ids("marian") == [mary]
+    db.session.get(User, mary).is_active = False
+    db.session.commit()
+    assert _ids("marian") == []
@@ -0,0 +1,76 @@
+# tests/test_trending.py
+"""The trending refresh recounts without holding the write lock while it scores."""
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import text
+
+import trending
+from extensions import db
+from models import Like, Post, Reply, TrendingPost, User
+from trending import refresh_trending
+
+
+@pytest.fixture
+def ctx(app):
+    with app.app_context():
+        yield
+        db.session.rollback()
+
+
+def _score(post_id):
+    db.session.expire_all()
+    row = db.session.get(TrendingPost, post_id)
+    return row and round(row.score, 3)
+
+
+def _user(login_id) -> int:
+    user = User(login_id=login_id, name=login_id, password="x")
+    db.session.add(user)
+    db.session.commit()
+    return user.id
+
+
+def test_refresh_matches_the_triggers_and_decays(ctx):
+    post = Post(author_id=1, content="busy")
+    db.session.add(post)
+    db.session.commit()
+    db.session.add_all([Like(user_id=1, post_id=post.id), Reply(post_id=post.id, author_id=1, content="a")])
+    db.session.commit()
+    assert _score(post.id) == 3.0
+
+    refresh_trending(24.0)
+    assert _score(post.id) == 3.0
+    refresh_trending(24.0, datetime.utcnow() + timedelta(hours=24))
+    assert _score(post.id) == 1.5
+
+
+def test_writes_during_scoring_are_caught_up(ctx, monkeypatch):
+    post = Post(author_id=1, content="hot")
+    db.session.add(post)
+    db.session.commit()
+    db.session.add(Like(user_id=1, post_id=post.id))
+    db.session.commit()
+    late_user = _user("late-liker")
+
+    score = trending._score
+
+    def score_then_like(*args):
+        result = score(*args)
+        # committed by someone else after the read, before the swap
+        db.session.add_all([Like(user_id=late_user, post_id=post.id),
+                            Reply(post_id=post.id, author_id=late_user, content="late")])
+        db.session.commit()
+        return result
+    monkeypatch.setattr(trending, "_score", score_then_like)
+
+    refresh_trending(24.0)
+    assert _score(post.id) == 4.0
+
+
+def test_window_is_read_by_index(ctx):
+    since = datetime.utcnow() - timedelta(days=10)
+    for table in ("likes", "replies"):
+        plan = " ".join(row[-1] for row in db.session.execute(
+            text(f"EXPLAIN QUERY PLAN SELECT post_id FROM {table} WHERE created_at >= :since"), {"since": since}))
+        assert f"ix_{table}_created_at" in plan
@@ -0,0 +1,126 @@
+# trending.py
+"""
+Trending posts: a score of time-decayed likes and live replies per post.
+
+Each like counts TRENDING_WEIGHTS["like"] and each reply
+TRENDING_WEIGHTS["reply"] (counters.py), halved every TRENDING_HALF_LIFE
+hours. The score is stored in `trending_posts`:
+
+- triggers add an event's full weight as it happens and take it back when
+  the like or reply goes, so a new like moves a post up at once
+- the refresh job recomputes every score from the likes and replies of the
+  last HORIZON_HALF_LIVES half-lives, which decays old activity, corrects
+  what the triggers could only clamp and drops posts gone quiet. It runs on
+  the background worker (deletion.py) every TRENDING_INTERVAL seconds; the
+  result does not depend on when or how often it runs.
+
+The refresh reads the window (a range scan of ix_likes_created_at and
+ix_replies_created_at) and scores it with no write lock held. Only the
+swap of the new scores is a write: one short transaction that also adds
+back, in full, the likes and replies committed while it was scoring. An
+unlike or reply delete in that gap counts again until the next refresh.
+
+`GET /posts?sort=trending` is then a walk down ix_trending_posts_score
+(serializers.trending_page).
+
+    flask trending-refresh       # recompute now
+"""
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import delete, func, insert, literal, select, text, union_all
+
+from counters import TRENDING_WEIGHTS
+from extensions import db
+from models import Like, Post, Reply, TrendingPost
+
+# activity older than this many half-lives weighs under 0.1%
+HORIZON_HALF_LIVES = 10
+
+
+def _score(half_life: float, now: datetime) -> Tuple[Dict[int, float], int, int]:
+    """
+    Decayed scores from the window's likes and replies up to the highest like
+    and reply ids, which are returned too. Holds no lock while scoring.
+    """
+    since = now - timedelta(hours=half_life * HORIZON_HALF_LIVES)
+    # the ids first: anything committed after them is left to the catch-up
+    last_like = db.session.execute(select(func.coalesce(func.max(Like.id), 0))).scalar()
+    last_reply = db.session.execute(select(func.coalesce(func.max(Reply.id), 0))).scalar()
+    events = union_all(
+        select(Like.post_id.label("post_id"), literal(TRENDING_WEIGHTS["like"]).label("weight"),
+               Like.created_at.label("created_at"))
+        .join(Post, Post.id == Like.post_id)
+        .where(Post.deleted_at.is_(None), Like.created_at >= since, Like.id <= last_like),
+        select(Reply.post_id, literal(TRENDING_WEIGHTS["reply"]), Reply.created_at)
+        .join(Post, Post.id == Reply.post_id)
+        .where(Post.deleted_at.is_(None), Reply.deleted_at.is_(None), Reply.created_at >= since,
+               Reply.id <= last_reply),
+    )
+    rows = db.session.execute(events).all()
+    db.session.rollback()
+
+    scores = defaultdict(float)
+    for post_id, weight, created_at in rows:
+        age = max((now - created_at).total_seconds() / 3600, 0.0)
+        scores[post_id] += weight * 0.5 ** (age / half_life)
+    return scores, last_like, last_reply
+
+
+# events committed after the read: ids only grow, so a rowid range finds them
+CATCH_UP = [
+    "INSERT INTO trending_posts (post_id, score) "
+    "SELECT likes.post_id, count(*) * :like FROM likes JOIN posts ON posts.id = likes.post_id "
+    "WHERE likes.id > :last_like AND posts.deleted_at IS NULL GROUP BY likes.post_id "
+    "ON CONFLICT (post_id) DO UPDATE SET score = score + excluded.score",
+    "INSERT INTO trending_posts (post_id, score) "
+    "SELECT replies.post_id, count(*) * :reply FROM replies JOIN posts ON posts.id = replies.post_id "
+    "WHERE replies.id > :last_reply AND replies.deleted_at IS NULL AND posts.deleted_at IS NULL "
+    "GROUP BY replies.post_id "
+    "ON CONFLICT (post_id) DO UPDATE SET score = score + excluded.score",
+]
+
+
+def refresh_trending(half_life: float, now: Optional[datetime] = None) -> int:
+    """Replace every score with a recount as of `now`. `half_life` is in hours. Returns the trending posts."""
+    scores, last_like, last_reply = _score(half_life, now or datetime.utcnow())
+    params = {"like": TRENDING_WEIGHTS["like"], "reply": TRENDING_WEIGHTS["reply"],
+              "last_like": last_like, "last_reply": last_reply}
+    try:
+        db.session.execute(delete(TrendingPost))
+        if scores:
+            db.session.execute(insert(TrendingPost), [{"post_id": p, "score": s} for p, s in scores.items()])
+        for stmt in CATCH_UP:
+            db.session.execute(text(stmt), params)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return len(scores)
+
+
+# ---------------------------------------
+# JOB + CLI
+# ---------------------------------------
+def init_trending(app):
+    app.config.setdefault("TRENDING_HALF_LIFE", 24.0)
+    app.config.setdefault("TRENDING_INTERVAL", 300.0)
+    last_run = [None]
+
+    def _refresh():
+        # the worker ticks every PURGE_INTERVAL; the refresh only needs TRENDING_INTERVAL
+        if last_run[0] is not None and time.monotonic() - last_run[0] < app.config["TRENDING_INTERVAL"]:
+            return
+        last_run[0] = time.monotonic()
+        refresh_trending(app.config["TRENDING_HALF_LIFE"])
+
+    app.extensions["purge_worker"].add_job(_refresh)
+
+    @app.cli.command("trending-refresh")
+    def trending_refresh():
+        """Recompute the trending scores from recent likes and replies."""
+        trending = refresh_trending(app.config["TRENDING_HALF_LIFE"])
+        top = db.session.execute(select(func.max(TrendingPost.score))).scalar()
+        print(f"Trending refreshed: {trending:,} posts, top score {top or 0:.2f}.")
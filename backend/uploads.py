@@ -0,0 +1,283 @@
+# uploads.py
+"""
+Signed direct uploads: files go from the client straight to storage.
+
+1. POST /uploads/sign {"kind": "image", "contentType": "image/png", "size": 48213, "folder": "posts"}
+   checks type and size and answers with an upload ticket:
+       {"provider": ..., "uploadUrl": ..., "fields": {...}, "maxBytes": ..., "expiresAt": ...}
+2. The client POSTs multipart/form-data with `fields` plus the file as `file`
+   to `uploadUrl`. No Flask worker is involved.
+3. The client passes the storage's answer back to the write endpoint as
+   `image_ref` / `gif_ref`; `asset_url` verifies it and returns the URL to store.
+
+Providers follow STORAGE_BACKEND:
+
+- "cloudinary": the fields are a Cloudinary signed-upload request pinned to
+  a public_id under the caller's prefix. The reference is Cloudinary's upload
+  response ({"public_id", "version", "signature"}); its response signature is
+  checked, so the URL cannot be forged. Size limits on Cloudinary come from
+  the account's upload settings.
+- "local": a stand-in storage server (`flask uploads-serve`, or the WSGI app
+  LocalUploadServer) writing into the same LocalStorage root the app serves
+  /media from (see storage.py). Tickets and references are itsdangerous
+  tokens signed with UPLOAD_SIGNING_KEY; the server enforces the ticket's
+  size and type, sniffing the file's first bytes.
+
+Multipart files sent to the write endpoints still work while LEGACY_UPLOADS
+is on, but they tie up a worker for the whole upload.
+"""
+import json
+import re
+import secrets
+import time
+from typing import Dict
+from urllib.parse import urlencode, urlsplit
+
+import cloudinary
+import cloudinary.utils
+from flask import current_app, jsonify, request
+from flask_jwt_extended import jwt_required
+from itsdangerous import BadSignature, SignatureExpired, URLSafeTimedSerializer
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.utils import send_file
+from werkzeug.wrappers import Request, Response
+
+from auth import current_user_id
+from media import register_asset
+from storage import MEDIA_MAX_AGE, FileTooLarge, FileTypeNotAllowed, LocalStorage, StoredFile, storage
+
+# kind -> accepted content types
+UPLOAD_TYPES = {
+    "image": {"image/jpeg", "image/png", "image/webp", "image/gif"},
+    "gif": {"image/gif"},
+}
+UPLOAD_FOLDERS = ("posts", "replies", "uploads")
+
+
+class InvalidUpload(ValueError):
+    """A ticket request or an asset reference that cannot be accepted."""
+
+
+def _serializer(secret: str, salt: str) -> URLSafeTimedSerializer:
+    return URLSafeTimedSerializer(secret, salt=salt)
+
+
+def _signing_key(config) -> str:
+    return config.get("UPLOAD_SIGNING_KEY") or config["JWT_SECRET_KEY"]
+
+
+# ---------------------------------------
+# TICKETS
+# ---------------------------------------
+def _check_request(kind: str, content_type: str, size, folder: str, max_bytes: int):
+    if kind not in UPLOAD_TYPES:
+        raise InvalidUpload("kind must be image or gif")
+    if content_type not in UPLOAD_TYPES[kind]:
+        raise InvalidUpload(f"contentType must be one of {', '.join(sorted(UPLOAD_TYPES[kind]))}")
+    if not isinstance(size, int) or size <= 0:
+        raise InvalidUpload("size must be a positive integer")
+    if size > max_bytes:
+        raise InvalidUpload(f"File too large (max {max_bytes} bytes)")
+    if folder not in UPLOAD_FOLDERS:
+        raise InvalidUpload(f"folder must be one of {', '.join(UPLOAD_FOLDERS)}")
+
+
+def _cloudinary_ticket(user_id: int, kind: str, folder: str, config) -> Dict:
+    cfg = cloudinary.config()
+    timestamp = int(time.time())
+    params = {
+        "timestamp": timestamp,
+        "public_id": f"{folder}/u{user_id}-{secrets.token_hex(8)}",
+        "allowed_formats": "gif" if kind == "gif" else "jpg,png,webp,gif",
+    }
+    signature = cloudinary.utils.api_sign_request(params, cfg.api_secret)
+    return {
+        "provider": "cloudinary",
+        "uploadUrl": f"https://api.cloudinary.com/v1_1/{cfg.cloud_name}/image/upload",
+        "fields": {**params, "api_key": cfg.api_key, "signature": signature},
+        "maxBytes": config["UPLOAD_MAX_BYTES"],
+        "expiresAt": timestamp + config["UPLOAD_TICKET_TTL"],
+    }
+
+
+def _local_ticket(user_id: int, kind: str, content_type: str, config) -> Dict:
+    token = _serializer(_signing_key(config), "upload-ticket").dumps({
+        "uid": user_id, "kind": kind, "max": config["UPLOAD_MAX_BYTES"], "types": [content_type],
+    })
+    # the token rides in the query string so the server can check it before reading the body
+    return {
+        "provider": "local",
+        "uploadUrl": config["LOCAL_UPLOAD_URL"].rstrip("/") + "/upload?" + urlencode({"token": token}),
+        "fields": {},
+        "maxBytes": config["UPLOAD_MAX_BYTES"],
+        "expiresAt": int(time.time()) + config["UPLOAD_TICKET_TTL"],
+    }
+
+
+def upload_ticket(user_id: int, kind: str, content_type: str, size: int, folder: str = "uploads") -> Dict:
+    config = current_app.config
+    _check_request(kind, content_type, size, folder, config["UPLOAD_MAX_BYTES"])
+    if config["STORAGE_BACKEND"] == "local":
+        return _local_ticket(user_id, kind, content_type, config)
+    return _cloudinary_ticket(user_id, kind, folder, config)
+
+
+# ---------------------------------------
+# REFERENCES
+# ---------------------------------------
+def _cloudinary_asset_url(ref: str, kind: str, user_id: int) -> str:
+    try:
+        data = json.loads(ref)
+        public_id, version, signature = data["public_id"], data["version"], data["signature"]
+    except (ValueError, TypeError, KeyError):
+        raise InvalidUpload("Malformed upload reference")
+    if not re.fullmatch(rf"[a-z]+/u{user_id}-[0-9a-f]{{16}}", str(public_id)):
+        raise InvalidUpload("Upload reference does not belong to this user")
+    if not cloudinary.utils.verify_api_response_signature(public_id, version, signature):
+        raise InvalidUpload("Upload reference signature is invalid")
+    options = {"version": version, "secure": True, "resource_type": "image"}
+    if kind == "gif":
+        options["format"] = "gif"
+    url = cloudinary.utils.cloudinary_url(public_id, **options)[0]
+    # the client sent the bytes straight to Cloudinary, so there is no hash to dedupe on
+    register_asset(StoredFile(public_id, url, None, None))
+    return url
+
+
+def _local_asset_url(ref: str, kind: str, user_id: int, config) -> str:
+    try:
+        data = _serializer(_signing_key(config), "upload-ref").loads(ref, max_age=config["UPLOAD_REF_TTL"])
+    except SignatureExpired:
+        raise InvalidUpload("Upload reference expired")
+    except BadSignature:
+        raise InvalidUpload("Upload reference signature is invalid")
+    if data.get("uid") != user_id:
+        raise InvalidUpload("Upload reference does not belong to this user")
+    if data.get("kind") != kind:
+        raise InvalidUpload(f"Upload reference is not a {kind}")
+    url = storage().url(data["key"])
+    register_asset(StoredFile(data["key"], url, data.get("size"), data.get("type")),
+                   LocalStorage.content_hash(data["key"]))
+    return url
+
+
+def asset_url(ref: str, kind: str, user_id: int) -> str:
+    """Verify a direct-upload reference and return the URL to store. Raises InvalidUpload."""
+    config = current_app.config
+    if config["STORAGE_BACKEND"] == "local":
+        return _local_asset_url(ref, kind, user_id, config)
+    return _cloudinary_asset_url(ref, kind, user_id)
+
+
+# ---------------------------------------
+# LOCAL STAND-IN STORAGE SERVER
+# ---------------------------------------
+class LocalUploadServer:
+    """
+    Minimal WSGI storage server in front of a LocalStorage: POST /upload
+    takes a ticket token and a file, GET /media/<key> serves stored files.
+    Runs outside the API process, like the real storage it stands in for.
+    """
+
+    def __init__(self, store: LocalStorage, secret: str, ticket_ttl: int):
+        self.store = store
+        self.tickets = _serializer(secret, "upload-ticket")
+        self.refs = _serializer(secret, "upload-ref")
+        self.ticket_ttl = ticket_ttl
+
+    def __call__(self, environ, start_response):
+        request = Request(environ)
+        if request.method == "OPTIONS":
+            response = Response(status=204)
+        elif request.method == "POST" and request.path == "/upload":
+            response = self.upload(request)
+        elif request.method in ("GET", "HEAD") and request.path.startswith("/media/"):
+            response = self.serve(request, request.path[len("/media/"):])
+        else:
+            response = self._json({"error": "Not found"}, 404)
+        # the browser uploads cross-origin, straight from the frontend
+        response.headers["Access-Control-Allow-Origin"] = "*"
+        response.headers["Access-Control-Allow-Methods"] = "GET, POST, OPTIONS"
+        response.headers["Access-Control-Allow-Headers"] = "Content-Type"
+        return response(environ, start_response)
+
+    @staticmethod
+    def _json(payload, status: int = 200) -> Response:
+        return Response(json.dumps(payload), status=status, mimetype="application/json")
+
+    def upload(self, request: Request) -> Response:
+        try:
+            ticket = self.tickets.loads(request.args.get("token", ""), max_age=self.ticket_ttl)
+        except SignatureExpired:
+            return self._json({"error": "Upload ticket expired"}, 403)
+        except BadSignature:
+            return self._json({"error": "Invalid upload ticket"}, 403)
+
+        # multipart overhead on top of the file itself
+        request.max_content_length = ticket["max"] + 64 * 1024
+        try:
+            file = request.files.get("file")
+        except RequestEntityTooLarge:
+            return self._json({"error": "File too large"}, 413)
+        if file is None:
+            return self._json({"error": "No file provided"}, 400)
+
+        try:
+            stored = self.store.save(file, max_bytes=ticket["max"], accept=ticket["types"])
+        except FileTooLarge as e:
+            return self._json({"error": str(e)}, 413)
+        except FileTypeNotAllowed as e:
+            return self._json({"error": str(e)}, 415)
+
+        ref = self.refs.dumps({"uid": ticket["uid"], "kind": ticket["kind"], "key": stored.key,
+                               "size": stored.size, "type": stored.content_type})
+        return self._json({"ref": ref, "key": stored.key, "size": stored.size,
+                           "contentType": stored.content_type}, 201)
+
+    def serve(self, request: Request, key: str) -> Response:
+        path = self.store.path(key)
+        if path is None:
+            return self._json({"error": "Not found"}, 404)
+        response = send_file(path, request.environ, max_age=MEDIA_MAX_AGE)
+        response.cache_control.immutable = True
+        return response
+
+
+def local_upload_server(config) -> LocalUploadServer:
+    return LocalUploadServer(
+        LocalStorage(config["LOCAL_STORAGE_ROOT"], config["LOCAL_MEDIA_URL"]),
+        secret=_signing_key(config),
+        ticket_ttl=config["UPLOAD_TICKET_TTL"],
+    )
+
+
+def init_uploads(app):
+    app.config.setdefault("UPLOAD_MAX_BYTES", 10 * 1024 * 1024)
+    app.config.setdefault("UPLOAD_TICKET_TTL", 600)
+    app.config.setdefault("UPLOAD_REF_TTL", 24 * 3600)
+    app.config.setdefault("LOCAL_UPLOAD_URL", "http://127.0.0.1:9001")
+    app.config.setdefault("LEGACY_UPLOADS", True)
+
+    @app.route("/uploads/sign", methods=["POST"])
+    @jwt_required()
+    def sign_upload():
+        data = request.get_json(silent=True) or {}
+        try:
+            ticket = upload_ticket(
+                current_user_id(),
+                data.get("kind") or "image",
+                data.get("contentType") or "",
+                data.get("size"),
+                data.get("folder") or "uploads",
+            )
+        except InvalidUpload as e:
+            return jsonify({"error": str(e)}), 400
+        return jsonify(ticket), 200
+
+    @app.cli.command("uploads-serve")
+    def uploads_serve():
+        """Run the local stand-in storage server on LOCAL_UPLOAD_URL."""
+        from werkzeug.serving import run_simple
+
+        url = urlsplit(app.config["LOCAL_UPLOAD_URL"])
+        run_simple(url.hostname or "127.0.0.1", url.port or 9001, local_upload_server(app.config), threaded=True)
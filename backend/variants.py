@@ -0,0 +1,301 @@
+# variants.py
+"""
+Responsive image variants: the same image at a few widths and in modern
+formats, sent to the client as ready-made srcset strings.
+
+    "imageSources": [
+        {"type": "image/avif", "srcset": "/variants/320/avif/media/ab/abcd....png 320w, ..."},
+        {"type": "image/webp", "srcset": "/variants/320/webp/media/ab/abcd....png 320w, ..."},
+    ]
+
+The client renders them as <picture><source type=... srcset=...> in order,
+with `imageUrl` / `avatarUrl` kept as the <img> fallback.
+
+- Cloudinary URLs get a transformation (w_320,c_limit,f_auto,q_auto)
+  inserted after /upload/. Cloudinary renders and caches each width and
+  picks AVIF/WebP per browser itself, so one untyped source is enough.
+- Local files (LocalStorage media and statics avatars) are rendered with
+  Pillow into VARIANTS_ROOT on a process pool, off the request threads.
+  New uploads are queued for rendering as soon as they are accepted; a
+  variant asked for before it exists is rendered on demand, and if that
+  takes over VARIANT_RENDER_TIMEOUT seconds the client is redirected to
+  the original. Media variants are immutable like their source; avatar
+  variants are re-rendered when the avatar file changes.
+
+External URLs (GIPHY and the like) and local GIFs, whose animation a
+still variant would lose, get no sources. Pillow is optional: without it
+local images get no sources either.
+"""
+import os
+import re
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError as FutureTimeout
+from typing import Dict, Iterable, List, Optional
+
+from flask import current_app, jsonify, redirect, send_file
+
+from storage import MEDIA_MAX_AGE, storage
+
+try:
+    from PIL import Image, ImageOps, features
+except ImportError:  # optional
+    Image = None
+
+IMAGE_WIDTHS = (160, 320, 640, 1080)
+AVATAR_WIDTHS = (40, 80, 160)
+VARIANT_WIDTHS = frozenset(IMAGE_WIDTHS + AVATAR_WIDTHS)
+# best first: the browser takes the first <source> type it supports
+VARIANT_FORMATS = ("avif", "webp")
+QUALITY = {"avif": 55, "webp": 80}
+RENDERABLE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+AVATAR_MAX_AGE = 86400
+
+CLOUDINARY_UPLOAD = re.compile(r"^(https?://res\.cloudinary\.com/[^/]+/image/upload/)(.+)$")
+
+
+def cloudinary_variant(url: str, width: int) -> Optional[str]:
+    match = CLOUDINARY_UPLOAD.match(url)
+    if match is None:
+        return None
+    return f"{match.group(1)}w_{width},c_limit,f_auto,q_auto/{match.group(2)}"
+
+
+def _srcset(urls_by_width) -> str:
+    return ", ".join(f"{url} {width}w" for width, url in urls_by_width)
+
+
+# ---------------------------------------
+# RENDERING (runs in the pool's processes)
+# ---------------------------------------
+def render_variant(source_path: str, target_path: str, width: int, fmt: str) -> str:
+    """Write `source_path` scaled down to `width` (never up) as `fmt`. Returns target_path."""
+    with Image.open(source_path) as original:
+        image = ImageOps.exif_transpose(original)
+        if image.width > width:
+            image = image.resize((width, max(1, round(image.height * width / image.width))), Image.LANCZOS)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA")
+        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+        tmp = f"{target_path}.{os.getpid()}.tmp"
+        image.save(tmp, format=fmt.upper(), quality=QUALITY[fmt])
+    os.replace(tmp, target_path)
+    return target_path
+
+
+class VariantRenderer:
+    """
+    Renders variants into `root` on a lazily started process pool. A target
+    already being rendered is not queued twice; callers share its future.
+    """
+
+    def __init__(self, root: str, workers: int):
+        self.root = os.path.abspath(root)
+        self.workers = workers
+        self.formats = tuple(f for f in VARIANT_FORMATS if Image is not None and features.check(f))
+        self._pool = None
+        self._pending: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def target(self, source: str, width: int, fmt: str) -> Optional[str]:
+        path = os.path.abspath(os.path.join(self.root, str(width), fmt, f"{source}.{fmt}"))
+        return path if path.startswith(self.root + os.sep) else None
+
+    def render(self, source_path: str, target: str, width: int, fmt: str) -> Future:
+        with self._lock:
+            future = self._pending.get(target)
+            if future is not None:
+                return future
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers)
+            future = self._pool.submit(render_variant, source_path, target, width, fmt)
+            self._pending[target] = future
+        future.add_done_callback(lambda _: self._forget(target))
+        return future
+
+    def _forget(self, target: str):
+        with self._lock:
+            self._pending.pop(target, None)
+
+    def is_fresh(self, source_path: str, target: str) -> bool:
+        try:
+            return os.path.getmtime(target) >= os.path.getmtime(source_path)
+        except OSError:
+            return False
+
+    def prerender(self, source: str, source_path: str, widths: Iterable[int]):
+        """Queue every missing variant of one source without waiting."""
+        for width in widths:
+            for fmt in self.formats:
+                target = self.target(source, width, fmt)
+                if target is not None and not self.is_fresh(source_path, target):
+                    self.render(source_path, target, width, fmt)
+
+    def discard(self, source: str):
+        for width in VARIANT_WIDTHS:
+            for fmt in VARIANT_FORMATS:
+                target = self.target(source, width, fmt)
+                if target is not None and os.path.exists(target):
+                    os.unlink(target)
+
+    def wait(self):
+        """Block until everything queued is rendered, then stop the pool."""
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True)
+
+
+def renderer() -> Optional[VariantRenderer]:
+    return current_app.extensions.get("variants")
+
+
+# ---------------------------------------
+# SOURCES
+# ---------------------------------------
+def _local_source(url: str, host_url: str) -> Optional[str]:
+    """
+    "media/<key>" or "statics/<path>" for an image this app serves itself,
+    e.g. "/media/ab/abcd.png" or "http://host/statics/profile/x.jpg".
+    """
+    store = storage()
+    if store.name == "local" and url.startswith(store.base_url + "/"):
+        source = "media/" + url[len(store.base_url) + 1:]
+    else:
+        path = url[len(host_url):] if host_url and url.startswith(host_url + "/") else url
+        if not path.startswith("/statics/"):
+            return None
+        source = path[1:]
+    if not source.lower().endswith(RENDERABLE_EXTENSIONS) or ".." in source.split("/"):
+        return None
+    return source
+
+
+def source_path(source: str) -> Optional[str]:
+    """Absolute path of a "media/..." or "statics/..." source, or None."""
+    kind, _, rest = source.partition("/")
+    if kind == "media":
+        store = storage()
+        return store.path(rest) if store.name == "local" else None
+    if kind == "statics":
+        root = current_app.config["STATICS_FOLDER"]
+        path = os.path.abspath(os.path.join(root, rest))
+        return path if path.startswith(root + os.sep) and os.path.isfile(path) else None
+    return None
+
+
+def original_url(source: str) -> str:
+    kind, _, rest = source.partition("/")
+    return storage().url(rest) if kind == "media" else f"/{source}"
+
+
+def image_sources(url: Optional[str], widths: Iterable[int] = IMAGE_WIDTHS,
+                  host_url: str = "") -> Optional[List[Dict]]:
+    """srcset sources for `url`, or None when no variants can be offered."""
+    if not url:
+        return None
+    if url.startswith("https://res.cloudinary.com/"):
+        urls = [(w, cloudinary_variant(url, w)) for w in widths]
+        if urls[0][1] is None:
+            return None
+        return [{"type": None, "srcset": _srcset(urls)}]
+    variants = renderer()
+    if variants is None or not variants.formats:
+        return None
+    source = _local_source(url, host_url)
+    # media keys are content-addressed and registered; avatar paths may point nowhere
+    if source is None or (source.startswith("statics/") and source_path(source) is None):
+        return None
+    return [
+        {"type": f"image/{fmt}",
+         "srcset": _srcset((w, f"{host_url}/variants/{w}/{fmt}/{source}") for w in widths)}
+        for fmt in variants.formats
+    ]
+
+
+def prerender_url(url: Optional[str], widths: Iterable[int] = IMAGE_WIDTHS):
+    """Start rendering the local variants of a newly accepted upload."""
+    variants = renderer()
+    if not url or variants is None or not variants.formats:
+        return
+    source = _local_source(url, "")
+    path = source_path(source) if source else None
+    if path is not None:
+        variants.prerender(source, path, widths)
+
+
+def discard_variants(url: str):
+    """Remove the rendered variants of a media file that was deleted from storage."""
+    variants = renderer()
+    source = _local_source(url, "") if variants is not None else None
+    if source is not None:
+        variants.discard(source)
+
+
+# ---------------------------------------
+# ROUTE + CLI
+# ---------------------------------------
+def init_variants(app):
+    app.config.setdefault("VARIANTS_ROOT", os.path.join(app.root_path, "media-variants"))
+    app.config.setdefault("VARIANT_WORKERS", 2)
+    app.config.setdefault("VARIANT_RENDER_TIMEOUT", 5.0)
+    app.config.setdefault("STATICS_FOLDER", os.path.join(app.root_path, "statics"))
+    variants = VariantRenderer(app.config["VARIANTS_ROOT"], app.config["VARIANT_WORKERS"])
+    app.extensions["variants"] = variants
+
+    @app.route("/variants/<int:width>/<fmt>/<path:source>", methods=["GET"])
+    def serve_variant(width, fmt, source):
+        if width not in VARIANT_WIDTHS or fmt not in variants.formats:
+            return jsonify({"error": "Not found"}), 404
+        path = source_path(source)
+        target = variants.target(source, width, fmt)
+        if path is None or target is None:
+            return jsonify({"error": "Not found"}), 404
+
+        if not variants.is_fresh(path, target):
+            try:
+                variants.render(path, target, width, fmt).result(timeout=app.config["VARIANT_RENDER_TIMEOUT"])
+            except FutureTimeout:
+                # still rendering; the original serves until it is ready
+                return redirect(original_url(source), code=302)
+            except Exception:
+                app.logger.exception("Rendering variant %s failed", target)
+                return redirect(original_url(source), code=302)
+
+        if source.startswith("media/"):
+            response = send_file(target, mimetype=f"image/{fmt}", conditional=True, etag=True,
+                                 max_age=MEDIA_MAX_AGE)
+            response.cache_control.public = True
+            response.cache_control.immutable = True
+            return response
+        # avatars keep their file names when replaced
+        return send_file(target, mimetype=f"image/{fmt}", conditional=True, etag=True, max_age=AVATAR_MAX_AGE)
+
+    @app.cli.command("variants-render")
+    def variants_render():
+        """Render every missing variant of local media and avatars."""
+        from sqlalchemy import select
+
+        from extensions import db
+        from models import MediaAsset, User
+        from serializers import avatar_full_url
+
+        if not variants.formats:
+            print("Pillow with WebP/AVIF support is not installed; nothing to render.")
+            return
+        queued = []
+        store = storage()
+        if store.name == "local":
+            for key in db.session.execute(select(MediaAsset.storage_key)).scalars():
+                source = _local_source(store.url(key), "")
+                path = source_path(source) if source else None
+                if path is not None:
+                    queued.append((source, path, IMAGE_WIDTHS))
+        for avatar in db.session.execute(select(User.avatar_url).distinct()).scalars():
+            source = _local_source(avatar_full_url(avatar, ""), "") if avatar else None
+            path = source_path(source) if source else None
+            if path is not None:
+                queued.append((source, path, AVATAR_WIDTHS))
+        for source, path, widths in queued:
+            variants.prerender(source, path, widths)
+        variants.wait()
+        print(f"Rendered variants for {len(queued):,} images.")